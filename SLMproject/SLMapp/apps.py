@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SlmappConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "SLMapp"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,52 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView whose handlers are ``async def``.
+
+    Django sees the view as async (all handlers are coroutines), so under
+    ASGI it runs on the event loop instead of tying up a worker thread.
+    Authentication, permissions and throttling still run through DRF's
+    sync ``initial()`` in a thread; handlers should use the async ORM
+    (``aget``, ``afirst``, ``async for`` ...) and ``serialize()`` for
+    serializers that touch the database. Under WSGI the same views keep
+    working, Django runs them in a per-request event loop.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(
+                    self, request.method.lower(), self.http_method_not_allowed
+                )
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def options(self, request, *args, **kwargs):
+        return await sync_to_async(super().options)(request, *args, **kwargs)
+
+    async def serialize(self, serializer):
+        """ Evaluate serializer.data off the event loop (it may query) """
+        return await sync_to_async(lambda: serializer.data)()
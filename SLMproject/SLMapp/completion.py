@@ -0,0 +1,280 @@
+"""
+Completion cascade: page -> main content -> module -> topic.
+
+complete_page() writes the page's PageProgress and recomputes the rollup
+rows above it (MainContentProgress, Progress, TopicProgress) for that user
+in one transaction:
+
+- the user's row is locked first (select_for_update), so completions from
+  the same user run one after the other and the second one sees the first
+  one's page; two tabs finishing the last two pages can't both miss it
+- each level is one set-based query: the children total against the
+  user's completed children, for every affected parent at once
+- only parents that just became complete are written (one UPDATE for
+  rows that exist, one INSERT for the rest), so a completion writes at
+  most one row per level
+- completion only moves forward: a page added later doesn't take a
+  finished main content away, and completed_at is never moved
+- repeats are cheap: with a cache shared by every worker (REDIS_URL), a
+  unit the user already finished is remembered (remember_done) and skips
+  the database entirely; otherwise, or on a miss, an already completed
+  page is only read, never rewritten
+
+A unit with no children is never completed by the cascade; an empty main
+content can still be marked done explicitly (complete_main_content).
+"""
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateTimeField, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from accounts.caches import cache_is_shared
+from accounts.models import CustomUser
+
+from .models import (
+    MainContent, MainContentProgress, Module, Page, PageProgress, Progress, Topic, TopicProgress,
+)
+
+PAGE = "page"
+MAIN_CONTENT = "main_content"
+MODULE = "module"
+TOPIC = "topic"
+
+# Finished units never un-finish (only deletes, see signals), so this can be long.
+# Only used with a shared cache: a per-process one would keep answering
+# "done" in other workers after a progress reset, and the page would never
+# be written again
+DONE_CACHE_SECONDS = 24 * 60 * 60
+
+# level -> (unit model, rollup model, children, child's link to the unit,
+#           the user's completed children, their link to the unit)
+LEVELS = {
+    MAIN_CONTENT: (MainContent, MainContentProgress, Page, "main_content", PageProgress, "page__main_content"),
+    MODULE: (Module, Progress, MainContent, "module", MainContentProgress, "main_content__module"),
+    TOPIC: (Topic, TopicProgress, Module, "topic", Progress, "module__topic"),
+}
+
+
+# -------------------------
+# DONE CACHE (short-circuits repeats)
+# -------------------------
+
+def _done_key(level, user_id, unit_id):
+    return f"done:{level}:{user_id}:{unit_id}"
+
+
+def cached_done(level, user_id, unit_id):
+    """ What remember_done() stored for a unit the user finished, or None """
+    if not cache_is_shared():
+        return None
+    return cache.get(_done_key(level, user_id, unit_id))
+
+
+def remember_done(level, user_id, unit_id, value=True):
+    if not cache_is_shared():
+        return
+    # Only once the transaction that wrote it has committed
+    transaction.on_commit(
+        lambda: cache.set(_done_key(level, user_id, unit_id), value, DONE_CACHE_SECONDS)
+    )
+
+
+def forget_done(level, user_id, unit_id):
+    cache.delete(_done_key(level, user_id, unit_id))
+
+
+def nothing_completed():
+    return {MAIN_CONTENT: [], MODULE: [], TOPIC: []}
+
+
+# -------------------------
+# CASCADE
+# -------------------------
+
+def _count(queryset, field):
+    """ Correlated COUNT of queryset rows pointing at the outer unit """
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(n=Count("pk"))
+            .values("n"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def _mark_completed(user, rollup_model, field, unit_ids):
+    """
+    UPDATE ... WHERE NOT completed for existing rows, then INSERT ... ON
+    CONFLICT DO NOTHING for missing ones; rows already completed are never
+    rewritten
+    """
+    now = timezone.now()
+    rollup_model.objects.filter(user=user, completed=False, **{f"{field}_id__in": unit_ids}).update(
+        completed=True,
+        completed_at=Coalesce(F("completed_at"), Value(now, output_field=DateTimeField())),
+    )
+    rollup_model.objects.bulk_create(
+        [
+            rollup_model(user=user, completed=True, first_seen_at=now, completed_at=now, **{f"{field}_id": unit_id})
+            for unit_id in unit_ids
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def _promote(user, level, unit_ids):
+    """ Mark the units of one level the user has just finished; returns their ids """
+    unit_model, rollup_model, children, child_field, done, done_field = LEVELS[level]
+    already = rollup_model.objects.filter(user=user, completed=True).values(f"{level}_id")
+    finished = list(
+        unit_model.objects.filter(id__in=unit_ids)
+        .exclude(id__in=already)
+        .annotate(
+            total=_count(children.objects.all(), child_field),
+            done=_count(done.objects.filter(user=user, completed=True), done_field),
+        )
+        .filter(total__gt=0, done__gte=F("total"))
+        .values_list("id", flat=True)
+    )
+    if finished:
+        _mark_completed(user, rollup_model, level, finished)
+    return finished
+
+
+def _lock(user):
+    # Serializes cascades per user; everything after this sees committed progress
+    CustomUser.objects.select_for_update().filter(pk=user.pk).values_list("pk").first()
+
+
+def cascade(user, main_content_ids, module_ids=None, topic_ids=None):
+    """
+    Recompute the user's rollups for these main contents and everything
+    above them. Parent ids are looked up when not given. Must run inside
+    the caller's transaction after _lock(). Returns the newly completed ids
+    per level.
+    """
+    if module_ids is None:
+        module_ids = set(MainContent.objects.filter(id__in=main_content_ids).values_list("module_id", flat=True))
+    if topic_ids is None:
+        topic_ids = set(Module.objects.filter(id__in=module_ids).values_list("topic_id", flat=True))
+
+    # Every level is recomputed (not only when the one below changed), which
+    # also repairs rollups left behind by the old last-page-only rule
+    return {
+        MAIN_CONTENT: _promote(user, MAIN_CONTENT, main_content_ids),
+        MODULE: _promote(user, MODULE, module_ids),
+        TOPIC: _promote(user, TOPIC, topic_ids),
+    }
+
+
+# -------------------------
+# ENTRY POINTS (views)
+# -------------------------
+
+def _complete_page_row(user, page):
+    """
+    Write the page's row only when that changes it: True when inserted,
+    False when an existing row was flipped, None when it was already
+    completed (nothing written). Goes through create() / save() so the
+    stats and progress bits receivers still run.
+    """
+    row = PageProgress.objects.filter(user=user, page=page).first()
+    if row is None:
+        try:
+            with transaction.atomic():
+                PageProgress.objects.create(user=user, page=page, completed=True)
+            return True
+        except IntegrityError:
+            return None  # inserted by someone else meanwhile (ON CONFLICT DO NOTHING)
+    if row.completed:
+        return None
+    row._was_completed = False  # spares the stats receiver its SELECT
+    row.completed = True
+    row.save(update_fields=["completed"])
+    return False
+
+
+def complete_page(user, page):
+    """
+    page needs main_content__module loaded. Returns (created, newly
+    completed ids per level).
+    """
+    module = page.main_content.module
+    if cached_done(PAGE, user.pk, page.pk):
+        return False, nothing_completed()
+
+    with transaction.atomic():
+        _lock(user)
+        written = _complete_page_row(user, page)
+        # Nothing changed below, so nothing can change above either
+        completed = nothing_completed() if written is None else cascade(
+            user, [page.main_content_id], [module.id], [module.topic_id]
+        )
+    # What CompletePageView needs to answer a repeat without the database
+    remember_done(PAGE, user.pk, page.pk, (page.order, module.topic_id))
+    return bool(written), completed
+
+
+def complete_main_content(user, main_content):
+    """
+    Recompute one main content from its pages. One without pages has
+    nothing to check, so asking for it is enough. Returns (completed,
+    newly completed ids per level).
+    """
+    if cached_done(MAIN_CONTENT, user.pk, main_content.pk):
+        return True, nothing_completed()
+
+    module = main_content.module
+    with transaction.atomic():
+        _lock(user)
+        done = is_completed(user, MainContentProgress, main_content=main_content)
+        if not done and not Page.objects.filter(main_content=main_content).exists():
+            _mark_completed(user, MainContentProgress, MAIN_CONTENT, [main_content.pk])
+        completed = cascade(user, [main_content.id], [module.id], [module.topic_id])
+        done = done or is_completed(user, MainContentProgress, main_content=main_content)
+    if done:
+        remember_done(MAIN_CONTENT, user.pk, main_content.pk)
+    return done, completed
+
+
+def complete_module(user, module):
+    """ Recompute one module (and its topic) from its main contents; returns (completed, newly completed) """
+    if cached_done(MODULE, user.pk, module.pk):
+        return True, nothing_completed()
+
+    with transaction.atomic():
+        _lock(user)
+        completed = nothing_completed()
+        completed[MODULE] = _promote(user, MODULE, [module.id])
+        completed[TOPIC] = _promote(user, TOPIC, [module.topic_id])
+        done = is_completed(user, Progress, module=module)
+    if done:
+        remember_done(MODULE, user.pk, module.pk)
+    return done, completed
+
+
+def is_completed(user, rollup_model, **unit):
+    return rollup_model.objects.filter(user=user, completed=True, **unit).exists()
+
+
+def recompute_user(user, batch_size=500):
+    """
+    Re-run the cascade over every main content the user has progress in,
+    in batches of main contents. Returns the newly completed ids per level.
+    """
+    main_content_ids = sorted(set(
+        PageProgress.objects.filter(user=user, completed=True)
+        .values_list("page__main_content_id", flat=True)
+    ))
+    total = {MAIN_CONTENT: [], MODULE: [], TOPIC: []}
+    for start in range(0, len(main_content_ids), batch_size):
+        with transaction.atomic():
+            _lock(user)
+            for level, ids in cascade(user, main_content_ids[start:start + batch_size]).items():
+                total[level].extend(ids)
+    return total
@@ -0,0 +1,192 @@
+"""
+Append-only learning event stream (page_viewed, page_completed,
+quiz_submitted, video_url_issued).
+
+record() only appends to an in-process buffer, so capturing an event costs
+a lock and a list append instead of an INSERT. A daemon thread hands the
+buffer to the sink every FLUSH_SECONDS, or sooner once BUFFER_SIZE events
+are waiting. The sink is picked by settings.LEARNING_EVENTS:
+
+- DatabaseSink    LearningEvent rows, one bulk_create per batch
+- JsonLinesSink   one JSON object per line, a new file per hour and process
+                  (events-20250101-13-<pid>.jsonl), for shipping elsewhere
+
+"BACKEND": None turns capture off. Events still buffered at exit are
+flushed by an atexit hook; a hard kill loses at most one flush interval.
+A failing sink drops the batch (logged) rather than growing the buffer.
+
+"BUFFERED": False writes every event straight to the sink instead. The
+settings do that under manage.py test: the atexit flush would run after
+the test database is destroyed, i.e. against the real one.
+"""
+import atexit
+import logging
+import os
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import LearningEvent
+from .renderers import dumps
+
+logger = logging.getLogger(__name__)
+
+PAGE_VIEWED = "page_viewed"
+PAGE_COMPLETED = "page_completed"
+QUIZ_SUBMITTED = "quiz_submitted"
+VIDEO_URL_ISSUED = "video_url_issued"
+
+
+# -------------------------
+# SINKS
+# -------------------------
+
+class DatabaseSink:
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+
+    def write(self, events):
+        LearningEvent.objects.bulk_create(
+            [LearningEvent(**event) for event in events], batch_size=self.batch_size
+        )
+
+
+class JsonLinesSink:
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def path(self, now):
+        # Per process, so workers never interleave partial lines
+        return self.directory / f"events-{now:%Y%m%d-%H}-{os.getpid()}.jsonl"
+
+    def write(self, events):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.path(timezone.now()), "ab") as fh:
+            fh.write(b"".join(dumps(event) + b"\n" for event in events))
+
+
+# -------------------------
+# BUFFER
+# -------------------------
+
+class EventBuffer:
+    def __init__(self, sink, buffer_size=500, flush_seconds=5):
+        self.sink = sink
+        self.buffer_size = buffer_size
+        self.flush_seconds = flush_seconds
+        self._reset()
+        # A forked child (gunicorn --preload) must not flush the parent's
+        # events a second time or wait on a lock held by a thread it lost
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._events = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+
+    def add(self, event):
+        with self._lock:
+            self._events.append(event)
+            pending = len(self._events)
+        if self._pid != os.getpid():
+            self._start()
+        if pending >= self.buffer_size:
+            self._wake.set()
+
+    def flush(self):
+        """ Write everything buffered so far, returns how many events """
+        with self._flush_lock:
+            with self._lock:
+                events, self._events = self._events, []
+            if not events:
+                return 0
+            try:
+                self.sink.write(events)
+            except Exception:
+                logger.exception("Dropping %d learning events, sink failed", len(events))
+            return len(events)
+
+    def _start(self):
+        # Also after a fork: threads don't survive it
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name="learning-events", daemon=True).start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+            close_old_connections()
+
+
+class DirectWriter:
+    """ EventBuffer stand-in that writes each event as it comes """
+
+    def __init__(self, sink):
+        self.sink = sink
+
+    def add(self, event):
+        try:
+            self.sink.write([event])
+        except Exception:
+            logger.exception("Dropping a learning event, sink failed")
+
+    def flush(self):
+        return 0
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """ The process-wide EventBuffer (or DirectWriter), None when capture is off """
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                config = getattr(settings, "LEARNING_EVENTS", {})
+                backend = config.get("BACKEND", "SLMapp.events.DatabaseSink")
+                if backend is None:
+                    _buffer = False
+                elif not config.get("BUFFERED", True):
+                    _buffer = DirectWriter(import_string(backend)(**config.get("OPTIONS", {})))
+                else:
+                    _buffer = EventBuffer(
+                        import_string(backend)(**config.get("OPTIONS", {})),
+                        buffer_size=config.get("BUFFER_SIZE", 500),
+                        flush_seconds=config.get("FLUSH_SECONDS", 5),
+                    )
+    return _buffer or None
+
+
+def record(kind, user_id, object_id=None, topic_id=None, **data):
+    """ Queue one event; never raises into the request """
+    buffer = get_buffer()
+    if buffer is None:
+        return
+    buffer.add({
+        "kind": kind,
+        "user_id": user_id,
+        "object_id": object_id,
+        "topic_id": topic_id,
+        "data": data,
+        "created_at": timezone.now(),
+    })
+
+
+def flush():
+    buffer = get_buffer()
+    return buffer.flush() if buffer is not None else 0
+
+
+atexit.register(flush)
@@ -0,0 +1,84 @@
+import zlib
+
+from django.db import models
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+# First byte of the stored value says how the rest is encoded
+RAW = b"r"
+ZLIB = b"z"
+ZSTD = b"s"
+
+# Below this many bytes compression doesn't pay for its header
+MIN_COMPRESS_SIZE = 256
+
+
+def compress_text(value):
+    data = value.encode("utf-8")
+    if len(data) < MIN_COMPRESS_SIZE:
+        return RAW + data
+    if zstandard is not None:
+        return ZSTD + zstandard.ZstdCompressor(level=10).compress(data)
+    return ZLIB + zlib.compress(data, 9)
+
+
+def decompress_text(value):
+    if isinstance(value, str):
+        # Row written before the column was compressed
+        return value
+    value = bytes(value)
+    if not value:
+        return ""
+    marker, data = value[:1], value[1:]
+    if marker == ZLIB:
+        data = zlib.decompress(data)
+    elif marker == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Page content is zstd-compressed, install the zstandard package")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif marker != RAW:
+        raise ValueError(f"Unknown compressed text marker {marker!r}")
+    return data.decode("utf-8")
+
+
+class CompressedTextField(models.BinaryField):
+    """
+    Text column stored compressed (zstd when the optional ``zstandard``
+    package is installed, zlib otherwise). Python code sees a plain str;
+    it can't be filtered on in SQL.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("editable", True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if kwargs.get("editable") is True:
+            del kwargs["editable"]
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return decompress_text(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        return decompress_text(value)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if isinstance(value, str):
+            value = compress_text(value)
+        return super().get_db_prep_value(value, connection, prepared)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def formfield(self, **kwargs):
+        # Admin edits it as a normal textarea
+        return models.TextField().formfield(**kwargs)
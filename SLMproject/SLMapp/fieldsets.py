@@ -0,0 +1,88 @@
+from rest_framework import permissions, serializers
+
+
+def parse_field_list(value):
+    """ "a, b,,c" -> {"a", "b", "c"} """
+    return {name.strip() for name in (value or "").split(",") if name.strip()}
+
+
+class SparseFieldsetMixin:
+    """
+    Lets the client choose what a serializer renders.
+
+    ?fields=a,b,c   trims the top-level serializer of the response (or the
+                    child of a many=True list); nested serializers are not
+                    affected. Unknown names are ignored, "id" is always kept.
+                    Only applies to reads, views can pass fields=... instead.
+                    Serializers built by hand inside a SerializerMethodField
+                    have no parent either, so they pass nested=True.
+
+    ?include=pages,progress
+                    opt-in groups of expensive fields, declared per
+                    serializer in ``include_groups``. Without the parameter
+                    every serializer renders its ``default_includes``; an
+                    explicit list replaces the defaults on every level of
+                    the response, so ?include= alone gives the bare objects.
+    """
+
+    fields_param = "fields"
+    include_param = "include"
+
+    # {"group": ("field", ...)}
+    include_groups = {}
+    default_includes = ()
+
+    def __init__(self, *args, fields=None, nested=False, **kwargs):
+        self._requested_fields = parse_field_list(fields) if isinstance(fields, str) else fields
+        self._nested = nested
+        super().__init__(*args, **kwargs)
+
+    def _is_root(self):
+        if self._nested:
+            return False
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def _request(self):
+        return self.context.get("request")
+
+    def query_param(self, name):
+        request = self._request()
+        if request is None or not self._is_root():
+            return None
+        return request.query_params.get(name)
+
+    @property
+    def includes(self):
+        request = self._request()
+        if request is not None and self.include_param in request.query_params:
+            return parse_field_list(request.query_params[self.include_param])
+        return set(self.default_includes)
+
+    def is_included(self, group):
+        return group in self.includes
+
+    def get_fields(self):
+        fields = super().get_fields()
+
+        requested = self._requested_fields
+        if requested is None:
+            request = self._request()
+            if request is not None and request.method in permissions.SAFE_METHODS:
+                requested = parse_field_list(self.query_param(self.fields_param)) or None
+
+        if requested:
+            for name in list(fields):
+                if name != "id" and name not in requested:
+                    fields.pop(name)
+
+        if self.include_groups:
+            includes = self.includes
+            for group, names in self.include_groups.items():
+                if group in includes:
+                    continue
+                for name in names:
+                    fields.pop(name, None)
+        return fields
@@ -0,0 +1,126 @@
+"""
+Fragment cache for content serializers.
+
+Most of a Topic / Module / MainContent / Page representation is the same
+for every student (titles, descriptions, durations, module_detail ...).
+FragmentCacheMixin caches that user-independent part per object and only
+renders the serializer's ``personalized_fields`` (completed, locked,
+video_url, nested serializers carrying those ...) on each request.
+
+Keys carry the content version, a single ContentVersion row bumped in the
+same transaction as any content write (see SLMapp.signals), so aggregated
+fields such as a module's total_duration never go stale when a child page
+changes. It lives in the database rather than the cache because the
+default locmem cache is per process: a counter there would only be bumped
+in the worker that handled the write. Reading it is one primary key
+lookup per response, shared by every nested serializer.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+
+from .models import ContentVersion
+
+_VERSION_PK = 1
+_CONTEXT_KEY = "_content_generation"
+_PRIMED_KEY = "_content_fragments"
+
+
+def content_generation():
+    generation = ContentVersion.objects.filter(pk=_VERSION_PK).values_list("value", flat=True).first()
+    return 1 if generation is None else generation
+
+
+def content_changed():
+    """ Call on any content write, inside its transaction """
+    bumped = ContentVersion.objects.filter(pk=_VERSION_PK).update(value=F("value") + 1)
+    if not bumped:
+        ContentVersion.objects.get_or_create(pk=_VERSION_PK, defaults={"value": 2})
+
+
+class FragmentListSerializer(serializers.ListSerializer):
+    """ Loads the fragments of a whole list with one cache round trip """
+
+    def to_representation(self, data):
+        items = data.all() if hasattr(data, "all") else data
+        items = list(items)
+        self.child.prime_fragments(items)
+        return [self.child.to_representation(item) for item in items]
+
+
+class FragmentCacheMixin:
+    """
+    Serializers using it should also set
+    ``Meta.list_serializer_class = FragmentListSerializer``.
+    """
+
+    personalized_fields = ()
+
+    def _generation(self):
+        generation = self.context.get(_CONTEXT_KEY)
+        if generation is None:
+            generation = content_generation()
+            # Shared with every nested serializer of this response
+            self.context[_CONTEXT_KEY] = generation
+        return generation
+
+    def _split_fields(self):
+        split = getattr(self, "_fragment_split", None)
+        if split is None:
+            fields = list(self._readable_fields)
+            static = [f for f in fields if f.field_name not in self.personalized_fields]
+            signature = hashlib.md5(
+                ",".join(f.field_name for f in static).encode()
+            ).hexdigest()[:12]
+            prefix = f"frag:{type(self).__module__}.{type(self).__qualname__}:{signature}"
+            split = self._fragment_split = (fields, static, prefix)
+        return split
+
+    def fragment_key(self, instance):
+        prefix = self._split_fields()[2]
+        return f"{prefix}:{self._generation()}:{instance.pk}"
+
+    def prime_fragments(self, instances):
+        keys = [self.fragment_key(instance) for instance in instances]
+        primed = self.context.setdefault(_PRIMED_KEY, {})
+        primed.update(cache.get_many(keys))
+
+    def _render(self, instance, fields):
+        ret = {}
+        for field in fields:
+            try:
+                attribute = field.get_attribute(instance)
+            except SkipField:
+                continue
+            check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+            ret[field.field_name] = None if check_for_none is None else field.to_representation(attribute)
+        return ret
+
+    def to_representation(self, instance):
+        if instance.pk is None:
+            return super().to_representation(instance)
+
+        fields, static, _ = self._split_fields()
+        key = self.fragment_key(instance)
+
+        fragment = self.context.get(_PRIMED_KEY, {}).get(key)
+        if fragment is None:
+            fragment = cache.get(key)
+        if fragment is None:
+            fragment = self._render(instance, static)
+            cache.set(key, fragment, settings.CONTENT_FRAGMENT_CACHE_SECONDS)
+
+        personal = self._render(
+            instance, [f for f in fields if f.field_name in self.personalized_fields]
+        )
+        # Keep the declared field order
+        return {
+            f.field_name: personal[f.field_name] if f.field_name in personal else fragment[f.field_name]
+            for f in fields
+            if f.field_name in personal or f.field_name in fragment
+        }
@@ -0,0 +1,276 @@
+"""
+Funnel analytics: where learners start and where they stop.
+
+Built incrementally from the learning event log (SLMapp.events), since
+progress rows carry no timestamps:
+
+1. page_viewed / page_completed events after the watermark are read in
+   batches (by id, so events flushed late are still picked up)
+2. FunnelLearner rows (per learner and page / main content / module /
+   topic) get their first view and, once the learner has completed every
+   page of the unit, their completion time
+3. FunnelRollup rows are recomputed only for the units and days touched
+   by the batch: learners started, learners completed and the median
+   first-view -> completion time of that day's completions
+
+Run ``manage.py build_funnel_rollups`` periodically; the admin API
+(FunnelView) only reads FunnelRollup.
+"""
+import statistics
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import events
+from .models import (
+    FunnelLearner, FunnelRollup, LearningEvent, MainContent, Module, Page, RollupWatermark, Topic,
+)
+
+PAGE = "page"
+MAIN_CONTENT = "main_content"
+MODULE = "module"
+TOPIC = "topic"
+
+# Smallest unit first: a page completion is counted before its parents see it
+LEVELS = (PAGE, MAIN_CONTENT, MODULE, TOPIC)
+PARENT_LEVEL = {PAGE: MAIN_CONTENT, MAIN_CONTENT: MODULE, MODULE: TOPIC, TOPIC: None}
+
+# Page lookups for the parent units' page counts
+PAGE_FIELD = {
+    MAIN_CONTENT: "main_content_id",
+    MODULE: "main_content__module_id",
+    TOPIC: "main_content__module__topic_id",
+}
+
+# level -> (model, title field)
+LEVEL_MODELS = {
+    PAGE: (Page, "title"),
+    MAIN_CONTENT: (MainContent, "title"),
+    MODULE: (Module, "title"),
+    TOPIC: (Topic, "name"),
+}
+
+WATERMARK = "funnel"
+DEFAULT_BATCH_SIZE = 20000
+
+
+def _day(dt):
+    return timezone.localtime(dt).date()
+
+
+def _day_bounds(first, last):
+    tz = timezone.get_current_timezone()
+    return (
+        datetime.combine(first, time.min, tzinfo=tz),
+        datetime.combine(last + timedelta(days=1), time.min, tzinfo=tz),
+    )
+
+
+# -------------------------
+# BUILD
+# -------------------------
+
+def _page_units(page_ids):
+    """ page id -> {level: object id} for pages that still exist """
+    rows = Page.objects.filter(id__in=page_ids).values_list(
+        "id", "main_content_id", "main_content__module_id", "main_content__module__topic_id"
+    )
+    return {
+        page_id: {PAGE: page_id, MAIN_CONTENT: mc_id, MODULE: module_id, TOPIC: topic_id}
+        for page_id, mc_id, module_id, topic_id in rows
+    }
+
+
+def _page_totals(units):
+    """ {(level, object id): number of pages} for the units in play """
+    totals = {(PAGE, page_id): 1 for page_id in units}
+    for level, field in PAGE_FIELD.items():
+        ids = {unit[level] for unit in units.values()}
+        counts = Page.objects.filter(**{f"{field}__in": ids}).values_list(field).annotate(n=Count("id"))
+        totals.update({(level, object_id): n for object_id, n in counts})
+    return totals
+
+
+def _load_learners(units, user_ids):
+    learners = {}
+    for level in LEVELS:
+        ids = {unit[level] for unit in units.values()}
+        for row in FunnelLearner.objects.filter(level=level, object_id__in=ids, user_id__in=user_ids):
+            learners[(level, row.object_id, row.user_id)] = row
+    return learners
+
+
+def _apply(batch):
+    """
+    Fold a batch of events into FunnelLearner. Returns the units / days
+    whose rollups need recomputing and each unit's parent id.
+    """
+    units = _page_units({event.object_id for event in batch})
+    totals = _page_totals(units)
+    learners = _load_learners(units, {event.user_id for event in batch})
+    changed = {}
+    touched = defaultdict(set)  # (level, object id) -> days
+    parents = {}
+
+    for event in sorted(batch, key=lambda e: e.created_at):
+        unit = units.get(event.object_id)
+        if unit is None:
+            continue  # page deleted since
+
+        page_row = learners.get((PAGE, unit[PAGE], event.user_id))
+        newly_completed = event.kind == events.PAGE_COMPLETED and (
+            page_row is None or page_row.completed_at is None
+        )
+
+        for level in LEVELS:
+            key = (level, unit[level], event.user_id)
+            unit_key = key[:2]
+            parent_level = PARENT_LEVEL[level]
+            parents[unit_key] = unit[parent_level] if parent_level else None
+
+            row = learners.get(key)
+            if row is None:
+                row = learners[key] = FunnelLearner(
+                    level=level, object_id=unit[level], user_id=event.user_id,
+                    first_seen_at=event.created_at,
+                )
+                touched[unit_key].add(_day(event.created_at))
+                changed[key] = row
+            elif event.created_at < row.first_seen_at:
+                touched[unit_key].update((_day(row.first_seen_at), _day(event.created_at)))
+                if row.completed_at is not None:
+                    touched[unit_key].add(_day(row.completed_at))  # its duration changed
+                row.first_seen_at = event.created_at
+                changed[key] = row
+
+            if newly_completed and row.completed_at is None:
+                row.completed_pages += 1
+                if row.completed_pages >= totals.get(unit_key, 1):
+                    row.completed_at = event.created_at
+                    touched[unit_key].add(_day(event.created_at))
+                changed[key] = row
+
+    # One upsert for new and existing rows; bulk_update's CASE per row is far slower
+    FunnelLearner.objects.bulk_create(
+        changed.values(),
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["level", "object_id", "user_id"],
+        update_fields=["first_seen_at", "completed_at", "completed_pages"],
+    )
+    return touched, parents
+
+
+def _rebuild_rollups(touched, parents):
+    by_level = defaultdict(dict)
+    for (level, object_id), days in touched.items():
+        by_level[level][object_id] = days
+
+    rollups = []
+    for level, objects in by_level.items():
+        all_days = set().union(*objects.values())
+        start, end = _day_bounds(min(all_days), max(all_days))
+        rows = FunnelLearner.objects.filter(level=level, object_id__in=objects).filter(
+            Q(first_seen_at__gte=start, first_seen_at__lt=end)
+            | Q(completed_at__gte=start, completed_at__lt=end)
+        ).values_list("object_id", "first_seen_at", "completed_at")
+
+        started = defaultdict(int)
+        durations = defaultdict(list)
+        for object_id, first_seen_at, completed_at in rows:
+            started[(object_id, _day(first_seen_at))] += 1
+            if completed_at is not None:
+                seconds = max(0, (completed_at - first_seen_at).total_seconds())
+                durations[(object_id, _day(completed_at))].append(seconds)
+
+        for object_id, days in objects.items():
+            for day in days:
+                done = durations.get((object_id, day), [])
+                rollups.append(FunnelRollup(
+                    day=day,
+                    level=level,
+                    object_id=object_id,
+                    parent_id=parents.get((level, object_id)),
+                    started=started.get((object_id, day), 0),
+                    completed=len(done),
+                    median_seconds=round(statistics.median(done)) if done else None,
+                ))
+
+    FunnelRollup.objects.bulk_create(
+        rollups,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["level", "object_id", "day"],
+        update_fields=["parent_id", "started", "completed", "median_seconds"],
+    )
+    return len(rollups)
+
+
+def update_rollups(batch_size=DEFAULT_BATCH_SIZE):
+    """ Process every event after the watermark; returns how many """
+    processed = 0
+    while True:
+        with transaction.atomic():
+            # The lock keeps two runs from counting the same batch twice
+            mark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=WATERMARK)
+            batch = list(
+                LearningEvent.objects.filter(
+                    id__gt=mark.position,
+                    kind__in=(events.PAGE_VIEWED, events.PAGE_COMPLETED),
+                ).order_by("id")[:batch_size]
+            )
+            if not batch:
+                return processed
+            _rebuild_rollups(*_apply(batch))
+            mark.position = batch[-1].id
+            mark.save(update_fields=["position", "updated_at"])
+        processed += len(batch)
+
+
+def reset_rollups():
+    with transaction.atomic():
+        FunnelRollup.objects.all().delete()
+        FunnelLearner.objects.all().delete()
+        RollupWatermark.objects.filter(name=WATERMARK).delete()
+
+
+# -------------------------
+# READ (admin API)
+# -------------------------
+
+def funnel(level, parent_id=None, start=None, end=None):
+    """
+    Units of one level (optionally under one parent) in course order, each
+    with window totals and the per-day rollups between start and end.
+    """
+    end = end or timezone.localdate()
+    start = start or end - timedelta(days=29)
+
+    rollups = FunnelRollup.objects.filter(level=level, day__gte=start, day__lte=end)
+    if parent_id is not None:
+        rollups = rollups.filter(parent_id=parent_id)
+
+    days = defaultdict(list)
+    for row in rollups.order_by("day"):
+        days[row.object_id].append({
+            "date": row.day,
+            "started": row.started,
+            "completed": row.completed,
+            "median_seconds": row.median_seconds,
+        })
+
+    model, title_field = LEVEL_MODELS[level]
+    units = model.objects.filter(id__in=days).order_by("order", "id").values_list("id", title_field)
+    return [
+        {
+            "id": object_id,
+            "title": title,
+            "started": sum(day["started"] for day in days[object_id]),
+            "completed": sum(day["completed"] for day in days[object_id]),
+            "days": days[object_id],
+        }
+        for object_id, title in units
+    ]
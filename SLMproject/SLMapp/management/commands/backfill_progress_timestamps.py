@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from SLMapp.progress import BACKFILL_BATCH_SIZE, backfill_timestamps
+
+
+class Command(BaseCommand):
+    help = "Fill completed_at / first_seen_at on progress rows written before those columns existed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+        parser.add_argument(
+            "--fallback-now",
+            action="store_true",
+            help="stamp completed rows with no recorded history with the current time",
+        )
+
+    def handle(self, *args, **options):
+        report = backfill_timestamps(
+            batch_size=options["batch_size"],
+            fallback=timezone.now() if options["fallback_now"] else None,
+        )
+        for name, count in report.items():
+            self.stdout.write(f"{name}: {count}")
+        self.stdout.write(self.style.SUCCESS("Backfill done"))
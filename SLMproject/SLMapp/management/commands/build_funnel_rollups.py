@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from SLMapp import funnel
+
+
+class Command(BaseCommand):
+    help = "Fold new learning events into the daily funnel rollups"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=funnel.DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            "--rebuild", action="store_true", help="drop the rollups and start from the first event"
+        )
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            funnel.reset_rollups()
+
+        started = time.monotonic()
+        processed = funnel.update_rollups(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {processed} events in {time.monotonic() - started:.1f}s"
+        ))
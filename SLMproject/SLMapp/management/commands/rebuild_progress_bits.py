@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from SLMapp.progress_bits import rebuild, repair_slots
+
+
+class Command(BaseCommand):
+    help = "Recompute the page completion bitsets from PageProgress"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", help="only this user id (repeatable)")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        repaired = repair_slots()
+        if repaired:
+            self.stdout.write(f"Gave {repaired} pages a missing progress slot")
+        written = rebuild(user_ids=options["user"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} progress words in {time.monotonic() - started:.1f}s"
+        ))
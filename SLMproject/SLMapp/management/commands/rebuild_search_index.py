@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from SLMapp.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Re-create the full-text search index from all content"
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with transaction.atomic():
+            count = rebuild_index()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"✅ Indexed {count} documents in {elapsed:.1f}s"))
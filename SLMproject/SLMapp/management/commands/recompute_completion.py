@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import CustomUser
+from SLMapp.completion import recompute_user
+from SLMapp.models import PageProgress
+
+
+class Command(BaseCommand):
+    help = "Re-run the completion cascade for users with page progress (repairs missed rollups)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", help="only this user id (repeatable)")
+
+    def handle(self, *args, **options):
+        user_ids = PageProgress.objects.filter(completed=True).values_list("user_id", flat=True).distinct()
+        if options["user"]:
+            user_ids = user_ids.filter(user_id__in=options["user"])
+
+        totals = {}
+        for user in CustomUser.objects.filter(id__in=user_ids).iterator():
+            for level, ids in recompute_user(user).items():
+                totals[level] = totals.get(level, 0) + len(ids)
+        for level, count in totals.items():
+            self.stdout.write(f"{level}: {count} newly completed")
+        self.stdout.write(self.style.SUCCESS("Completion recomputed"))
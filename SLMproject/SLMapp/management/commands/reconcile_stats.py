@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from SLMapp import stats
+
+
+class Command(BaseCommand):
+    help = "Recount dashboard counters, refresh active learner counts and snapshot today's values"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--no-snapshot",
+            action="store_true",
+            help="Only fix the counters, don't write today's chart data point",
+        )
+
+    def handle(self, *args, **options):
+        drift = stats.reconcile()
+        for name, (old, new) in sorted(drift.items()):
+            self.stdout.write(f"{name}: {old} -> {new}")
+
+        if not options["no_snapshot"]:
+            stats.snapshot()
+
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {len(stats.SOURCES)} counters, {len(drift)} changed"))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from SLMapp.models import Page
+from SLMapp.rendering import rendered_page
+
+
+class Command(BaseCommand):
+    help = "Render every page's lesson content into the render cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="re-render even if cached")
+        parser.add_argument("--topic", type=int, help="only pages of this topic")
+
+    def handle(self, *args, **options):
+        pages = Page.objects.only("id", "content", "video_id").order_by("id")
+        if options["topic"]:
+            pages = pages.filter(main_content__module__topic_id=options["topic"])
+
+        start = time.perf_counter()
+        count = 0
+        for page in pages.iterator(chunk_size=200):
+            rendered_page(page, refresh=options["force"])
+            count += 1
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"✅ Warmed {count} pages in {elapsed:.1f}s"))
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+re_accepts_br = _lazy_re_compile(r"\bbr\b")
+
+# Streams that must reach the client chunk by chunk
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+
+def never_compress(response):
+    """ Keep a response carrying a secret (a signed video URL) uncompressed """
+    response.never_compress = True
+    return response
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware plus brotli (when the optional ``brotli`` package is
+    installed and the client sends "br").
+
+    Never compressed: server-sent events, responses under
+    settings.COMPRESSION_EXCLUDED_PATHS (the JWT endpoints) and responses
+    marked with never_compress() (pages with a signed video URL).
+    Compressing a secret next to attacker-influenced input leaks it
+    through the length (BREACH).
+
+    Put it first in MIDDLEWARE so ConditionalGetMiddleware sees the
+    uncompressed body; the ETag is weakened the way GZipMiddleware does.
+    """
+
+    min_length = 200
+
+    def process_response(self, request, response):
+        if response.get("Content-Type", "").startswith(UNCOMPRESSED_TYPES):
+            return response
+        if getattr(response, "never_compress", False):
+            return response
+        if request.path_info.startswith(tuple(getattr(settings, "COMPRESSION_EXCLUDED_PATHS", ()))):
+            return response
+
+        ae = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        if (
+            brotli is None
+            or response.streaming
+            or not re_accepts_br.search(ae)
+            or response.has_header("Content-Encoding")
+            or len(response.content) < self.min_length
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed = brotli.compress(response.content, quality=5)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(compressed))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
@@ -0,0 +1,68 @@
+import SLMapp.fields
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def compress_existing(apps, schema_editor):
+    Page = apps.get_model("SLMapp", "Page")
+    batch = []
+    for page in Page.objects.only("id", "content").iterator(chunk_size=BATCH_SIZE):
+        page.content_compressed = page.content
+        batch.append(page)
+        if len(batch) >= BATCH_SIZE:
+            Page.objects.bulk_update(batch, ["content_compressed"])
+            batch = []
+    if batch:
+        Page.objects.bulk_update(batch, ["content_compressed"])
+
+
+def decompress_existing(apps, schema_editor):
+    Page = apps.get_model("SLMapp", "Page")
+    batch = []
+    for page in Page.objects.only("id", "content_compressed").iterator(chunk_size=BATCH_SIZE):
+        page.content = page.content_compressed
+        batch.append(page)
+        if len(batch) >= BATCH_SIZE:
+            Page.objects.bulk_update(batch, ["content"])
+            batch = []
+    if batch:
+        Page.objects.bulk_update(batch, ["content"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("SLMapp", "0011_muxaccount_page_mux_account"),
+    ]
+
+    # Copy into a new column instead of altering text -> blob in place, a
+    # cast is backend specific (bytea on Postgres would keep the raw text)
+    operations = [
+        migrations.AddField(
+            model_name="page",
+            name="content_compressed",
+            field=SLMapp.fields.CompressedTextField(null=True),
+        ),
+        # Nullable so the reverse migration can re-add it before refilling
+        migrations.AlterField(
+            model_name="page",
+            name="content",
+            field=models.TextField(null=True),
+        ),
+        migrations.RunPython(compress_existing, decompress_existing),
+        migrations.RemoveField(
+            model_name="page",
+            name="content",
+        ),
+        migrations.RenameField(
+            model_name="page",
+            old_name="content_compressed",
+            new_name="content",
+        ),
+        migrations.AlterField(
+            model_name="page",
+            name="content",
+            field=SLMapp.fields.CompressedTextField(),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:14
+
+from django.db import migrations, models
+
+
+def install_search_backend(apps, schema_editor):
+    from SLMapp.search import install_backend
+
+    install_backend(schema_editor)
+
+
+def uninstall_search_backend(apps, schema_editor):
+    from SLMapp.search import uninstall_backend
+
+    uninstall_backend(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("SLMapp", "0012_page_compressed_content"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchDocument",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("topic", "Topic"),
+                            ("module", "Module"),
+                            ("maincontent", "Main content"),
+                            ("page", "Page"),
+                            ("question", "Question"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("object_id", models.PositiveIntegerField()),
+                ("topic_id", models.PositiveIntegerField(db_index=True, null=True)),
+                ("module_id", models.PositiveIntegerField(db_index=True, null=True)),
+                (
+                    "main_content_id",
+                    models.PositiveIntegerField(db_index=True, null=True),
+                ),
+                ("title", models.CharField(blank=True, max_length=255)),
+                ("body", models.TextField(blank=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("kind", "object_id"), name="search_doc_unique_object"
+                    )
+                ],
+            },
+        ),
+        # FTS5 table + triggers on SQLite, tsvector column + GIN index on Postgres
+        migrations.RunPython(install_search_backend, uninstall_search_backend),
+    ]
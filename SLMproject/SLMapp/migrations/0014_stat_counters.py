@@ -0,0 +1,76 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:20
+
+from django.db import migrations, models
+
+# Counter name -> (app, model, filter); the windowed ones are filled by reconcile_stats
+INITIAL_COUNTS = {
+    "users": ("accounts", "CustomUser", {}),
+    "topics": ("SLMapp", "Topic", {}),
+    "modules": ("SLMapp", "Module", {}),
+    "main_contents": ("SLMapp", "MainContent", {}),
+    "pages": ("SLMapp", "Page", {}),
+    "page_completions": ("SLMapp", "PageProgress", {"completed": True}),
+    "quiz_attempts": ("SLMapp", "QuizResult", {}),
+    "quiz_passes": ("SLMapp", "QuizResult", {"passed": True}),
+}
+
+
+def seed_counters(apps, schema_editor):
+    StatCounter = apps.get_model("SLMapp", "StatCounter")
+    StatCounter.objects.bulk_create([
+        StatCounter(name=name, value=apps.get_model(app, model).objects.filter(**filters).count())
+        for name, (app, model, filters) in INITIAL_COUNTS.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("SLMapp", "0013_searchdocument"),
+        ("accounts", "0018_userlastpage_updated_at_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("value", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="StatSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("name", models.CharField(max_length=50)),
+                ("value", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("name", "day"), name="stat_snapshot_unique_day"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
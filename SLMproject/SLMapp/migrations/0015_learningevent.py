@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("SLMapp", "0014_stat_counters"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LearningEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("page_viewed", "Page viewed"),
+                            ("page_completed", "Page completed"),
+                            ("quiz_submitted", "Quiz submitted"),
+                            ("video_url_issued", "Video URL issued"),
+                        ],
+                        max_length=30,
+                    ),
+                ),
+                ("user_id", models.PositiveIntegerField()),
+                ("object_id", models.PositiveIntegerField(null=True)),
+                ("topic_id", models.PositiveIntegerField(null=True)),
+                ("data", models.JSONField(blank=True, default=dict)),
+                ("created_at", models.DateTimeField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["kind", "created_at"], name="event_kind_time_idx"
+                    ),
+                    models.Index(
+                        fields=["user_id", "created_at"], name="event_user_time_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("SLMapp", "0016_funnel_rollups"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="maincontentprogress",
+            name="completed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="maincontentprogress",
+            name="first_seen_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="pageprogress",
+            name="completed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="pageprogress",
+            name="first_seen_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="progress",
+            name="completed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="progress",
+            name="first_seen_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="maincontentprogress",
+            index=models.Index(
+                fields=["user", "completed_at"], name="mcprogress_user_done_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="maincontentprogress",
+            index=models.Index(fields=["completed_at"], name="mcprogress_done_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="pageprogress",
+            index=models.Index(
+                fields=["user", "completed_at"], name="pageprogress_user_done_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pageprogress",
+            index=models.Index(fields=["completed_at"], name="pageprogress_done_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="progress",
+            index=models.Index(
+                fields=["user", "completed_at"], name="progress_user_done_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="progress",
+            index=models.Index(fields=["completed_at"], name="progress_done_idx"),
+        ),
+    ]
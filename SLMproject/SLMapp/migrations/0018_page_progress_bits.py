@@ -0,0 +1,87 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from SLMapp.progress_bits import rebuild
+
+
+def assign_slots(apps, schema_editor):
+    # Slots follow the current page order inside each main content
+    Page = apps.get_model("SLMapp", "Page")
+    pages = Page.objects.order_by("main_content_id", "order", "id").only("id", "main_content_id")
+    batch, slot, current = [], 0, None
+    for page in pages.iterator():
+        if page.main_content_id != current:
+            current, slot = page.main_content_id, 0
+        page.progress_slot = slot
+        slot += 1
+        batch.append(page)
+    Page.objects.bulk_update(batch, ["progress_slot"], batch_size=500)
+
+
+def build_bits(apps, schema_editor):
+    rebuild(apps.get_model("SLMapp", "PageProgress"), apps.get_model("SLMapp", "PageProgressBits"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("SLMapp", "0017_progress_timestamps"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PageProgressBits",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("word", models.PositiveSmallIntegerField(default=0)),
+                ("bits", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="page",
+            name="progress_slot",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(assign_slots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="page",
+            constraint=models.UniqueConstraint(
+                fields=("main_content", "progress_slot"),
+                name="page_progress_slot_unique",
+            ),
+        ),
+        migrations.AddField(
+            model_name="pageprogressbits",
+            name="main_content",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to="SLMapp.maincontent"
+            ),
+        ),
+        migrations.AddField(
+            model_name="pageprogressbits",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="pageprogressbits",
+            constraint=models.UniqueConstraint(
+                fields=("user", "main_content", "word"),
+                name="page_progress_bits_unique",
+            ),
+        ),
+        migrations.RunPython(build_bits, migrations.RunPython.noop),
+    ]
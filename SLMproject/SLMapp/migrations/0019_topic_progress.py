@@ -0,0 +1,85 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def seed_topic_progress(apps, schema_editor):
+    # A topic is complete when every one of its modules is
+    Module = apps.get_model("SLMapp", "Module")
+    Progress = apps.get_model("SLMapp", "Progress")
+    TopicProgress = apps.get_model("SLMapp", "TopicProgress")
+
+    module_counts = dict(
+        Module.objects.values_list("topic_id").annotate(n=Count("id")).order_by()
+    )
+    done = (
+        Progress.objects.filter(completed=True)
+        .values_list("user_id", "module__topic_id")
+        .annotate(n=Count("id"), first=Min("first_seen_at"), last=Max("completed_at"))
+        .order_by()
+    )
+    TopicProgress.objects.bulk_create(
+        [
+            TopicProgress(
+                user_id=user_id, topic_id=topic_id, completed=True,
+                first_seen_at=first, completed_at=last,
+            )
+            for user_id, topic_id, n, first, last in done.iterator()
+            if n >= module_counts.get(topic_id, 0) > 0
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("SLMapp", "0018_page_progress_bits"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TopicProgress",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("first_seen_at", models.DateTimeField(blank=True, null=True)),
+                ("completed_at", models.DateTimeField(blank=True, null=True)),
+                ("completed", models.BooleanField(default=False)),
+                (
+                    "topic",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="SLMapp.topic"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["user", "completed_at"], name="tprogress_user_done_idx"
+                    ),
+                    models.Index(fields=["completed_at"], name="tprogress_done_idx"),
+                ],
+                "unique_together": {("user", "topic")},
+            },
+        ),
+        migrations.RunPython(seed_topic_progress, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:20
+
+from django.db import migrations
+
+from SLMapp.search import rebuild_index
+
+
+def index_content(apps, schema_editor):
+    # Signals only index what is saved from now on
+    rebuild_index(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("SLMapp", "0020_content_version"),
+    ]
+
+    operations = [
+        migrations.RunPython(index_content, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from accounts.models import CustomUser
+from .fields import CompressedTextField
 
 def format_duration(minutes):
     hours, mins = divmod(minutes, 60)
@@ -37,6 +39,9 @@ class Module(models.Model):
 
     @property
     def total_duration(self):
+        # Annotated by progress.with_module_progress() on list/detail queries
+        if getattr(self, "total_minutes", None) is not None:
+            return self.total_minutes
         return sum(main.total_duration for main in self.main_contents.all())
 
     @property
@@ -106,7 +111,7 @@ class MuxAccount(models.Model):
 class Page(models.Model):
     main_content = models.ForeignKey(MainContent, on_delete=models.CASCADE, related_name="pages")
     title = models.CharField(max_length=200, blank=True, default="Untitled Page")
-    content = models.TextField()
+    content = CompressedTextField()  # lesson HTML/Markdown, stored compressed
     order = models.IntegerField(default=0)
     time_duration = models.PositiveIntegerField(default=0, help_text="Duration in minutes")
     video_id = models.CharField(max_length=255, blank=True, null=True)
@@ -116,11 +121,70 @@ class Page(models.Model):
         null=True,
         blank=True
     )
+    # Bit index in PageProgressBits, stable across reorders (SLMapp.progress_bits)
+    progress_slot = models.PositiveIntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["main_content", "progress_slot"], name="page_progress_slot_unique"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Holds the slot lock taken in pre_save until the row is written
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.main_content.title} - Page {self.order}"
 
 
-class Progress(models.Model):
+class ProgressTimestamps(models.Model):
+    """
+    first_seen_at: when the progress row was created
+    completed_at:  the first time completed became True, never moved after
+
+    Both are filled in save(), so the update_or_create(defaults={"completed":
+    True}) call sites keep working; rows from before these columns existed
+    are filled by manage.py backfill_progress_timestamps.
+    """
+    first_seen_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        now = timezone.now()
+        stamped = []
+        if self._state.adding and self.first_seen_at is None:
+            self.first_seen_at = now
+            stamped.append("first_seen_at")
+        if self.completed and self.completed_at is None:
+            self.completed_at = now
+            stamped.append("completed_at")
+
+        # update_or_create saves with update_fields=<the defaults' keys>
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and stamped:
+            kwargs["update_fields"] = {*update_fields, *stamped}
+        super().save(*args, **kwargs)
+
+
+class TopicProgress(ProgressTimestamps):
+    """ Tracks topic-level completion (kept by SLMapp.completion) """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE)
+    completed = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ('user', 'topic')
+        indexes = [
+            models.Index(fields=["user", "completed_at"], name="tprogress_user_done_idx"),
+            models.Index(fields=["completed_at"], name="tprogress_done_idx"),
+        ]
+
+
+class Progress(ProgressTimestamps):
     """ Tracks module-level completion """
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     module = models.ForeignKey(Module, on_delete=models.CASCADE)
@@ -128,9 +192,13 @@ class Progress(models.Model):
 
     class Meta:
         unique_together = ('user', 'module')
+        indexes = [
+            models.Index(fields=["user", "completed_at"], name="progress_user_done_idx"),
+            models.Index(fields=["completed_at"], name="progress_done_idx"),
+        ]
 
 
-class MainContentProgress(models.Model):
+class MainContentProgress(ProgressTimestamps):
     """ Tracks maincontent-level completion """
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     main_content = models.ForeignKey(MainContent, on_delete=models.CASCADE)
@@ -138,9 +206,13 @@ class MainContentProgress(models.Model):
 
     class Meta:
         unique_together = ('user', 'main_content')
+        indexes = [
+            models.Index(fields=["user", "completed_at"], name="mcprogress_user_done_idx"),
+            models.Index(fields=["completed_at"], name="mcprogress_done_idx"),
+        ]
 
 
-class PageProgress(models.Model):
+class PageProgress(ProgressTimestamps):
     """ Tracks page-level completion (for sequential flow) """
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     page = models.ForeignKey(Page, on_delete=models.CASCADE)
@@ -148,6 +220,27 @@ class PageProgress(models.Model):
 
     class Meta:
         unique_together = ('user', 'page')
+        indexes = [
+            models.Index(fields=["user", "completed_at"], name="pageprogress_user_done_idx"),
+            models.Index(fields=["completed_at"], name="pageprogress_done_idx"),
+        ]
+
+
+class PageProgressBits(models.Model):
+    """
+    Compact page completion: one bit per page (Page.progress_slot) for a
+    user and main content, 63 pages per word. Written alongside
+    PageProgress, see SLMapp.progress_bits.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    main_content = models.ForeignKey(MainContent, on_delete=models.CASCADE)
+    word = models.PositiveSmallIntegerField(default=0)  # progress_slot // 63
+    bits = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "main_content", "word"], name="page_progress_bits_unique"),
+        ]
 
 
 class Quiz(models.Model):
@@ -183,3 +276,158 @@ class QuizResult(models.Model):
     score = models.IntegerField()
     passed = models.BooleanField(default=False)
     completed_at = models.DateTimeField(auto_now_add=True)
+
+
+class SearchDocument(models.Model):
+    """
+    One row per searchable Topic / Module / MainContent / Page / Question,
+    kept in sync by SLMapp.signals. The full-text index itself (FTS5 table
+    on SQLite, tsvector column on Postgres) is created by migration 0013,
+    see SLMapp.search.
+    """
+    KIND_CHOICES = [
+        ("topic", "Topic"),
+        ("module", "Module"),
+        ("maincontent", "Main content"),
+        ("page", "Page"),
+        ("question", "Question"),
+    ]
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+
+    # Where the hit lives, for enrollment filtering and links
+    topic_id = models.PositiveIntegerField(null=True, db_index=True)
+    module_id = models.PositiveIntegerField(null=True, db_index=True)
+    main_content_id = models.PositiveIntegerField(null=True, db_index=True)
+
+    title = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)  # plain text, HTML stripped
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "object_id"], name="search_doc_unique_object"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}: {self.title}"
+
+
+
+class StatCounter(models.Model):
+    """ One row per dashboard metric, kept current by SLMapp.stats """
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+class StatSnapshot(models.Model):
+    """ Daily copy of every counter, for dashboard charts """
+    day = models.DateField()
+    name = models.CharField(max_length=50)
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["name", "day"], name="stat_snapshot_unique_day"),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.name} = {self.value}"
+
+
+class LearningEvent(models.Model):
+    """
+    Append-only analytics log, written in batches by SLMapp.events.
+    Plain id columns instead of foreign keys: events outlive the rows they
+    mention and inserts skip constraint checks.
+    """
+    KIND_CHOICES = [
+        ("page_viewed", "Page viewed"),
+        ("page_completed", "Page completed"),
+        ("quiz_submitted", "Quiz submitted"),
+        ("video_url_issued", "Video URL issued"),
+    ]
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    user_id = models.PositiveIntegerField()
+    object_id = models.PositiveIntegerField(null=True)  # page / quiz id
+    topic_id = models.PositiveIntegerField(null=True)
+    data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField()  # when it happened, not when it was flushed
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["kind", "created_at"], name="event_kind_time_idx"),
+            models.Index(fields=["user_id", "created_at"], name="event_user_time_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} user={self.user_id} {self.created_at}"
+
+
+FUNNEL_LEVEL_CHOICES = [
+    ("page", "Page"),
+    ("main_content", "Main content"),
+    ("module", "Module"),
+    ("topic", "Topic"),
+]
+
+
+class FunnelLearner(models.Model):
+    """
+    Per learner and content unit: when they first opened it and when they
+    finished its last page. Built from LearningEvent by SLMapp.funnel.
+    """
+    level = models.CharField(max_length=20, choices=FUNNEL_LEVEL_CHOICES)
+    object_id = models.PositiveIntegerField()
+    user_id = models.PositiveIntegerField()
+    first_seen_at = models.DateTimeField()
+    completed_at = models.DateTimeField(null=True)
+    completed_pages = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["level", "object_id", "user_id"], name="funnel_learner_unique"),
+        ]
+
+
+class FunnelRollup(models.Model):
+    """ Daily funnel numbers per content unit, see SLMapp.funnel """
+    day = models.DateField()
+    level = models.CharField(max_length=20, choices=FUNNEL_LEVEL_CHOICES)
+    object_id = models.PositiveIntegerField()
+    parent_id = models.PositiveIntegerField(null=True)  # main content of a page, module of a main content...
+    started = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    median_seconds = models.PositiveIntegerField(null=True)  # first view -> completion, for that day's completions
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["level", "object_id", "day"], name="funnel_rollup_unique_day"),
+        ]
+        indexes = [
+            models.Index(fields=["level", "parent_id", "day"], name="funnel_rollup_parent_idx"),
+        ]
+
+
+class RollupWatermark(models.Model):
+    """ Last LearningEvent id an incremental job has processed """
+    name = models.CharField(max_length=50, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+
+class ContentVersion(models.Model):
+    """ Single row bumped with every content write, keys SLMapp.fragments """
+    value = models.BigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"content v{self.value}"
@@ -0,0 +1,34 @@
+from rest_framework import permissions
+
+from accounts.enrollment import is_enrolled
+from .models import MainContent, Module, Page, Quiz, Topic
+
+
+def topic_id_for(obj):
+    """ Topic a piece of content belongs to (select_related the chain) """
+    if isinstance(obj, Topic):
+        return obj.id
+    if isinstance(obj, Module):
+        return obj.topic_id
+    if isinstance(obj, MainContent):
+        return obj.module.topic_id
+    if isinstance(obj, Page):
+        return obj.main_content.module.topic_id
+    if isinstance(obj, Quiz):
+        # A quiz not attached to a main content belongs to no topic: only
+        # staff (who see everything) can reach it
+        return obj.main_content.module.topic_id if obj.main_content else None
+    raise TypeError(f"No topic for {type(obj).__name__}")
+
+
+class IsEnrolled(permissions.IsAuthenticated):
+    """
+    Content is only visible to users enrolled in its topic (superusers,
+    staff and admins see everything, see sees_all_content). Membership is a
+    set lookup against the cached enrollment.
+    """
+
+    message = "You do not have access to this content."
+
+    def has_object_permission(self, request, view, obj):
+        return is_enrolled(request.user, topic_id_for(obj))
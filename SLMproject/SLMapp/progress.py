@@ -0,0 +1,174 @@
+"""
+Progress helpers: completion timestamps (ProgressTimestamps) and the
+time-windowed queries they make possible. The windowed reads are range
+scans on the (user, completed_at) indexes.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from . import events, progress_bits
+from .models import LearningEvent, MainContentProgress, Page, PageProgress, Progress
+
+STREAK_LOOKBACK_DAYS = 366
+BACKFILL_BATCH_SIZE = 5000
+
+
+# -------------------------
+# WINDOWED READS
+# -------------------------
+
+def week_start(today=None):
+    today = today or timezone.localdate()
+    monday = today - timedelta(days=today.weekday())
+    return datetime.combine(monday, time.min, tzinfo=timezone.get_current_timezone())
+
+
+def pages_completed_since(user, since):
+    return PageProgress.objects.filter(user=user, completed_at__gte=since).count()
+
+
+def streak_days(user, today=None):
+    """ Consecutive days with a page completion, ending today or yesterday """
+    today = today or timezone.localdate()
+    since = datetime.combine(
+        today - timedelta(days=STREAK_LOOKBACK_DAYS), time.min, tzinfo=timezone.get_current_timezone()
+    )
+    days = set(
+        PageProgress.objects.filter(user=user, completed_at__gte=since)
+        .annotate(day=TruncDate("completed_at"))
+        .values_list("day", flat=True)
+        .distinct()
+    )
+    day = today if today in days else today - timedelta(days=1)
+    streak = 0
+    while day in days:
+        streak += 1
+        day -= timedelta(days=1)
+    return streak
+
+
+# -------------------------
+# MODULE COMPLETION (annotated, no per-row queries)
+# -------------------------
+
+def with_module_progress(queryset, user):
+    """
+    Annotate modules with page_count, total_minutes and the user's
+    completed_pages in the module query itself: aggregates over the
+    module's pages plus one correlated count of its completed pages, read
+    from the bitsets or PageProgress like every other completion read
+    (progress_bits.page_completed).
+    """
+    completed = (
+        Page.objects.filter(main_content__module=OuterRef("pk"))
+        .filter(progress_bits.page_completed(user.pk))
+        .order_by()
+        .values("main_content__module")
+        .annotate(n=Count("pk"))
+        .values("n")
+    )
+    return queryset.annotate(
+        page_count=Count("main_contents__pages"),
+        total_minutes=Coalesce(Sum("main_contents__pages__time_duration"), 0),
+        completed_pages=Coalesce(Subquery(completed, output_field=IntegerField()), 0),
+    )
+
+
+def module_completion_percentage(module, user):
+    """ Completed share of the module's pages, from with_module_progress() when annotated """
+    if getattr(module, "completed_pages", None) is None:
+        module = with_module_progress(type(module).objects.filter(pk=module.pk), user).get()
+    if not module.page_count:
+        return 0
+    return round((module.completed_pages / module.page_count) * 100, 2)
+
+
+# -------------------------
+# BACKFILL (rows from before the timestamp columns)
+# -------------------------
+
+def _first_event(kinds):
+    return Subquery(
+        LearningEvent.objects.filter(
+            user_id=OuterRef("user_id"), object_id=OuterRef("page_id"), kind__in=kinds
+        ).order_by("created_at").values("created_at")[:1]
+    )
+
+
+def _children(model, **filters):
+    return model.objects.filter(user_id=OuterRef("user_id"), **filters).values("user_id")
+
+
+def _batched_update(queryset, batch_size, field, value):
+    """
+    UPDATE field in pk ranges, one short transaction each, skipping rows
+    value is NULL for; returns rows changed
+    """
+    bounds = queryset.aggregate(low=Min("pk"), high=Max("pk"))
+    if bounds["low"] is None:
+        return 0
+    queryset = queryset.annotate(_value=value).filter(_value__isnull=False)
+    changed = 0
+    for low in range(bounds["low"], bounds["high"] + 1, batch_size):
+        with transaction.atomic():
+            changed += queryset.filter(pk__gte=low, pk__lt=low + batch_size).update(**{field: value})
+    return changed
+
+
+def backfill_timestamps(batch_size=BACKFILL_BATCH_SIZE, fallback=None):
+    """
+    Fill completed_at / first_seen_at where they are missing:
+
+    - pages from the learning event log (first page_completed / first event)
+    - main contents and modules from their children: completed when the
+      last child was, first seen when the first child was
+    - completed rows still unknown get fallback, when given (e.g. now)
+
+    Returns {"<model>.<field>": rows updated}.
+    """
+    report = {}
+
+    def run(model, field, queryset, value, label=None):
+        report[f"{model.__name__}.{label or field}"] = _batched_update(
+            queryset, batch_size, field, value
+        )
+
+    pages = PageProgress.objects
+    run(PageProgress, "completed_at",
+        pages.filter(completed=True, completed_at__isnull=True),
+        _first_event([events.PAGE_COMPLETED]))
+    run(PageProgress, "first_seen_at",
+        pages.filter(first_seen_at__isnull=True),
+        Coalesce(_first_event([events.PAGE_VIEWED, events.PAGE_COMPLETED]), F("completed_at")))
+
+    page_children = _children(PageProgress, page__main_content_id=OuterRef("main_content_id"))
+    contents = MainContentProgress.objects
+    run(MainContentProgress, "completed_at",
+        contents.filter(completed=True, completed_at__isnull=True),
+        Subquery(page_children.annotate(at=Max("completed_at")).values("at")[:1]))
+    run(MainContentProgress, "first_seen_at",
+        contents.filter(first_seen_at__isnull=True),
+        Coalesce(Subquery(page_children.annotate(at=Min("first_seen_at")).values("at")[:1]), F("completed_at")))
+
+    content_children = _children(MainContentProgress, main_content__module_id=OuterRef("module_id"))
+    modules = Progress.objects
+    run(Progress, "completed_at",
+        modules.filter(completed=True, completed_at__isnull=True),
+        Subquery(content_children.annotate(at=Max("completed_at")).values("at")[:1]))
+    run(Progress, "first_seen_at",
+        modules.filter(first_seen_at__isnull=True),
+        Coalesce(Subquery(content_children.annotate(at=Min("first_seen_at")).values("at")[:1]), F("completed_at")))
+
+    if fallback is not None:
+        for model in (PageProgress, MainContentProgress, Progress):
+            run(model, "completed_at",
+                model.objects.filter(completed=True, completed_at__isnull=True), Value(fallback),
+                label="completed_at (fallback)")
+            run(model, "first_seen_at",
+                model.objects.filter(first_seen_at__isnull=True), F("completed_at"),
+                label="first_seen_at (fallback)")
+    return report
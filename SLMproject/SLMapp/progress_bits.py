@@ -0,0 +1,296 @@
+"""
+Bitset page completion.
+
+PageProgress keeps one row per (user, page). PageProgressBits keeps one
+BigInteger per (user, main content) holding a bit per page, so a user's
+whole course state is a few hundred small rows:
+
+- every page gets a progress_slot when saved (first free index in its main
+  content); reordering pages doesn't move bits. Pages written around
+  save() (bulk_create) have none until repair_slots() gives them one
+- bits are dual-written from PageProgress by signals with atomic SQL
+  (bits | mask, bits & ~mask), so concurrent completions never lose a bit
+- rebuild() recomputes all bits from PageProgress in the database
+  (also used by the migration); ``manage.py rebuild_progress_bits``
+  repairs missing slots first
+
+Readers go through completion_for(context), which returns a per-request
+PageCompletion, or filter Page querysets with page_completed() (module
+percentages, SLMapp.progress). settings.PROGRESS_BITSET_READS = False
+switches both back to reading PageProgress rows.
+"""
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    BigIntegerField, Exists, ExpressionWrapper, F, IntegerField, Max, OuterRef, Sum, Value,
+)
+from django.db.models.functions import Cast, Mod
+
+from .models import MainContent, Page, PageProgress, PageProgressBits
+
+logger = logging.getLogger(__name__)
+
+# Bits used per BigInteger word; 63 keeps values non-negative
+WORD_BITS = 63
+
+
+def position(slot):
+    """ progress_slot -> (word, mask) """
+    word, bit = divmod(slot, WORD_BITS)
+    return word, 1 << bit
+
+
+# -------------------------
+# SLOTS
+# -------------------------
+
+def allocate_slot(page):
+    """
+    Give a page without a slot the next index in its main content. The
+    main content row stays locked until the page is written (Page.save()
+    is atomic), so two pages added at once can't both take Max + 1.
+    """
+    if page.progress_slot is not None:
+        return
+    MainContent.objects.select_for_update().filter(pk=page.main_content_id).values_list("pk").first()
+    highest = Page.objects.filter(main_content_id=page.main_content_id).aggregate(
+        highest=Max("progress_slot")
+    )["highest"]
+    page.progress_slot = 0 if highest is None else highest + 1
+
+
+def prepare_page_save(page):
+    """
+    pre_save: a page moved to another main content gets a new slot there.
+    Returns the old (main_content_id, slot) when it moved.
+    """
+    moved_from = None
+    if page.pk is not None:
+        old = Page.objects.filter(pk=page.pk).values_list("main_content_id", "progress_slot").first()
+        if old is not None and old[0] != page.main_content_id:
+            moved_from = old
+            page.progress_slot = None
+    allocate_slot(page)
+    return moved_from
+
+
+def repair_slots(main_content_ids=None):
+    """
+    Give pages saved without a slot (bulk_create, raw SQL) one, and set
+    their bits from PageProgress; until then they read as not completed.
+    Returns how many pages were repaired.
+    """
+    pages = Page.objects.filter(progress_slot__isnull=True).only("id", "main_content_id", "progress_slot")
+    if main_content_ids is not None:
+        pages = pages.filter(main_content_id__in=main_content_ids)
+    repaired = 0
+    for page in pages.order_by("main_content_id", "order", "id"):
+        with transaction.atomic():
+            allocate_slot(page)
+            # Another request may have repaired it while we waited for the lock
+            if Page.objects.filter(pk=page.pk, progress_slot__isnull=True).update(progress_slot=page.progress_slot):
+                resync_page(page)
+                repaired += 1
+    if repaired:
+        logger.warning("Gave %d pages a missing progress slot", repaired)
+    return repaired
+
+
+# -------------------------
+# WRITES
+# -------------------------
+
+def _words(user_id, main_content_id, word):
+    return PageProgressBits.objects.filter(user_id=user_id, main_content_id=main_content_id, word=word)
+
+
+def set_page(user_id, main_content_id, slot, completed=True):
+    if slot is None:
+        return
+    word, mask = position(slot)
+    rows = _words(user_id, main_content_id, word)
+    if not completed:
+        rows.update(bits=F("bits").bitand(~mask))
+        return
+    if rows.update(bits=F("bits").bitor(mask)):
+        return
+    try:
+        with transaction.atomic():
+            PageProgressBits.objects.create(
+                user_id=user_id, main_content_id=main_content_id, word=word, bits=mask
+            )
+    except IntegrityError:
+        # Another request created the word first
+        rows.update(bits=F("bits").bitor(mask))
+
+
+def clear_slot(main_content_id, slot):
+    """ Drop one page's bit for every user (page deleted or moved away) """
+    if slot is None:
+        return
+    word, mask = position(slot)
+    PageProgressBits.objects.filter(main_content_id=main_content_id, word=word).update(
+        bits=F("bits").bitand(~mask)
+    )
+
+
+def resync_page(page):
+    """ Re-set a page's bits from PageProgress, after it moved """
+    user_ids = PageProgress.objects.filter(page=page, completed=True).values_list("user_id", flat=True)
+    for user_id in user_ids.iterator():
+        set_page(user_id, page.main_content_id, page.progress_slot)
+
+
+def rebuild(page_progress_model=PageProgress, bits_model=PageProgressBits, user_ids=None, batch_size=2000):
+    """
+    Recompute bits from page progress rows, grouped and OR-ed in SQL (a sum
+    of distinct powers of two). Takes the models so the migration can pass
+    its historical ones. Returns the number of words written.
+    """
+    progress = page_progress_model.objects.filter(completed=True, page__progress_slot__isnull=False)
+    words = bits_model.objects.all()
+    if user_ids is not None:
+        progress = progress.filter(user_id__in=user_ids)
+        words = words.filter(user_id__in=user_ids)
+
+    one = Cast(Value(1), output_field=BigIntegerField())
+    bit = Mod(F("page__progress_slot"), WORD_BITS, output_field=IntegerField())
+    mask = ExpressionWrapper(one.bitleftshift(bit), output_field=BigIntegerField())
+    rows = (
+        progress.values("user_id", main_content=F("page__main_content_id"))
+        .annotate(word=ExpressionWrapper(F("page__progress_slot") / WORD_BITS, output_field=IntegerField()))
+        .annotate(bits=Sum(mask))
+        .values_list("user_id", "main_content", "word", "bits")
+    )
+
+    written = 0
+    with transaction.atomic():
+        words.delete()
+        batch = []
+        for user_id, main_content_id, word, bits in rows.iterator():
+            batch.append(bits_model(user_id=user_id, main_content_id=main_content_id, word=word, bits=bits))
+            if len(batch) >= batch_size:
+                bits_model.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        bits_model.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+# -------------------------
+# READS
+# -------------------------
+
+def bitset_reads():
+    return getattr(settings, "PROGRESS_BITSET_READS", True)
+
+
+def page_completed(user_id):
+    """ Filter for a Page queryset: the user's bit for the page is set """
+    if not bitset_reads():
+        return Exists(PageProgress.objects.filter(user_id=user_id, page=OuterRef("pk"), completed=True))
+    slot = OuterRef("progress_slot")
+    one = Cast(Value(1), output_field=BigIntegerField())
+    mask = ExpressionWrapper(
+        one.bitleftshift(Mod(slot, WORD_BITS, output_field=IntegerField())), output_field=BigIntegerField()
+    )
+    return Exists(
+        PageProgressBits.objects.filter(
+            user_id=user_id,
+            main_content_id=OuterRef("main_content_id"),
+            word=ExpressionWrapper(slot / WORD_BITS, output_field=IntegerField()),
+        )
+        .annotate(hit=F("bits").bitand(mask))
+        .filter(hit__gt=0)
+    )
+
+
+class PageCompletion:
+    """
+    One user's page completion for the length of a request. The user's
+    words are loaded in one query on first use; checks are bit tests.
+    Pages need main_content_id and progress_slot loaded.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self._words = None
+        self._siblings = {}
+
+    def _load(self):
+        if self._words is None:
+            self._words = {
+                (main_content_id, word): bits
+                for main_content_id, word, bits in PageProgressBits.objects.filter(
+                    user_id=self.user_id
+                ).values_list("main_content_id", "word", "bits")
+            }
+        return self._words
+
+    def completed_slot(self, main_content_id, slot):
+        if slot is None:
+            return False
+        word, mask = position(slot)
+        return bool(self._load().get((main_content_id, word), 0) & mask)
+
+    def is_completed(self, page):
+        return self.completed_slot(page.main_content_id, page.progress_slot)
+
+    def count_completed(self, pages):
+        """ pages: Page objects or (main_content_id, progress_slot) pairs """
+        return sum(
+            self.completed_slot(*page) if isinstance(page, tuple) else self.is_completed(page)
+            for page in pages
+        )
+
+    def siblings(self, main_content_id):
+        """ (order, main_content_id, progress_slot) of a main content's pages, one query each """
+        if main_content_id not in self._siblings:
+            pages = Page.objects.filter(main_content_id=main_content_id).order_by("order").values_list(
+                "order", "main_content_id", "progress_slot"
+            )
+            siblings = list(pages)
+            if any(slot is None for _, _, slot in siblings) and repair_slots([main_content_id]):
+                self._words = None
+                siblings = list(pages)
+            self._siblings[main_content_id] = siblings
+        return self._siblings[main_content_id]
+
+    def previous_completed(self, page):
+        """
+        Whether the page ordered right before this one is completed; None
+        when there is no such page.
+        """
+        for order, main_content_id, slot in self.siblings(page.main_content_id):
+            if order == page.order - 1:
+                return self.completed_slot(main_content_id, slot)
+        return None
+
+
+class RowPageCompletion(PageCompletion):
+    """ Same interface, read from PageProgress rows (bitset reads switched off) """
+
+    def _load(self):
+        if self._words is None:
+            self._words = set(
+                PageProgress.objects.filter(user_id=self.user_id, completed=True).values_list(
+                    "page__main_content_id", "page__progress_slot"
+                )
+            )
+        return self._words
+
+    def completed_slot(self, main_content_id, slot):
+        return (main_content_id, slot) in self._load()
+
+
+def completion_for(context):
+    """ The request user's PageCompletion, shared through the serializer context """
+    completion = context.get("page_completion")
+    if completion is None:
+        user_id = context["request"].user.id
+        reader = PageCompletion if bitset_reads() else RowPageCompletion
+        completion = context["page_completion"] = reader(user_id)
+    return completion
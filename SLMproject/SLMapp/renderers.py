@@ -0,0 +1,67 @@
+"""
+orjson-backed JSON renderer / parser for DRF.
+
+orjson is optional: when it isn't installed both classes behave exactly like
+DRF's JSONRenderer / JSONParser. Output is the same as DRF's encoder, types
+orjson doesn't know (Decimal, lazy strings, QuerySets, ...) and datetimes go
+through DRF's JSONEncoder.default, so "2025-01-01T10:00:00Z" stays formatted
+the DRF way.
+"""
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+_default = JSONEncoder().default
+
+# JSON allows U+2028/U+2029 raw, JavaScript string literals don't (DRF escapes them too)
+_LINE_SEPARATORS = ((b"\xe2\x80\xa8", b"\\u2028"), (b"\xe2\x80\xa9", b"\\u2029"))
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def dumps(data):
+    """ JSON bytes for data, the same output as the renderer """
+    if orjson is None:
+        return JSONRenderer().render(data)
+    ret = orjson.dumps(data, default=_default, option=_OPTIONS)
+    if b"\xe2\x80" in ret:
+        for raw, escaped in _LINE_SEPARATORS:
+            ret = ret.replace(raw, escaped)
+    return ret
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b""
+
+        # Pretty printing (browsable API, "; indent=4") is rare, leave it to json
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        return dumps(data)
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        if orjson is None or self.strict or encoding.lower().replace("-", "") != "utf8":
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
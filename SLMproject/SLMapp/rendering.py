@@ -0,0 +1,334 @@
+"""
+Server-side render step for Page.content.
+
+Lessons are stored either as HTML (often a whole <!DOCTYPE html> document)
+or as Markdown. render_content() turns either into sanitized HTML:
+
+- Markdown -> HTML with the optional ``markdown`` package, or a small
+  built-in converter (paragraphs, headings, lists, fenced code)
+- sanitized against a tag / attribute allowlist: anything not listed is
+  unwrapped (text kept, escaped), script / style / svg / math and the like
+  are dropped with their content, URLs must be http(s), mailto, tel or
+  relative (data:image/ only for <img>). With the optional ``nh3`` package
+  the body goes through nh3 first, then through the same allowlist pass
+- <pre><code class="language-x"> blocks are highlighted with pygments
+  (optional) using inline styles, so no extra stylesheet is needed
+- images / iframes / videos / audio are collected into ``media``
+
+Results are cached per page and checked against a hash of the content, so
+a stale entry can never be served even if an invalidation is missed.
+"""
+import hashlib
+import html
+import re
+from html.parser import HTMLParser
+
+from django.conf import settings
+from django.core.cache import cache
+
+try:
+    import markdown
+except ImportError:  # optional dependency
+    markdown = None
+
+try:
+    import nh3
+except ImportError:  # optional dependency
+    nh3 = None
+
+try:
+    from pygments import highlight
+    from pygments.formatters import HtmlFormatter
+    from pygments.lexers import get_lexer_by_name
+    from pygments.util import ClassNotFound
+except ImportError:  # optional dependency
+    highlight = None
+
+# Bump when the output format changes, old entries are ignored
+# (2: allowlist sanitizer, entries from the old blocklist one are discarded)
+RENDER_VERSION = 2
+
+ALLOWED_TAGS = {
+    "a", "abbr", "article", "aside", "audio", "b", "blockquote", "br", "caption", "cite", "code",
+    "col", "colgroup", "dd", "del", "details", "div", "dl", "dt", "em", "figcaption", "figure",
+    "footer", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "i", "iframe", "img", "ins",
+    "kbd", "li", "main", "mark", "nav", "ol", "p", "pre", "q", "s", "samp", "section", "small",
+    "source", "span", "strong", "sub", "summary", "sup", "table", "tbody", "td", "tfoot", "th",
+    "thead", "tr", "track", "u", "ul", "video",
+}
+# Dropped together with everything inside them (raw text, foreign content, document head)
+DROP_WITH_CONTENT = {
+    "script", "style", "svg", "math", "template", "noscript", "noembed", "noframes", "object",
+    "embed", "applet", "head", "title", "textarea", "select", "xmp", "plaintext", "frameset",
+}
+GLOBAL_ATTRS = {"class", "title", "lang", "dir"}
+ALLOWED_ATTRS = {
+    "a": {"href", "target", "rel"},
+    "img": {"src", "alt", "width", "height", "loading"},
+    "iframe": {"src", "width", "height", "allow", "allowfullscreen", "frameborder"},
+    "video": {"src", "poster", "controls", "width", "height", "preload", "loop", "muted", "playsinline"},
+    "audio": {"src", "controls", "preload", "loop", "muted"},
+    "source": {"src", "type"},
+    "track": {"src", "kind", "srclang", "label", "default"},
+    "td": {"colspan", "rowspan"},
+    "th": {"colspan", "rowspan", "scope"},
+    "ol": {"start", "type"},
+    "col": {"span"},
+    "colgroup": {"span"},
+    "details": {"open"},
+}
+URL_ATTRS = {"href", "src", "poster"}
+SAFE_SCHEMES = ("http:", "https:", "mailto:", "tel:")
+MEDIA_TAGS = {"img": "image", "iframe": "embed", "video": "video", "audio": "audio", "source": "source"}
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+    "source", "track", "wbr",
+}
+
+
+def content_hash(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _render_key(page_id):
+    return f"render:{RENDER_VERSION}:page:{page_id}"
+
+
+def is_html(content):
+    return content.lstrip()[:1] == "<"
+
+
+# -------------------------
+# MARKDOWN
+# -------------------------
+
+_fence = re.compile(r"^```(\w*)\n(.*?)^```", re.M | re.S)
+_heading = re.compile(r"^(#{1,6})\s+(.*)$")
+_list_item = re.compile(r"^\s*[-*]\s+(.*)$")
+
+
+def _inline(text):
+    text = html.escape(text)
+    text = re.sub(r"`([^`]+)`", r"<code>\1</code>", text)
+    text = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", text)
+    text = re.sub(r"\*(.+?)\*", r"<em>\1</em>", text)
+    text = re.sub(r"!\[([^\]]*)\]\(([^)\s]+)\)", r'<img src="\2" alt="\1">', text)
+    return re.sub(r"\[([^\]]+)\]\(([^)\s]+)\)", r'<a href="\2">\1</a>', text)
+
+
+def _basic_markdown(text):
+    """ Enough Markdown for lesson notes when the markdown package isn't installed """
+    blocks = []
+
+    def code_block(match):
+        lang, code = match.group(1), match.group(2)
+        css = f' class="language-{lang}"' if lang else ""
+        blocks.append(f"<pre><code{css}>{html.escape(code)}</code></pre>")
+        return f"\n\x00{len(blocks) - 1}\x00\n"
+
+    text = _fence.sub(code_block, text.replace("\r\n", "\n"))
+
+    out = []
+    for chunk in re.split(r"\n\s*\n", text):
+        lines = [line for line in chunk.strip("\n").split("\n") if line.strip()]
+        if not lines:
+            continue
+        if len(lines) == 1 and re.fullmatch(r"\x00\d+\x00", lines[0].strip()):
+            out.append(blocks[int(lines[0].strip()[1:-1])])
+            continue
+        heading = _heading.match(lines[0])
+        if heading and len(lines) == 1:
+            level = len(heading.group(1))
+            out.append(f"<h{level}>{_inline(heading.group(2))}</h{level}>")
+        elif all(_list_item.match(line) for line in lines):
+            items = "".join(f"<li>{_inline(_list_item.match(line).group(1))}</li>" for line in lines)
+            out.append(f"<ul>{items}</ul>")
+        else:
+            out.append(f"<p>{'<br>'.join(_inline(line) for line in lines)}</p>")
+    return "\n".join(out)
+
+
+def markdown_to_html(text):
+    if markdown is not None:
+        return markdown.markdown(text, extensions=["fenced_code", "tables"])
+    return _basic_markdown(text)
+
+
+# -------------------------
+# SANITIZE + MEDIA + HIGHLIGHT
+# -------------------------
+
+def _safe_url(value, tag):
+    compact = re.sub(r"[\x00-\x20]", "", html.unescape(value or "")).lower()
+    if ":" not in compact.split("/", 1)[0]:
+        return True  # relative URL
+    if tag == "img" and compact.startswith("data:image/") and not compact.startswith("data:image/svg"):
+        return True
+    return compact.startswith(SAFE_SCHEMES)
+
+
+class _Sanitizer(HTMLParser):
+    """
+    Allowlist pass: only ALLOWED_TAGS / ALLOWED_ATTRS are written back,
+    always re-serialized (attributes quoted and escaped, text escaped), so
+    nothing from the input reaches the output verbatim.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.media = []
+        self._drop = None  # [tag, depth] while inside a DROP_WITH_CONTENT element
+        self._code = None  # (language, [chunks]) while inside <pre><code>
+        self._in_pre = False
+
+    def _attrs(self, tag, attrs):
+        allowed = GLOBAL_ATTRS | ALLOWED_ATTRS.get(tag, set())
+        kept = []
+        for name, value in attrs:
+            name = name.lower()
+            if name not in allowed:
+                continue
+            if name in URL_ATTRS and not _safe_url(value, tag):
+                continue
+            kept.append((name, value))
+        if tag == "a" and any(name == "target" for name, _ in kept):
+            kept = [(n, v) for n, v in kept if n != "rel"] + [("rel", "noopener noreferrer")]
+        return kept
+
+    def _emit_tag(self, tag, attrs, close=False):
+        parts = [tag]
+        for name, value in attrs:
+            parts.append(name if value is None else f'{name}="{html.escape(value, quote=True)}"')
+        self.out.append(f"<{' '.join(parts)}{' /' if close else ''}>")
+
+    def handle_starttag(self, tag, attrs, close=False):
+        if self._drop is not None:
+            if tag == self._drop[0] and not close:
+                self._drop[1] += 1
+            return
+        if tag in DROP_WITH_CONTENT:
+            if not close and tag not in VOID_TAGS:
+                self._drop = [tag, 1]
+            return
+        if tag not in ALLOWED_TAGS:
+            return  # unwrapped, its text is still escaped by handle_data
+        attrs = self._attrs(tag, attrs)
+
+        if tag in MEDIA_TAGS:
+            src = dict(attrs).get("src")
+            if src:
+                self.media.append({"type": MEDIA_TAGS[tag], "src": src})
+
+        if tag == "pre":
+            self._in_pre = True
+        if tag == "code" and self._in_pre and highlight is not None:
+            language = next(
+                (c[len("language-"):] for c in (dict(attrs).get("class") or "").split()
+                 if c.startswith("language-")),
+                None,
+            )
+            if language:
+                self._code = (language, [])
+                return
+
+        self._emit_tag(tag, attrs, close)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, close=True)
+
+    def handle_endtag(self, tag):
+        if self._drop is not None:
+            if tag == self._drop[0]:
+                self._drop[1] -= 1
+                if not self._drop[1]:
+                    self._drop = None
+            return
+        if tag not in ALLOWED_TAGS or tag in VOID_TAGS:
+            return
+        if tag == "code" and self._code is not None:
+            language, chunks = self._code
+            self._code = None
+            self.out.append(_highlight("".join(chunks), language))
+            return
+        if tag == "pre":
+            self._in_pre = False
+        self.out.append(f"</{tag}>")
+
+    def handle_data(self, data):
+        if self._drop is not None:
+            return
+        if self._code is not None:
+            self._code[1].append(data)
+        else:
+            self.out.append(html.escape(data, quote=False))
+
+    # Comments, <!DOCTYPE>, <![CDATA[...]]> and processing instructions are dropped
+    def handle_comment(self, data):
+        pass
+
+    def handle_decl(self, decl):
+        pass
+
+    def unknown_decl(self, data):
+        pass
+
+    def handle_pi(self, data):
+        pass
+
+
+def _highlight(code, language):
+    try:
+        lexer = get_lexer_by_name(language)
+    except ClassNotFound:
+        return f'<code class="language-{html.escape(language)}">{html.escape(code)}</code>'
+    formatter = HtmlFormatter(nowrap=True, noclasses=True)
+    return f'<code class="language-{html.escape(language)}">{highlight(code, lexer, formatter)}</code>'
+
+
+def render_content(content):
+    """ {"html", "media", "format"} for a lesson body, uncached """
+    source_format = "html" if is_html(content) else "markdown"
+    raw = content if source_format == "html" else markdown_to_html(content)
+
+    if nh3 is not None:
+        raw = nh3.clean(
+            raw,
+            tags=ALLOWED_TAGS,
+            clean_content_tags=DROP_WITH_CONTENT,
+            attributes={"*": GLOBAL_ATTRS, **ALLOWED_ATTRS},
+            url_schemes={"http", "https", "mailto", "tel", "data"},
+            link_rel=None,
+        )
+
+    sanitizer = _Sanitizer()
+    sanitizer.feed(raw)
+    sanitizer.close()
+    return {
+        "format": source_format,
+        "html": "".join(sanitizer.out),
+        "media": sanitizer.media,
+    }
+
+
+# -------------------------
+# CACHE
+# -------------------------
+
+def rendered_page(page, refresh=False):
+    key = _render_key(page.pk)
+    digest = content_hash(page.content)
+
+    cached = None if refresh else cache.get(key)
+    if cached is None or cached.get("hash") != digest:
+        cached = {"hash": digest, **render_content(page.content)}
+        cache.set(key, cached, settings.PAGE_RENDER_CACHE_SECONDS)
+
+    media = list(cached["media"])
+    if page.video_id:
+        media.insert(0, {"type": "mux", "src": page.video_id})
+    return {"format": cached["format"], "html": cached["html"], "media": media}
+
+
+def invalidate_rendered_page(page_id):
+    cache.delete(_render_key(page_id))
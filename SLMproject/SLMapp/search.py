@@ -0,0 +1,418 @@
+"""
+Full-text search over topics, modules, main contents, pages and questions.
+
+SearchDocument holds one plain-text row per object (see index_object), the
+database does the ranking:
+
+- SQLite:   FTS5 external-content table + triggers, bm25() and snippet()
+- Postgres: generated tsvector column with a GIN index, ts_rank() and
+            ts_headline()
+- anything else: icontains, unranked
+
+The FTS structures are created by migration 0013 (install_backend()),
+migration 0021 indexes the content that existed before.
+Note for future SQLite migrations that rebuild SLMapp_searchdocument: the
+triggers go with the old table, call install_backend() again afterwards.
+
+SQLite timings on 100k documents: specific words and 4+ letter prefixes
+take 2-10 ms. Ranking is what costs on broad queries (common words,
+3-letter prefixes), so past settings.SEARCH_BROAD_QUERY_MATCHES matches
+only title hits are ranked: 25-40 ms. A query hitting most titles (a
+stopword like "the") still takes 60-80 ms, over the 50 ms target.
+"""
+import html
+import re
+from html.parser import HTMLParser
+
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from .models import MainContent, Module, Page, Question, SearchDocument, Topic
+
+TABLE = SearchDocument._meta.db_table
+FTS_TABLE = f"{TABLE}_fts"
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+
+# Shorter last words aren't prefix-matched, "a*" would hit every document
+MIN_PREFIX_LENGTH = 3
+
+# SQLite: ranking costs about 2 us per matching document, so a query that
+# matches more than this (a common word, a 3-letter prefix) only ranks
+# documents matching it in the title, unless those don't fill the page.
+# settings.SEARCH_BROAD_QUERY_MATCHES overrides it
+BROAD_QUERY_MATCHES = 5000
+
+# Snippet highlight markers, swapped for <mark> after escaping
+_START, _STOP = "\x02", "\x03"
+
+_word = re.compile(r"\w+", re.UNICODE)
+
+
+# -------------------------
+# BACKEND SETUP (migration)
+# -------------------------
+
+SQLITE_SETUP = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS "{FTS_TABLE}" USING fts5(
+        title, body, content='{TABLE}', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2', prefix='3 4'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS "{TABLE}_ai" AFTER INSERT ON "{TABLE}" BEGIN
+        INSERT INTO "{FTS_TABLE}"(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS "{TABLE}_ad" AFTER DELETE ON "{TABLE}" BEGIN
+        INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}", rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS "{TABLE}_au" AFTER UPDATE OF title, body ON "{TABLE}" BEGIN
+        INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}", rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO "{FTS_TABLE}"(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    f"""INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}") VALUES ('rebuild')""",
+]
+
+SQLITE_TEARDOWN = [
+    f'DROP TRIGGER IF EXISTS "{TABLE}_ai"',
+    f'DROP TRIGGER IF EXISTS "{TABLE}_ad"',
+    f'DROP TRIGGER IF EXISTS "{TABLE}_au"',
+    f'DROP TABLE IF EXISTS "{FTS_TABLE}"',
+]
+
+POSTGRES_SETUP = [
+    f"""ALTER TABLE "{TABLE}" ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(body, '')), 'B')
+        ) STORED""",
+    f'CREATE INDEX IF NOT EXISTS "{TABLE}_vector_idx" ON "{TABLE}" USING GIN (search_vector)',
+]
+
+POSTGRES_TEARDOWN = [
+    f'DROP INDEX IF EXISTS "{TABLE}_vector_idx"',
+    f'ALTER TABLE "{TABLE}" DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def _run(schema_editor, statements):
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def install_backend(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        _run(schema_editor, SQLITE_SETUP)
+    elif vendor == "postgresql":
+        _run(schema_editor, POSTGRES_SETUP)
+
+
+def uninstall_backend(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        _run(schema_editor, SQLITE_TEARDOWN)
+    elif vendor == "postgresql":
+        _run(schema_editor, POSTGRES_TEARDOWN)
+
+
+# -------------------------
+# INDEXING
+# -------------------------
+
+class _TextExtractor(HTMLParser):
+    SKIP = {"script", "style", "head", "title", "noscript", "svg"}
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip += 1
+        elif tag == "img":
+            alt = dict(attrs).get("alt")
+            if alt and not self._skip:
+                self.parts.append(alt)
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+
+def html_to_text(content):
+    if not content or content.lstrip()[:1] != "<":
+        return content or ""
+    extractor = _TextExtractor()
+    extractor.feed(content)
+    extractor.close()
+    return " ".join(" ".join(extractor.parts).split())
+
+
+KIND_BY_MODEL = {
+    Topic: "topic",
+    Module: "module",
+    MainContent: "maincontent",
+    Page: "page",
+    Question: "question",
+}
+
+
+def _document_fields(obj, kind=None):
+    """ kind + indexed columns for a content object """
+    kind = kind or KIND_BY_MODEL.get(type(obj))
+    if kind == "topic":
+        return "topic", {"topic_id": obj.pk, "module_id": None, "main_content_id": None,
+                         "title": obj.name, "body": ""}
+    if kind == "module":
+        return "module", {"topic_id": obj.topic_id, "module_id": obj.pk, "main_content_id": None,
+                          "title": obj.title, "body": obj.description}
+    if kind == "maincontent":
+        return "maincontent", {"topic_id": obj.module.topic_id, "module_id": obj.module_id,
+                               "main_content_id": obj.pk, "title": obj.title,
+                               "body": obj.description}
+    if kind == "page":
+        module = obj.main_content.module
+        return "page", {"topic_id": module.topic_id, "module_id": module.pk,
+                        "main_content_id": obj.main_content_id, "title": obj.title,
+                        "body": html_to_text(obj.content)}
+    if kind == "question":
+        main_content = obj.quiz.main_content
+        return "question", {
+            "topic_id": main_content.module.topic_id if main_content else None,
+            "module_id": main_content.module_id if main_content else None,
+            "main_content_id": main_content.pk if main_content else None,
+            "title": obj.quiz.title,
+            "body": obj.text,
+        }
+    raise TypeError(f"{type(obj).__name__} is not searchable")
+
+
+def index_object(obj):
+    kind, fields = _document_fields(obj)
+    fields["title"] = (fields["title"] or "")[:255]
+    SearchDocument.objects.update_or_create(kind=kind, object_id=obj.pk, defaults=fields)
+
+
+def unindex_object(obj):
+    SearchDocument.objects.filter(kind=KIND_BY_MODEL[type(obj)], object_id=obj.pk).delete()
+
+
+def move_descendants(obj):
+    """ Keep topic/module ids of children right when a module or main content moves """
+    if isinstance(obj, Module):
+        SearchDocument.objects.filter(module_id=obj.pk).exclude(topic_id=obj.topic_id).update(
+            topic_id=obj.topic_id
+        )
+    elif isinstance(obj, MainContent):
+        topic_id = obj.module.topic_id
+        SearchDocument.objects.filter(main_content_id=obj.pk).exclude(
+            module_id=obj.module_id, topic_id=topic_id
+        ).update(module_id=obj.module_id, topic_id=topic_id)
+
+
+def rebuild_index(batch_size=500, apps=global_apps):
+    """
+    Re-create every document; returns how many were written. Takes the
+    app registry so the migration can pass its historical one.
+    """
+    def model(name):
+        return apps.get_model("SLMapp", name)
+
+    documents = model("SearchDocument")
+    documents.objects.all().delete()
+    querysets = [
+        ("topic", model("Topic").objects.all()),
+        ("module", model("Module").objects.all()),
+        ("maincontent", model("MainContent").objects.select_related("module")),
+        ("page", model("Page").objects.select_related("main_content__module")),
+        ("question", model("Question").objects.select_related("quiz__main_content__module")),
+    ]
+    total = 0
+    for kind, queryset in querysets:
+        batch = []
+        for obj in queryset.iterator(chunk_size=batch_size):
+            kind, fields = _document_fields(obj, kind)
+            fields["title"] = (fields["title"] or "")[:255]
+            batch.append(documents(kind=kind, object_id=obj.pk, **fields))
+            if len(batch) >= batch_size:
+                documents.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        documents.objects.bulk_create(batch)
+        total += len(batch)
+    return total
+
+
+# -------------------------
+# QUERYING
+# -------------------------
+
+def _terms(query):
+    return _word.findall(query or "")[:10]
+
+
+def _highlight(snippet):
+    snippet = html.escape(snippet or "")
+    return snippet.replace(_START, "<mark>").replace(_STOP, "</mark>")
+
+
+def _filters(topic_ids, kinds):
+    where, params = [], []
+    if topic_ids is not None:
+        if not topic_ids:
+            return None, None
+        where.append(f"d.topic_id IN ({', '.join(['%s'] * len(topic_ids))})")
+        params.extend(topic_ids)
+    if kinds:
+        where.append(f"d.kind IN ({', '.join(['%s'] * len(kinds))})")
+        params.extend(kinds)
+    return where, params
+
+
+def _sqlite_match(terms):
+    # Every term must match; the last one also as a prefix (search-as-you-type)
+    quoted = [f'"{term}"' for term in terms]
+    if len(terms[-1]) >= MIN_PREFIX_LENGTH:
+        quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _sqlite_matches(match, cap):
+    """ How many documents match, counting no further than cap """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT COUNT(*) FROM (SELECT 1 FROM "{FTS_TABLE}" WHERE "{FTS_TABLE}" MATCH %s LIMIT %s)',
+            [match, cap],
+        )
+        return cursor.fetchone()[0]
+
+
+def _sqlite_search(terms, where, params, limit):
+    match = _sqlite_match(terms)
+    broad = getattr(settings, "SEARCH_BROAD_QUERY_MATCHES", BROAD_QUERY_MATCHES)
+    if _sqlite_matches(match, broad + 1) > broad:
+        rows = _sqlite_ranked(match, f"{{title}} : ({match})", where, params, limit)
+        if len(rows) >= limit:
+            return rows
+    return _sqlite_ranked(match, match, where, params, limit)
+
+
+def _sqlite_ranked(match, candidates, where, params, limit):
+    """ The best limit documents matching candidates, snippets from match """
+    # Rank and limit first; snippet() is expensive, only run it for the page of hits
+    join = f'JOIN "{TABLE}" d ON d.id = "{FTS_TABLE}".rowid' if where else ""
+    filters = "AND " + " AND ".join(where) if where else ""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT "{FTS_TABLE}".rowid
+            FROM "{FTS_TABLE}" {join}
+            WHERE "{FTS_TABLE}" MATCH %s {filters}
+            ORDER BY bm25("{FTS_TABLE}", 10.0, 1.0)
+            LIMIT %s
+            """,
+            [candidates, *params, limit],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            return []
+        # A literal list: FTS5 seeks them in one pass, an IN (subquery)
+        # re-runs the MATCH for every id
+        cursor.execute(
+            f"""
+            SELECT d.id, d.kind, d.object_id, d.topic_id, d.module_id, d.main_content_id, d.title,
+                   CASE WHEN d.body = '' THEN snippet("{FTS_TABLE}", 0, %s, %s, '…', 16)
+                        ELSE snippet("{FTS_TABLE}", 1, %s, %s, '…', 16) END AS snippet,
+                   bm25("{FTS_TABLE}", 10.0, 1.0) AS rank
+            FROM "{FTS_TABLE}"
+            JOIN "{TABLE}" d ON d.id = "{FTS_TABLE}".rowid
+            WHERE "{FTS_TABLE}" MATCH %s AND "{FTS_TABLE}".rowid IN ({", ".join(["%s"] * len(ids))})
+            ORDER BY rank
+            """,
+            [_START, _STOP, _START, _STOP, match, *ids],
+        )
+        rows = cursor.fetchall()
+    # bm25 is "lower is better", flip it so higher score = better for clients
+    return [(*row[:8], -row[8]) for row in rows]
+
+
+def _postgres_search(terms, where, params, limit):
+    tsquery = " & ".join(
+        f"{term}:*" if i == len(terms) - 1 and len(term) >= MIN_PREFIX_LENGTH else term
+        for i, term in enumerate(terms)
+    )
+    headline = f"StartSel={_START}, StopSel={_STOP}, MaxFragments=1, MaxWords=24, MinWords=8"
+    sql = f"""
+        SELECT id, kind, object_id, topic_id, module_id, main_content_id, title,
+               ts_headline('english', CASE WHEN body = '' THEN title ELSE body END, q, %s),
+               rank
+        FROM (
+            SELECT d.*, q, ts_rank(d.search_vector, q) AS rank
+            FROM "{TABLE}" d, to_tsquery('english', %s) q
+            WHERE d.search_vector @@ q {"AND " + " AND ".join(where) if where else ""}
+            ORDER BY rank DESC
+            LIMIT %s
+        ) hits
+        ORDER BY rank DESC
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [headline, tsquery, *params, limit])
+        return cursor.fetchall()
+
+
+def _fallback_search(terms, topic_ids, kinds, limit):
+    qs = SearchDocument.objects.all()
+    for term in terms:
+        qs = qs.filter(Q(title__icontains=term) | Q(body__icontains=term))
+    if topic_ids is not None:
+        qs = qs.filter(topic_id__in=topic_ids)
+    if kinds:
+        qs = qs.filter(kind__in=kinds)
+    return [
+        (d.id, d.kind, d.object_id, d.topic_id, d.module_id, d.main_content_id, d.title,
+         (d.body or d.title)[:160], 0.0)
+        for d in qs[:limit]
+    ]
+
+
+def search(query, topic_ids=None, kinds=None, limit=DEFAULT_LIMIT):
+    """
+    Ranked hits for ``query``. topic_ids=None means no enrollment filter
+    (admins); an empty collection means nothing is visible.
+    """
+    terms = _terms(query)
+    if not terms:
+        return []
+    where, params = _filters(topic_ids, kinds)
+    if where is None:
+        return []
+
+    if connection.vendor == "sqlite":
+        rows = _sqlite_search(terms, where, params, limit)
+    elif connection.vendor == "postgresql":
+        rows = _postgres_search(terms, where, params, limit)
+    else:
+        rows = _fallback_search(terms, topic_ids, kinds, limit)
+
+    return [
+        {
+            "kind": kind,
+            "id": object_id,
+            "title": title,
+            "snippet": _highlight(snippet),
+            "topic": topic_id,
+            "module": module_id,
+            "main_content": main_content_id,
+            "score": round(float(rank), 4),
+        }
+        for _, kind, object_id, topic_id, module_id, main_content_id, title, snippet, rank in rows
+    ]
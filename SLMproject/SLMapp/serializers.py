@@ -7,42 +7,40 @@ from django.conf import settings
 from rest_framework import serializers
 from django.db import transaction
 from django.db.models import F
-class PageMiniSerializer(serializers.ModelSerializer):
+from . import progress
+from .fieldsets import SparseFieldsetMixin
+from .fragments import FragmentCacheMixin, FragmentListSerializer
+from .progress_bits import completion_for
+from .rendering import rendered_page
+
+# ?include= groups shared by the content serializers (see fieldsets.py)
+PROGRESS = "progress"
+
+
+class PageMiniSerializer(FragmentCacheMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     completed = serializers.SerializerMethodField()
     formatted_duration = serializers.SerializerMethodField()
     locked = serializers.SerializerMethodField()   # ✅ ADD THIS
 
+    include_groups = {PROGRESS: ("completed", "locked")}
+    default_includes = (PROGRESS,)
+    personalized_fields = ("completed", "locked")
+
     class Meta:
         model = Page
         fields = ["id", "order", "completed", "title", "formatted_duration", "locked"]
+        list_serializer_class = FragmentListSerializer
 
     def get_completed(self, obj):
-        user = self.context["request"].user
-        return PageProgress.objects.filter(
-            user=user, page=obj, completed=True
-        ).exists()
+        return completion_for(self.context).is_completed(obj)
 
     def get_locked(self, obj):
-        user = self.context["request"].user
-
         # First page is never locked
         if obj.order == 1:
             return False
 
-        # Get previous page
-        prev_page = Page.objects.filter(
-            main_content=obj.main_content,
-            order=obj.order - 1
-        ).first()
-
-        if not prev_page:
-            return True
-
-        return not PageProgress.objects.filter(
-            user=user,
-            page=prev_page,
-            completed=True
-        ).exists()
+        # No page right before it counts as locked too
+        return not completion_for(self.context).previous_completed(obj)
 
     def get_formatted_duration(self, obj):
         return format_duration(obj.time_duration)
@@ -83,38 +81,52 @@ class MuxAccountSerializer(serializers.ModelSerializer):
         model = MuxAccount
         fields = "__all__"
 
-class PageSerializer(serializers.ModelSerializer):
+class PageSerializer(FragmentCacheMixin, SparseFieldsetMixin, serializers.ModelSerializer):
+    content = serializers.CharField(style={"base_template": "textarea.html"})
     main_content = serializers.SerializerMethodField()
     completed = serializers.SerializerMethodField()
     formatted_duration = serializers.SerializerMethodField()
     video_url = serializers.SerializerMethodField()
-    
+    rendered = serializers.SerializerMethodField()  # ?include=rendered
+
+    # main_content is a compact reference unless ?include=main_content
+    include_groups = {PROGRESS: ("completed",), "rendered": ("rendered",)}
+    default_includes = (PROGRESS,)
+    # video_url is signed per request, main_content may carry progress
+    personalized_fields = ("completed", "video_url", "main_content")
+
     class Meta:
         model = Page
         fields = "__all__"
+        list_serializer_class = FragmentListSerializer
 
     # -------------------------
     # SERIALIZER FIELDS
     # -------------------------
 
     def get_main_content(self, obj):
-        return MainContentSerializer(obj.main_content, context=self.context).data
+        if self.is_included("main_content"):
+            return MainContentSerializer(obj.main_content, context=self.context, nested=True).data
+        main_content = obj.main_content
+        return {
+            "id": main_content.id,
+            "title": main_content.title,
+            "order": main_content.order,
+            "module": main_content.module_id,
+        }
 
     def get_completed(self, obj):
-        user = self.context["request"].user
-        return PageProgress.objects.filter(
-            user=user,
-            page=obj,
-            completed=True
-        ).exists()
+        return completion_for(self.context).is_completed(obj)
 
     def get_formatted_duration(self, obj):
         return format_duration(obj.time_duration)
 
+    def get_rendered(self, obj):
+        return rendered_page(obj)
+
     def get_video_url(self, obj):
         if not obj.video_id or not obj.mux_account:
             return None
-
         return generate_mux_signed_url(obj.video_id, obj.mux_account.name)
 
     # -------------------------
@@ -172,7 +184,7 @@ class PageSerializer(serializers.ModelSerializer):
         validated_data["order"] = new_order
         return super().update(instance, validated_data)
 
-class MainContentSerializer(serializers.ModelSerializer):
+class MainContentSerializer(FragmentCacheMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     pages = serializers.SerializerMethodField()
     completed = serializers.SerializerMethodField()
     locked = serializers.SerializerMethodField()
@@ -182,14 +194,19 @@ class MainContentSerializer(serializers.ModelSerializer):
     module = serializers.PrimaryKeyRelatedField(queryset=Module.objects.all())  # for write
     module_detail = serializers.SerializerMethodField()  # for read
 
+    include_groups = {"pages": ("pages",), PROGRESS: ("completed", "locked")}
+    default_includes = ("pages", PROGRESS)
+    personalized_fields = ("pages", "completed", "locked")
+
     class Meta:
         model = MainContent
         fields = '__all__'
+        list_serializer_class = FragmentListSerializer
 
 
     def get_pages(self, obj):
-        qs = obj.pages.all().order_by("order")
-        return PageMiniSerializer(qs, many=True, context=self.context).data
+        qs = obj.pages.defer("content").order_by("order")
+        return PageMiniSerializer(qs, many=True, context=self.context, nested=True).data
     
     def get_quiz(self, obj):
         return hasattr(obj, "quiz") and obj.quiz is not None
@@ -199,14 +216,13 @@ class MainContentSerializer(serializers.ModelSerializer):
         return MainContentProgress.objects.filter(user=user, main_content=obj, completed=True).exists()
     
     def get_completion_percentage(self, obj):
-        user = self.context["request"].user
-        total = obj.pages.count()
-        if total == 0:
+        pages = completion_for(self.context).siblings(obj.id)
+        if not pages:
             return 0
-        completed = PageProgress.objects.filter(
-            user=user, page__main_content=obj, completed=True
-        ).count()
-        return round((completed / total) * 100)
+        completed = completion_for(self.context).count_completed(
+            (main_content_id, slot) for _, main_content_id, slot in pages
+        )
+        return round((completed / len(pages)) * 100)
     
     def get_locked(self, obj):
         user = self.context["request"].user
@@ -231,7 +247,7 @@ class MainContentSerializer(serializers.ModelSerializer):
             "title": obj.module.title
         }
 
-class MainContentListSerializer(serializers.ModelSerializer):
+class MainContentListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     module_detail = serializers.SerializerMethodField()
 
     class Meta:
@@ -244,7 +260,7 @@ class MainContentListSerializer(serializers.ModelSerializer):
             "title": obj.module.title
         }
 
-class ModuleSerializer(serializers.ModelSerializer):
+class ModuleSerializer(FragmentCacheMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     main_contents = MainContentSerializer(many=True, read_only=True)
     completed = serializers.SerializerMethodField()
     locked = serializers.SerializerMethodField()
@@ -253,10 +269,18 @@ class ModuleSerializer(serializers.ModelSerializer):
     total_duration = serializers.SerializerMethodField()         
     formatted_duration = serializers.SerializerMethodField() 
     difficulty_level = serializers.CharField(read_only=False, required=False)
-    
+
+    # ?include=main_contents,pages,progress (each level picks its groups)
+    include_groups = {
+        "main_contents": ("main_contents",),
+        PROGRESS: ("completed", "locked", "completion_percentage"),
+    }
+    default_includes = ("main_contents", PROGRESS)
+    personalized_fields = ("main_contents", "completed", "locked", "completion_percentage")
 
     class Meta:
         model = Module
+        list_serializer_class = FragmentListSerializer
         fields = [
             "id",
             "title",
@@ -293,22 +317,7 @@ class ModuleSerializer(serializers.ModelSerializer):
         """
         Calculate module completion based on total pages in all main_contents.
         """
-        user = self.context["request"].user
-        main_contents = obj.main_contents.all()
-
-        total_pages = 0
-        completed_pages = 0
-
-        for mc in main_contents:
-            total_pages += mc.pages.count()
-            completed_pages += PageProgress.objects.filter(
-                user=user, page__main_content=mc, completed=True
-            ).count()
-
-        if total_pages == 0:
-            return 0
-
-        return round((completed_pages / total_pages) * 100, 2)
+        return progress.module_completion_percentage(obj, self.context["request"].user)
     
     def get_total_duration(self, obj):
         return obj.total_duration
@@ -321,23 +330,26 @@ class ModuleSerializer(serializers.ModelSerializer):
 
 
 
-class TopicSerializer(serializers.ModelSerializer):
+class TopicSerializer(FragmentCacheMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     modules = ModuleSerializer(many=True, read_only=True)
     completed = serializers.SerializerMethodField()
     total_duration = serializers.SerializerMethodField()   
     formatted_duration = serializers.SerializerMethodField()
 
+    include_groups = {"modules": ("modules",), PROGRESS: ("completed",)}
+    default_includes = ("modules", PROGRESS)
+    personalized_fields = ("modules", "completed")
+
     class Meta:
         model = Topic
+        list_serializer_class = FragmentListSerializer
         fields = ["id", "name", "order", "modules","prize", "completed",  "total_duration",
             "formatted_duration",]
 
     def get_completed(self, obj):
+        # TopicProgress is kept by the completion cascade (completion.py)
         user = self.context["request"].user
-        for module in obj.modules.all():
-            if not Progress.objects.filter(user=user, module=module, completed=True).exists():
-                return False
-        return True
+        return TopicProgress.objects.filter(user=user, topic=obj, completed=True).exists()
     
         # ✅ Duration methods
     def get_total_duration(self, obj):
@@ -409,7 +421,11 @@ class QuizSerializer(serializers.ModelSerializer):
         model = Quiz
         fields = ["id", "title", "questions", "main_content"]
 
-class ModuleListSerializer(serializers.ModelSerializer):
+class ModuleListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    # Both read the with_module_progress() annotations, no query per module
+    formatted_duration = serializers.SerializerMethodField()
+    completion_percentage = serializers.SerializerMethodField()
+
     class Meta:
         model = Module
         fields = [
@@ -422,7 +438,13 @@ class ModuleListSerializer(serializers.ModelSerializer):
             "completion_percentage",
         ]
 
-class TopicListSerializer(serializers.ModelSerializer):
+    def get_formatted_duration(self, obj):
+        return obj.formatted_duration
+
+    def get_completion_percentage(self, obj):
+        return progress.module_completion_percentage(obj, self.context["request"].user)
+
+class TopicListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     modules = ModuleListSerializer(many=True)
 
     class Meta:
@@ -434,10 +456,13 @@ class TopicListSerializer(serializers.ModelSerializer):
             "modules",
         ]
         
-class PageSidebarSerializer(serializers.ModelSerializer):
+class PageSidebarSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     completed = serializers.SerializerMethodField()
     formatted_duration = serializers.SerializerMethodField()
 
+    include_groups = {PROGRESS: ("completed",)}
+    default_includes = (PROGRESS,)
+
     class Meta:
         model = Page
         fields = [
@@ -449,12 +474,7 @@ class PageSidebarSerializer(serializers.ModelSerializer):
         ]
 
     def get_completed(self, obj):
-        user = self.context["request"].user
-        return PageProgress.objects.filter(
-            user=user,
-            page=obj,
-            completed=True
-        ).exists()
+        return completion_for(self.context).is_completed(obj)
 
     def get_formatted_duration(self, obj):
         return format_duration(obj.time_duration)
@@ -484,7 +504,6 @@ class AdminPageListSerializer(serializers.ModelSerializer):
         fields = [
             "id",
             "title",
-            "content",
             "order",
             "time_duration",
             "main_content",
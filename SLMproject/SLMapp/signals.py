@@ -0,0 +1,201 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from accounts.models import CustomUser
+from . import completion, progress_bits, stats
+from .fragments import content_changed
+from .models import (
+    MainContent, MainContentProgress, Module, MuxAccount, Page, PageProgress, Progress, Question, Quiz,
+    QuizResult, Topic, TopicProgress,
+)
+from .rendering import invalidate_rendered_page
+from .search import index_object, move_descendants, unindex_object
+
+CONTENT_MODELS = (Topic, Module, MainContent, Page, Quiz, MuxAccount)
+
+
+def _content_saved(sender, **kwargs):
+    content_changed()
+
+
+for _model in CONTENT_MODELS:
+    post_save.connect(_content_saved, sender=_model, dispatch_uid=f"content-saved-{_model.__name__}")
+    post_delete.connect(_content_saved, sender=_model, dispatch_uid=f"content-deleted-{_model.__name__}")
+
+
+def _page_changed(sender, instance, **kwargs):
+    invalidate_rendered_page(instance.pk)
+
+
+post_save.connect(_page_changed, sender=Page, dispatch_uid="page-render-saved")
+post_delete.connect(_page_changed, sender=Page, dispatch_uid="page-render-deleted")
+
+
+# Search index (SLMapp.search), same transaction as the content write
+
+def _index(sender, instance, created=False, **kwargs):
+    index_object(instance)
+    if not created:
+        move_descendants(instance)
+
+
+def _unindex(sender, instance, **kwargs):
+    unindex_object(instance)
+
+
+def _quiz_saved(sender, instance, **kwargs):
+    # Question documents carry the quiz title and its main content's place
+    for question in instance.questions.select_related("quiz__main_content__module"):
+        index_object(question)
+
+
+for _model in (Topic, Module, MainContent, Page, Question):
+    post_save.connect(_index, sender=_model, dispatch_uid=f"search-index-{_model.__name__}")
+    post_delete.connect(_unindex, sender=_model, dispatch_uid=f"search-unindex-{_model.__name__}")
+post_save.connect(_quiz_saved, sender=Quiz, dispatch_uid="search-index-quiz")
+
+
+
+# Dashboard counters (SLMapp.stats), bumped once the row's transaction commits
+
+COUNTED_MODELS = {
+    CustomUser: stats.USERS,
+    Topic: stats.TOPICS,
+    Module: stats.MODULES,
+    MainContent: stats.MAIN_CONTENTS,
+    Page: stats.PAGES,
+}
+
+
+def _count_created(sender, created, **kwargs):
+    if created:
+        stats.bump(COUNTED_MODELS[sender])
+
+
+def _count_deleted(sender, **kwargs):
+    stats.bump(COUNTED_MODELS[sender], -1)
+
+
+for _model in COUNTED_MODELS:
+    post_save.connect(_count_created, sender=_model, dispatch_uid=f"stats-created-{_model.__name__}")
+    post_delete.connect(_count_deleted, sender=_model, dispatch_uid=f"stats-deleted-{_model.__name__}")
+
+
+def _page_progress_completed_before(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Stored value, so a False -> True flip of an existing row is counted too.
+    # Callers that just read the row set _was_completed themselves, no SELECT
+    if getattr(instance, "_was_completed", None) is not None:
+        return
+    instance._was_completed = None
+    if raw or instance._state.adding:
+        instance._was_completed = False
+    elif update_fields is None or "completed" in update_fields:
+        instance._was_completed = (
+            PageProgress.objects.filter(pk=instance.pk).values_list("completed", flat=True).first()
+        )
+
+
+def _page_progress_saved(sender, instance, created, **kwargs):
+    # queryset.update() skips this, reconcile_stats picks those up
+    was_completed = getattr(instance, "_was_completed", None)
+    instance._was_completed = None
+    if created:
+        was_completed = False
+    if was_completed is None or was_completed == instance.completed:
+        return
+    stats.bump(stats.PAGE_COMPLETIONS, 1 if instance.completed else -1)
+
+
+def _page_progress_deleted(sender, instance, **kwargs):
+    if instance.completed:
+        stats.bump(stats.PAGE_COMPLETIONS, -1)
+
+
+def _quiz_result_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.bump(stats.QUIZ_ATTEMPTS)
+        if instance.passed:
+            stats.bump(stats.QUIZ_PASSES)
+
+
+def _quiz_result_deleted(sender, instance, **kwargs):
+    stats.bump(stats.QUIZ_ATTEMPTS, -1)
+    if instance.passed:
+        stats.bump(stats.QUIZ_PASSES, -1)
+
+
+pre_save.connect(_page_progress_completed_before, sender=PageProgress, dispatch_uid="stats-page-progress-before")
+post_save.connect(_page_progress_saved, sender=PageProgress, dispatch_uid="stats-page-progress-saved")
+post_delete.connect(_page_progress_deleted, sender=PageProgress, dispatch_uid="stats-page-progress-deleted")
+post_save.connect(_quiz_result_saved, sender=QuizResult, dispatch_uid="stats-quiz-result-saved")
+post_delete.connect(_quiz_result_deleted, sender=QuizResult, dispatch_uid="stats-quiz-result-deleted")
+
+
+# Bitset progress (SLMapp.progress_bits), dual-written with PageProgress
+
+def _page_slot(sender, instance, raw=False, **kwargs):
+    if raw:
+        # loaddata: keep the fixture's slot, give one to pages without
+        progress_bits.allocate_slot(instance)
+    else:
+        instance._progress_moved_from = progress_bits.prepare_page_save(instance)
+
+
+def _page_slot_saved(sender, instance, raw=False, **kwargs):
+    moved_from = getattr(instance, "_progress_moved_from", None)
+    if moved_from:
+        progress_bits.clear_slot(*moved_from)
+        progress_bits.resync_page(instance)
+        instance._progress_moved_from = None
+
+
+def _page_slot_deleted(sender, instance, **kwargs):
+    progress_bits.clear_slot(instance.main_content_id, instance.progress_slot)
+
+
+def _page_position(instance):
+    """ (main_content_id, progress_slot) of a progress row's page, without loading its content """
+    if PageProgress.page.is_cached(instance):
+        return instance.page.main_content_id, instance.page.progress_slot
+    return Page.objects.filter(pk=instance.page_id).values_list("main_content_id", "progress_slot").first()
+
+
+def _page_progress_bits(sender, instance, **kwargs):
+    position = _page_position(instance)
+    if position:
+        progress_bits.set_page(instance.user_id, *position, instance.completed)
+
+
+def _page_progress_bits_deleted(sender, instance, **kwargs):
+    position = _page_position(instance)
+    if position:
+        progress_bits.set_page(instance.user_id, *position, completed=False)
+
+
+pre_save.connect(_page_slot, sender=Page, dispatch_uid="progress-bits-page-slot")
+post_save.connect(_page_slot_saved, sender=Page, dispatch_uid="progress-bits-page-moved")
+post_delete.connect(_page_slot_deleted, sender=Page, dispatch_uid="progress-bits-page-deleted")
+post_save.connect(_page_progress_bits, sender=PageProgress, dispatch_uid="progress-bits-saved")
+post_delete.connect(_page_progress_bits_deleted, sender=PageProgress, dispatch_uid="progress-bits-deleted")
+
+
+# Completion "done" cache (SLMapp.completion): a removed or un-completed
+# progress row must not keep short-circuiting
+
+DONE_LEVELS = {
+    PageProgress: (completion.PAGE, "page_id"),
+    MainContentProgress: (completion.MAIN_CONTENT, "main_content_id"),
+    Progress: (completion.MODULE, "module_id"),
+    TopicProgress: (completion.TOPIC, "topic_id"),
+}
+
+
+def _forget_done(sender, instance, **kwargs):
+    if kwargs.get("signal") is post_save and instance.completed:
+        return
+    level, field = DONE_LEVELS[sender]
+    completion.forget_done(level, instance.user_id, getattr(instance, field))
+
+
+for _model in DONE_LEVELS:
+    post_save.connect(_forget_done, sender=_model, dispatch_uid=f"completion-done-saved-{_model.__name__}")
+    post_delete.connect(_forget_done, sender=_model, dispatch_uid=f"completion-done-deleted-{_model.__name__}")
@@ -0,0 +1,177 @@
+"""
+Admin dashboard statistics.
+
+Totals live in StatCounter rows instead of being counted on every
+dashboard load:
+
+- signals (SLMapp.signals) bump them once the writing transaction commits,
+  with F() increments so concurrent writers don't lose updates; the
+  counter row is only locked for that one UPDATE, not for the learner's
+  whole transaction, and a rolled back write isn't counted
+- code that skips signals (bulk_create, queryset.update) calls bump()
+- reconcile() recounts everything from the source tables, fixes drift,
+  refreshes the time-windowed metrics (active learners) and upserts
+  today's StatSnapshot rows used for charts
+
+Run ``manage.py reconcile_stats`` periodically (every 10-15 minutes); it
+also fixes the odd bump lost to a crash right after a commit.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.models import CustomUser, UserLastPage
+from .models import (
+    MainContent, Module, Page, PageProgress, QuizResult, StatCounter, StatSnapshot, Topic,
+)
+
+USERS = "users"
+TOPICS = "topics"
+MODULES = "modules"
+MAIN_CONTENTS = "main_contents"
+PAGES = "pages"
+PAGE_COMPLETIONS = "page_completions"
+QUIZ_ATTEMPTS = "quiz_attempts"
+QUIZ_PASSES = "quiz_passes"
+ACTIVE_7D = "active_learners_7d"
+ACTIVE_30D = "active_learners_30d"
+
+# Counters bump() keeps current; the windowed ones only change on reconcile
+SIGNAL_COUNTERS = (
+    USERS, TOPICS, MODULES, MAIN_CONTENTS, PAGES, PAGE_COMPLETIONS, QUIZ_ATTEMPTS, QUIZ_PASSES,
+)
+WINDOWED_COUNTERS = (ACTIVE_7D, ACTIVE_30D)
+
+MAX_SERIES_DAYS = 365
+
+
+def _active_since(days):
+    since = timezone.now() - timedelta(days=days)
+    return UserLastPage.objects.filter(updated_at__gte=since).count()
+
+
+SOURCES = {
+    USERS: lambda: CustomUser.objects.count(),
+    TOPICS: lambda: Topic.objects.count(),
+    MODULES: lambda: Module.objects.count(),
+    MAIN_CONTENTS: lambda: MainContent.objects.count(),
+    PAGES: lambda: Page.objects.count(),
+    PAGE_COMPLETIONS: lambda: PageProgress.objects.filter(completed=True).count(),
+    QUIZ_ATTEMPTS: lambda: QuizResult.objects.count(),
+    QUIZ_PASSES: lambda: QuizResult.objects.filter(passed=True).count(),
+    ACTIVE_7D: lambda: _active_since(7),
+    ACTIVE_30D: lambda: _active_since(30),
+}
+
+
+def bump(name, delta=1):
+    """ Add delta to a counter once the caller's transaction commits """
+    if delta:
+        transaction.on_commit(lambda: _add(name, delta))
+
+
+def _add(name, delta):
+    updated = StatCounter.objects.filter(name=name).update(
+        value=F("value") + delta, updated_at=timezone.now()
+    )
+    if not updated:
+        # No row yet: the source table already includes this change
+        StatCounter.objects.get_or_create(name=name, defaults={"value": SOURCES[name]()})
+
+
+def reconcile(names=None):
+    """
+    Recount counters from their source tables. Returns {name: (old, new)}
+    for the ones that had drifted.
+
+    The counter rows are locked first, so a bump either lands before the
+    recount or waits and adds its delta on top of the new value. A row
+    committed before the recount whose bump lands after it is counted
+    twice until the next run.
+    """
+    names = list(names or SOURCES)
+    drift = {}
+    with transaction.atomic():
+        current = dict(
+            StatCounter.objects.select_for_update()
+            .filter(name__in=names)
+            .values_list("name", "value")
+        )
+        now = timezone.now()
+        for name in names:
+            value = SOURCES[name]()
+            old = current.get(name)
+            if old is None:
+                StatCounter.objects.create(name=name, value=value)
+            else:
+                StatCounter.objects.filter(name=name).update(value=value, updated_at=now)
+            if old != value:
+                drift[name] = (old, value)
+    return drift
+
+
+def snapshot(day=None):
+    """ Upsert the current counters as the data point for day (default today) """
+    day = day or timezone.localdate()
+    rows = [
+        StatSnapshot(day=day, name=name, value=value)
+        for name, value in StatCounter.objects.values_list("name", "value")
+    ]
+    StatSnapshot.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["name", "day"],
+        update_fields=["value"],
+    )
+    return len(rows)
+
+
+# -------------------------
+# READS (dashboard)
+# -------------------------
+
+def current_stats():
+    """ All counters in one query, as {name: value} plus "reconciled_at" """
+    values = {name: 0 for name in SOURCES}
+    reconciled_at = None
+    for name, value, updated_at in StatCounter.objects.values_list("name", "value", "updated_at"):
+        values[name] = value
+        if name in WINDOWED_COUNTERS:
+            reconciled_at = updated_at
+    values["reconciled_at"] = reconciled_at
+    return values
+
+
+def quiz_pass_rate(stats):
+    if not stats[QUIZ_ATTEMPTS]:
+        return None
+    return round(stats[QUIZ_PASSES] * 100 / stats[QUIZ_ATTEMPTS], 1)
+
+
+def series(days=30):
+    """
+    Daily chart data from snapshots: {name: [{"date", "value"}, ...]} plus
+    "completions_per_day", derived from the page_completions totals.
+    """
+    days = max(1, min(days, MAX_SERIES_DAYS))
+    since = timezone.localdate() - timedelta(days=days)
+    rows = StatSnapshot.objects.filter(day__gte=since).order_by("day").values_list(
+        "day", "name", "value"
+    )
+
+    out = {}
+    for day, name, value in rows:
+        out.setdefault(name, []).append({"date": day, "value": value})
+
+    # One extra day was fetched so the first delta has a previous total
+    totals = out.get(PAGE_COMPLETIONS, [])
+    out["completions_per_day"] = [
+        {"date": point["date"], "value": max(0, point["value"] - previous["value"])}
+        for previous, point in zip(totals, totals[1:])
+    ]
+    for name, points in out.items():
+        if name != "completions_per_day" and points and points[0]["date"] == since:
+            out[name] = points[1:]
+    return out
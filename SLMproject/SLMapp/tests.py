@@ -1,3 +1,711 @@
-from django.test import TestCase
+import decimal
+import gzip
+import io
+import os
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core import serializers
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import CustomUser
+from . import events, funnel, progress, progress_bits, renderers, rendering, search, stats
+from .completion import complete_page
+from .models import (
+    ContentVersion, FunnelRollup, LearningEvent, MainContent, MainContentProgress, Module, MuxAccount, Page, PageProgress,
+    PageProgressBits, Progress, Quiz, QuizResult, RollupWatermark, SearchDocument, StatCounter, Topic,
+    TopicProgress,
+)
+from .rendering import render_content
+
+
+class CourseTestCase(APITestCase):
+    """ topic -> module -> two main contents of three pages, an enrolled student """
+
+    def setUp(self):
+        cache.clear()
+        self.topic = Topic.objects.create(name="Python", order=1)
+        self.module = Module.objects.create(topic=self.topic, title="Basics", order=1)
+        self.main_contents = [
+            MainContent.objects.create(module=self.module, title=f"Part {n}", order=n) for n in (1, 2)
+        ]
+        self.pages = [
+            Page.objects.create(main_content=mc, title=f"Page {n}", content="<p>x</p>", order=n, time_duration=5)
+            for mc in self.main_contents
+            for n in (1, 2, 3)
+        ]
+        self.student = CustomUser.objects.create(email="student@x.com", role="student", is_active=True)
+        self.student.topics.add(self.topic)
+        self.client.force_authenticate(self.student)
+
+    def as_user(self, user):
+        self.client.force_authenticate(CustomUser.objects.get(pk=user.pk))
+
+
+
+# Known sanitizer bypasses; none of these may survive render_content()
+XSS_PAYLOADS = [
+    "<svg><style><img src=x onerror=alert(1)></style></svg>",
+    "<svg><animate attributeName=href values=javascript:alert(3)>",
+    "<math><mi><style><img src=x onerror=alert(2)></style></mi></math>",
+    "<noscript><p title=\"</noscript><img src=x onerror=alert(4)>\"></noscript>",
+    "<![CDATA[<img src=x onerror=alert(5)>]]>",
+    "<!DOCTYPE html><!--><img src=x onerror=alert(6)>-->",
+    "<a href=\"jav&#x09;ascript:alert(7)\">x</a>",
+    "<a href=\"data:text/html,<script>alert(8)</script>\">x</a>",
+    "<img src=\"data:image/svg+xml,<svg onload=alert(9)>\">",
+    "<iframe srcdoc=\"<script>alert(10)</script>\"></iframe>",
+    "<p style=\"background:url(javascript:alert(11))\" onclick=\"alert(12)\">x</p>",
+    "<form><button formaction=javascript:alert(13)>x</button></form>",
+    "<script>alert(14)</script><style>*{}</style>",
+]
+FORBIDDEN = ("<svg", "<math", "<style", "<script", "<!", "onerror", "onclick", "onload",
+             "javascript:", "data:text", "data:image/svg", "srcdoc", "formaction", "style=\"background")
+
+
+class SanitizerTests(SimpleTestCase):
+    def assertSafe(self, payload):
+        out = render_content(payload)["html"].lower()
+        for needle in FORBIDDEN:
+            self.assertNotIn(needle, out, f"{payload!r} -> {out!r}")
+
+    def test_payloads(self):
+        for payload in XSS_PAYLOADS:
+            with self.subTest(payload=payload):
+                self.assertSafe(payload)
+
+    def test_payloads_without_nh3(self):
+        # The built-in allowlist pass must hold on its own
+        nh3, rendering.nh3 = rendering.nh3, None
+        try:
+            for payload in XSS_PAYLOADS:
+                with self.subTest(payload=payload):
+                    self.assertSafe(payload)
+        finally:
+            rendering.nh3 = nh3
+
+    def test_text_is_escaped(self):
+        nh3, rendering.nh3 = rendering.nh3, None
+        try:
+            out = render_content("<p>a &lt;b&gt; <unknown>c</unknown></p>")["html"]
+        finally:
+            rendering.nh3 = nh3
+        self.assertEqual(out, "<p>a &lt;b&gt; c</p>")
+
+    def test_lesson_markup_kept(self):
+        out = render_content(
+            '<h2>Intro</h2><p><a href="https://example.com" target="_blank">link</a></p>'
+            '<img src="/media/a.png" alt="a"><iframe src="https://player.example.com/x"></iframe>'
+        )
+        self.assertIn("<h2>Intro</h2>", out["html"])
+        self.assertIn('rel="noopener noreferrer"', out["html"])
+        self.assertEqual([m["src"] for m in out["media"]], ["/media/a.png", "https://player.example.com/x"])
+
+
+# -------------------------
+# ENROLLMENT (IsEnrolled)
+# -------------------------
+
+class EnrollmentTests(CourseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.outsider = CustomUser.objects.create(email="out@x.com", role="student", is_active=True)
+        self.staff = CustomUser.objects.create(email="staff@x.com", role="admin", is_staff=True, is_active=True)
+
+    def test_outsider_gets_403(self):
+        self.as_user(self.outsider)
+        self.assertEqual(self.client.get(f"/modules/{self.module.id}/").status_code, 403)
+        self.assertEqual(self.client.get(f"/pages/{self.pages[0].id}/").status_code, 403)
+        self.assertEqual(self.client.get("/api/maincontents/").json(), [])
+        for url in (
+            f"/pages/{self.pages[0].id}/complete/",
+            f"/maincontents/{self.main_contents[0].id}/complete/",
+            f"/modules/{self.module.id}/complete/",
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.post(url).status_code, 403)
+
+    def test_enrolled_student(self):
+        self.assertEqual(self.client.get(f"/modules/{self.module.id}/").status_code, 200)
+        self.assertEqual(self.client.post(f"/pages/{self.pages[0].id}/complete/").status_code, 200)
+
+    def test_staff_manage_every_topic(self):
+        self.as_user(self.staff)
+        self.assertEqual(len(self.client.get("/api/maincontents/").json()), 2)
+        r = self.client.patch(f"/api/pages/{self.pages[0].id}/", {"title": "Renamed"})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(Page.objects.get(pk=self.pages[0].pk).title, "Renamed")
+
+    def test_orphan_quiz_is_staff_only(self):
+        quiz = Quiz.objects.create(title="Loose")
+        url = f"/api/quizzes/{quiz.id}/add_question/"
+        question = {"text": "Q?", "choices": [{"text": "A", "is_correct": True}]}
+        self.assertEqual(self.client.post(url, question, format="json").status_code, 403)
+        self.as_user(self.staff)
+        self.assertEqual(self.client.post(url, question, format="json").status_code, 201)
+
+    def test_local_cache_ttl_is_short(self):
+        from unittest import mock
+        from django.conf import settings
+        from accounts import enrollment
+
+        self.assertEqual(enrollment._cache_seconds(), settings.ENROLLMENT_LOCAL_CACHE_SECONDS)
+        with mock.patch.object(enrollment, "cache_is_shared", return_value=True):
+            self.assertEqual(enrollment._cache_seconds(), settings.ENROLLMENT_CACHE_SECONDS)
+
+
+# -------------------------
+# SPARSE FIELDSETS (?fields= / ?include=)
+# -------------------------
+
+class FieldsetTests(CourseTestCase):
+    def test_fields_trims_the_top_level_only(self):
+        data = self.client.get(f"/maincontents/{self.main_contents[0].id}/?fields=title,pages").json()
+        self.assertEqual(set(data), {"id", "title", "pages"})
+        self.assertEqual(len(data["pages"]), 3)
+        for page in data["pages"]:
+            self.assertLessEqual({"id", "title", "order", "completed", "locked"}, set(page))
+
+    def test_nested_main_content_keeps_its_fields(self):
+        page = self.pages[0]
+        data = self.client.get(f"/pages/{page.id}/?fields=title,main_content&include=main_content").json()
+        self.assertEqual(set(data), {"id", "title", "main_content"})
+        self.assertIn("module", data["main_content"])
+        self.assertIn("order", data["main_content"])
+
+
+# -------------------------
+# LEARNING EVENTS
+# -------------------------
+
+class LearningEventTests(CourseTestCase):
+    def setUp(self):
+        super().setUp()
+        page = self.pages[0]
+        page.video_id, page.mux_account = "abc", MuxAccount.objects.create(name="main")
+        page.save()
+        patcher = mock.patch("SLMapp.serializers.generate_mux_signed_url", return_value="https://stream.mux.com/abc.m3u8")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def kinds(self):
+        return list(LearningEvent.objects.order_by("id").values_list("kind", "object_id", "topic_id"))
+
+    def test_written_straight_to_the_test_database(self):
+        # Nothing may be left for the atexit flush under manage.py test
+        self.assertIsInstance(events.get_buffer(), events.DirectWriter)
+        self.client.post(f"/pages/{self.pages[0].id}/complete/")
+        self.assertEqual(self.kinds(), [(events.PAGE_COMPLETED, self.pages[0].id, self.topic.id)])
+        self.assertEqual(events.flush(), 0)
+
+    def test_video_url_issued_by_the_page_view_only(self):
+        page_id = self.pages[0].id
+        self.assertEqual(self.client.get(f"/pages/{page_id}/").status_code, 200)
+        self.assertEqual(self.kinds(), [
+            (events.PAGE_VIEWED, page_id, self.topic.id),
+            (events.VIDEO_URL_ISSUED, page_id, self.topic.id),
+        ])
+
+        LearningEvent.objects.all().delete()
+        self.as_user(CustomUser.objects.create(email="staff@x.com", role="admin", is_staff=True))
+        self.assertEqual(self.client.get("/api/pages/").status_code, 200)
+        self.assertEqual(self.kinds(), [])
+
+
+# -------------------------
+# PROGRESS BITS
+# -------------------------
+
+class ProgressBitsTests(CourseTestCase):
+    def complete(self, page):
+        return self.client.post(f"/pages/{page.id}/complete/")
+
+    def completed(self, page):
+        return progress_bits.PageCompletion(self.student.id).is_completed(page)
+
+    def words(self):
+        return sorted(PageProgressBits.objects.filter(bits__gt=0).values_list("user_id", "main_content_id", "word", "bits"))
+
+    def test_detail_locked_until_previous_done(self):
+        first, second, third = self.pages[:3]
+        self.assertEqual(self.client.get(f"/pages/{second.id}/").status_code, 403)
+        self.complete(first)
+        self.assertEqual(self.client.get(f"/pages/{second.id}/").status_code, 200)
+        self.assertEqual(self.client.get(f"/pages/{third.id}/").status_code, 403)
+
+    def test_bit_follows_moved_page(self):
+        page = self.pages[1]
+        self.complete(page)
+        page.main_content = self.main_contents[1]
+        page.save()
+        self.assertEqual(page.progress_slot, 3)  # next free slot over there
+        self.assertTrue(self.completed(page))
+        self.assertFalse(progress_bits.PageCompletion(self.student.id).completed_slot(self.main_contents[0].id, 1))
+
+    def test_bit_cleared_on_delete(self):
+        self.complete(self.pages[0])
+        self.assertTrue(self.words())
+        PageProgress.objects.filter(page=self.pages[0]).delete()
+        self.assertFalse(self.completed(self.pages[0]))
+        self.complete(self.pages[0])
+        self.pages[0].delete()
+        self.assertEqual(self.words(), [])
+
+    def test_rebuild_matches_page_progress(self):
+        for page in (self.pages[0], self.pages[1], self.pages[3]):
+            self.complete(page)
+        before = self.words()
+        PageProgressBits.objects.update(bits=0)
+        call_command("rebuild_progress_bits", stdout=open(os.devnull, "w"))
+        self.assertEqual(self.words(), before)
+
+    def test_pages_without_slot_are_repaired(self):
+        # bulk_create skips save() and with it the slot
+        extra = MainContent.objects.create(module=self.module, title="Bulk", order=3)
+        first, second = Page.objects.bulk_create([
+            Page(main_content=extra, title="A", content="x", order=1),
+            Page(main_content=extra, title="B", content="x", order=2),
+        ])
+        PageProgress.objects.create(user=self.student, page=first, completed=True)
+        self.assertEqual(self.client.get(f"/pages/{second.id}/").status_code, 200)
+        self.assertEqual(
+            sorted(Page.objects.filter(main_content=extra).values_list("progress_slot", flat=True)), [0, 1]
+        )
+        self.assertTrue(self.completed(Page.objects.get(pk=first.pk)))
+
+    def test_fixture_pages_get_a_slot(self):
+        data = serializers.serialize("json", [Page(
+            id=999, main_content=self.main_contents[0], title="Loaded", content="x", order=4,
+        )])
+        for obj in serializers.deserialize("json", data):
+            obj.save()  # raw, like loaddata
+        self.assertEqual(Page.objects.get(pk=999).progress_slot, 3)
+
+    def test_module_progress_same_from_bits_and_rows(self):
+        second = Module.objects.create(topic=self.topic, title="Next", order=2)
+        wide = MainContent.objects.create(module=second, title="Long", order=1)
+        pages = [Page(main_content=wide, title="P", content="x", order=n, time_duration=1) for n in range(70)]
+        for page in pages:
+            page.save()  # slots 63 and 64 sit in different words
+        for page in (self.pages[0], self.pages[4], pages[63], pages[64]):
+            PageProgress.objects.create(user=self.student, page=page, completed=True)
+
+        for bitset_reads in (True, False):
+            with self.subTest(bitset_reads=bitset_reads), override_settings(PROGRESS_BITSET_READS=bitset_reads):
+                modules = progress.with_module_progress(Module.objects.order_by("order"), self.student)
+                self.assertEqual(
+                    [(m.page_count, m.completed_pages, m.total_minutes) for m in modules], [(6, 2, 30), (70, 2, 70)]
+                )
+                self.assertEqual(progress.module_completion_percentage(self.module, self.student), 33.33)
+
+
+# -------------------------
+# DASHBOARD COUNTERS
+# -------------------------
+
+class StatCounterTests(CourseTestCase):
+    def counters(self, *names):
+        current = stats.current_stats()
+        return tuple(current[name] for name in names)
+
+    def test_bumped_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            stats.reconcile()
+        with self.captureOnCommitCallbacks() as callbacks:
+            CustomUser.objects.create(email="new@x.com", role="student")
+        self.assertEqual(self.counters(stats.USERS), (1,))  # not before the commit
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.counters(stats.USERS), (2,))
+
+    def test_rolled_back_write_not_counted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            stats.reconcile()
+            try:
+                with transaction.atomic():
+                    Topic.objects.create(name="Gone")
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(self.counters(stats.TOPICS), (1,))
+
+    def test_counts_follow_writes(self):
+        quiz = Quiz.objects.create(main_content=self.main_contents[0], title="Q")
+        with self.captureOnCommitCallbacks(execute=True):
+            stats.reconcile()
+            PageProgress.objects.update_or_create(user=self.student, page=self.pages[0], defaults={"completed": True})
+            PageProgress.objects.update_or_create(user=self.student, page=self.pages[0], defaults={"completed": True})
+            QuizResult.objects.create(user=self.student, quiz=quiz, score=1, passed=True)
+            QuizResult.objects.create(user=self.student, quiz=quiz, score=0, passed=False)
+        self.assertEqual(self.counters(stats.PAGE_COMPLETIONS, stats.QUIZ_ATTEMPTS, stats.QUIZ_PASSES), (1, 2, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.topic.delete()  # cascades to everything above
+        self.assertEqual(
+            self.counters(stats.TOPICS, stats.PAGES, stats.PAGE_COMPLETIONS, stats.QUIZ_ATTEMPTS), (0, 0, 0, 0)
+        )
+        self.assertEqual(stats.reconcile(), {})
+
+    def test_flip_counted_without_reading_the_row_again(self):
+        row = PageProgress.objects.create(user=self.student, page=self.pages[0], completed=False)
+        page = Page.objects.select_related("main_content__module").get(pk=self.pages[0].pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            stats.reconcile()
+            with CaptureQueriesContext(connection) as queries:
+                complete_page(self.student, page)
+        self.assertEqual(self.counters(stats.PAGE_COMPLETIONS), (1,))
+        reads = [q["sql"] for q in queries if q["sql"].startswith('SELECT "SLMapp_pageprogress"."completed"')]
+        self.assertEqual(reads, [])
+        row.refresh_from_db()
+        self.assertTrue(row.completed)
+
+    def test_reconcile_fixes_drift(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            stats.reconcile()
+            # queryset.update() skips the signals
+            PageProgress.objects.create(user=self.student, page=self.pages[0], completed=False)
+        PageProgress.objects.update(completed=True)
+        StatCounter.objects.filter(name=stats.USERS).update(value=99)
+        self.assertEqual(stats.reconcile([stats.USERS, stats.PAGE_COMPLETIONS]), {
+            stats.USERS: (99, 1), stats.PAGE_COMPLETIONS: (0, 1),
+        })
+        self.assertEqual(self.counters(stats.USERS, stats.PAGE_COMPLETIONS), (1, 1))
+
+
+# -------------------------
+# SEARCH
+# -------------------------
+
+class SearchTests(CourseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pages[0].title = "Inner joins"
+        self.pages[0].content = "<p>An INNER JOIN returns matching rows</p><script>var joined=1</script>"
+        self.pages[0].save()
+        self.pages[1].content = "<p>Joins combine tables</p>"
+        self.pages[1].save()
+        other = Topic.objects.create(name="Hidden", order=2)
+        Module.objects.create(topic=other, title="Joins elsewhere", order=1)
+
+    def hits(self, q, **params):
+        return self.client.get("/api/search/", {"q": q, **params}).json()["results"]
+
+    def test_prefix_search_within_enrollment(self):
+        hits = self.hits("joi")
+        self.assertEqual({hit["id"] for hit in hits}, {self.pages[0].id, self.pages[1].id})
+        self.assertEqual(hits[0]["id"], self.pages[0].id)  # title hit ranks first
+        self.assertIn("<mark>", hits[0]["snippet"])
+        self.assertNotIn("var", hits[0]["snippet"])
+        self.assertEqual(self.hits("jo"), [])  # too short for a prefix
+        self.assertEqual(self.hits("'\")*(:"), [])
+
+    def test_broad_query_ranks_title_hits(self):
+        with override_settings(SEARCH_BROAD_QUERY_MATCHES=1):
+            self.assertEqual([hit["id"] for hit in self.hits("joi", limit=1)], [self.pages[0].id])
+            # Titles don't fill the page: everything is ranked
+            self.assertEqual(len(self.hits("joi", limit=5)), 2)
+
+    def test_existing_content_indexed_by_migration(self):
+        from importlib import import_module
+        from django.apps import apps
+        migration = import_module("SLMapp.migrations.0021_index_existing_content")
+
+        SearchDocument.objects.all().delete()
+        self.assertEqual(self.hits("joi"), [])
+        migration.index_content(apps, None)
+        self.assertEqual(len(self.hits("joi")), 2)
+        self.assertEqual(SearchDocument.objects.count(), search.rebuild_index())
+
+
+# -------------------------
+# COMPRESSION (CompressedTextField, CompressionMiddleware)
+# -------------------------
+
+class CompressionTests(CourseTestCase):
+    body = "<p>Hello ünïcode lesson</p>\n" * 500
+
+    def setUp(self):
+        super().setUp()
+        self.page = self.pages[0]
+        self.page.content = self.body
+        self.page.save()
+
+    def test_content_round_trip(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT content FROM {Page._meta.db_table} WHERE id = %s", [self.page.id])
+            stored = cursor.fetchone()[0]
+        self.assertLess(len(stored), len(self.body) / 10)
+        self.assertEqual(Page.objects.get(pk=self.page.pk).content, self.body)
+        self.assertEqual(Page.objects.get(pk=self.pages[1].pk).content, "<p>x</p>")
+
+    def test_page_compressed(self):
+        r = self.client.get(f"/pages/{self.page.id}/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(r["Content-Encoding"], "gzip")
+        self.assertIn("ünïcode", gzip.decompress(r.content).decode())
+        self.assertTrue(r["ETag"].startswith("W/"))
+
+    def test_signed_video_url_not_compressed(self):
+        self.page.video_id, self.page.mux_account = "abc", MuxAccount.objects.create(name="main")
+        self.page.save()
+        signed = "https://stream.mux.com/abc.m3u8?token=secret"
+        with mock.patch("SLMapp.serializers.generate_mux_signed_url", return_value=signed):
+            r = self.client.get(f"/pages/{self.page.id}/", HTTP_ACCEPT_ENCODING="gzip, br")
+            self.assertFalse(r.has_header("Content-Encoding"))
+            self.assertEqual(r.json()["video_url"], signed)
+
+            self.as_user(CustomUser.objects.create(email="staff@x.com", role="admin", is_staff=True))
+            r = self.client.get(f"/api/pages/{self.page.id}/", HTTP_ACCEPT_ENCODING="gzip, br")
+            self.assertFalse(r.has_header("Content-Encoding"))
+
+    def test_login_not_compressed(self):
+        self.student.set_password("secret-pass")
+        self.student.save()
+        self.client.force_authenticate(None)
+        r = self.client.post(
+            "/accounts/login/", {"email": self.student.email, "password": "secret-pass"},
+            HTTP_ACCEPT_ENCODING="gzip, br",
+        )
+        self.assertEqual(r.status_code, 200)
+        self.assertFalse(r.has_header("Content-Encoding"))
+
+
+# -------------------------
+# FUNNEL ROLLUPS
+# -------------------------
+
+class FunnelTests(CourseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = CustomUser.objects.create(email="staff@x.com", role="admin", is_staff=True)
+        self.yesterday = timezone.now() - timedelta(days=1)
+
+    def event(self, kind, user_id, page, at):
+        LearningEvent.objects.create(kind=kind, user_id=user_id, object_id=page.id, created_at=at)
+
+    def rollups(self, level):
+        return {
+            (row.object_id, row.day): (row.started, row.completed, row.median_seconds)
+            for row in FunnelRollup.objects.filter(level=level)
+        }
+
+    def test_rollups_follow_the_watermark(self):
+        page, day = self.pages[0], timezone.localdate(self.yesterday)
+        self.event(events.PAGE_VIEWED, 1, page, self.yesterday)
+        self.event(events.PAGE_COMPLETED, 1, page, self.yesterday + timedelta(minutes=5))
+        self.event(events.PAGE_VIEWED, 2, page, self.yesterday)
+        self.assertEqual(funnel.update_rollups(batch_size=2), 3)
+        self.assertEqual(funnel.update_rollups(), 0)
+        self.assertEqual(
+            RollupWatermark.objects.get(name=funnel.WATERMARK).position, LearningEvent.objects.latest("id").id
+        )
+        self.assertEqual(self.rollups(funnel.PAGE), {(page.id, day): (2, 1, 300)})
+        # One page of three: started the main content, not completed it
+        self.assertEqual(self.rollups(funnel.MAIN_CONTENT), {(self.main_contents[0].id, day): (2, 0, None)})
+
+        # A view flushed late, older than the first one, is still picked up
+        self.event(events.PAGE_VIEWED, 1, page, self.yesterday - timedelta(minutes=1))
+        self.assertEqual(funnel.update_rollups(), 1)
+        self.assertEqual(self.rollups(funnel.PAGE), {(page.id, day): (2, 1, 360)})
+
+        before = self.rollups(funnel.PAGE)
+        call_command("build_funnel_rollups", "--rebuild", stdout=open(os.devnull, "w"))
+        self.assertEqual(self.rollups(funnel.PAGE), before)
+
+    def test_funnel_api(self):
+        self.event(events.PAGE_VIEWED, 1, self.pages[1], self.yesterday)
+        funnel.update_rollups()
+        self.as_user(self.admin)
+        r = self.client.get("/api/admin/funnel/", {"level": "page", "parent": self.main_contents[0].id})
+        self.assertEqual([(unit["title"], unit["started"]) for unit in r.json()["results"]], [("Page 2", 1)])
+
+        for params in ({"level": "x"}, {"from": "2024/01/01"}, {"to": "2024-02-30"}, {"parent": "a"}):
+            self.assertEqual(self.client.get("/api/admin/funnel/", params).status_code, 400, params)
+
+
+# -------------------------
+# COMPLETION CASCADE
+# -------------------------
+
+class CompletionCascadeTests(CourseTestCase):
+    nothing = {"main_content": [], "module": [], "topic": []}
+
+    def complete(self, page):
+        return self.client.post(f"/pages/{page.id}/complete/").json()["newly_completed"]
+
+    def test_last_page_completes_every_level(self):
+        # The last page alone doesn't finish its main content
+        self.assertEqual(self.complete(self.pages[2]), self.nothing)
+        self.assertFalse(MainContentProgress.objects.exists())
+        for page in self.pages[:2]:
+            self.complete(page)
+        self.assertTrue(MainContentProgress.objects.get(main_content=self.main_contents[0]).completed)
+
+        for page in self.pages[3:5]:
+            self.assertEqual(self.complete(page), self.nothing)
+        self.assertEqual(self.complete(self.pages[5]), {
+            "main_content": [self.main_contents[1].id], "module": [self.module.id], "topic": [self.topic.id],
+        })
+        self.assertTrue(Progress.objects.get(user=self.student, module=self.module).completed)
+        self.assertIsNotNone(TopicProgress.objects.get(user=self.student, topic=self.topic).completed_at)
+
+    def test_repeat_completion_is_idempotent(self):
+        for page in self.pages:
+            self.complete(page)
+        done_at = TopicProgress.objects.values_list("completed_at", flat=True).get()
+        rows = [model.objects.count() for model in (PageProgress, MainContentProgress, Progress, TopicProgress)]
+
+        self.assertEqual(self.complete(self.pages[5]), self.nothing)
+        self.assertEqual(complete_page(self.student, self.pages[5]), (False, self.nothing))
+        self.assertEqual(TopicProgress.objects.values_list("completed_at", flat=True).get(), done_at)
+        self.assertEqual(
+            [model.objects.count() for model in (PageProgress, MainContentProgress, Progress, TopicProgress)], rows
+        )
+
+
+# -------------------------
+# PROGRESS TIMESTAMPS
+# -------------------------
+
+class ProgressTimestampTests(CourseTestCase):
+    def test_update_or_create_stamps_completion_once(self):
+        mc = self.main_contents[0]
+        row, _ = MainContentProgress.objects.update_or_create(
+            user=self.student, main_content=mc, defaults={"completed": False}
+        )
+        self.assertIsNotNone(row.first_seen_at)
+        self.assertIsNone(row.completed_at)
+
+        MainContentProgress.objects.update_or_create(user=self.student, main_content=mc, defaults={"completed": True})
+        done_at = MainContentProgress.objects.get(pk=row.pk).completed_at
+        self.assertIsNotNone(done_at)
+        MainContentProgress.objects.update_or_create(user=self.student, main_content=mc, defaults={"completed": True})
+        self.assertEqual(MainContentProgress.objects.get(pk=row.pk).completed_at, done_at)
+
+    def test_backfill_from_learning_events(self):
+        viewed = timezone.now() - timedelta(days=3)
+        completed = viewed + timedelta(hours=1)
+        first, second = self.pages[:2]
+        # Written before the columns existed: bulk_create skips save()
+        PageProgress.objects.bulk_create([
+            PageProgress(user=self.student, page=page, completed=True) for page in (first, second)
+        ])
+        MainContentProgress.objects.bulk_create([
+            MainContentProgress(user=self.student, main_content=self.main_contents[0], completed=True)
+        ])
+        Progress.objects.bulk_create([Progress(user=self.student, module=self.module, completed=True)])
+        for kind, at in ((events.PAGE_VIEWED, viewed), (events.PAGE_COMPLETED, completed)):
+            LearningEvent.objects.create(kind=kind, user_id=self.student.id, object_id=first.id, created_at=at)
+
+        report = progress.backfill_timestamps(batch_size=1)
+        self.assertEqual(report["PageProgress.completed_at"], 1)
+        row = PageProgress.objects.get(page=first)
+        self.assertEqual((row.first_seen_at, row.completed_at), (viewed, completed))
+        self.assertEqual(Progress.objects.values_list("first_seen_at", "completed_at").get(), (viewed, completed))
+        # No history for the second page until --fallback-now
+        self.assertIsNone(PageProgress.objects.get(page=second).completed_at)
+
+        call_command("backfill_progress_timestamps", "--fallback-now", stdout=open(os.devnull, "w"))
+        row = PageProgress.objects.get(page=second)
+        self.assertIsNotNone(row.first_seen_at)
+        self.assertIsNotNone(row.completed_at)
+
+
+# -------------------------
+# ASYNC VIEWS
+# -------------------------
+
+class AsyncViewTests(CourseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.auth = {"Authorization": f"Bearer {RefreshToken.for_user(self.student).access_token}"}
+
+    def get(self, url):
+        return self.async_client.get(url, headers=self.auth)
+
+    async def test_topics_on_the_event_loop(self):
+        r = await self.get("/topics/")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual([topic["name"] for topic in r.json()], ["Python"])
+        self.assertEqual((await self.async_client.get("/topics/")).status_code, 401)
+
+    async def test_errors_go_through_drf(self):
+        self.assertEqual((await self.get("/pages/999/")).status_code, 404)
+        r = await self.get(f"/pages/{self.pages[1].id}/")
+        self.assertEqual((r.status_code, r.json()["detail"]), (403, "Please complete previous pages first"))
+        r = await self.async_client.post(f"/pages/{self.pages[0].id}/", headers=self.auth)
+        self.assertEqual(r.status_code, 405)
+
+
+# -------------------------
+# JSON RENDERER / PARSER (orjson)
+# -------------------------
+
+class FastJSONTests(SimpleTestCase):
+    data = {
+        "price": decimal.Decimal("12.50"), "at": timezone.now(), "day": date(2020, 1, 2),
+        "lazy": gettext_lazy("hello"), 1: "int key", "text": "a\u2028b", "none": None,
+    }
+
+    def test_same_output_as_drf(self):
+        self.assertEqual(renderers.FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        self.assertEqual(renderers.FastJSONRenderer().render(None), b"")
+        with mock.patch.object(renderers, "orjson", None):
+            self.assertEqual(renderers.FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_parser(self):
+        parser = renderers.FastJSONParser()
+        self.assertEqual(parser.parse(io.BytesIO(b'{"a": [1, 2]}')), {"a": [1, 2]})
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"a": '))
+
+
+# -------------------------
+# CONTENT FRAGMENT CACHE
+# -------------------------
+
+class FragmentCacheTests(CourseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = CustomUser.objects.create(email="other@x.com", role="student", is_active=True)
+        self.other.topics.add(self.topic)
+        self.page = self.pages[0]
+        PageProgress.objects.create(user=self.student, page=self.page, completed=True)
+
+    def get(self, user, url):
+        self.as_user(user)
+        return self.client.get(url).json()
+
+    def test_shared_fragments_keep_personal_fields(self):
+        url = f"/modules/{self.module.id}/"
+        mine = self.get(self.student, url)
+        theirs = self.get(self.other, url)  # served from the fragments cached above
+        self.assertTrue(mine["main_contents"][0]["pages"][0]["completed"])
+        self.assertFalse(theirs["main_contents"][0]["pages"][0]["completed"])
+        self.assertEqual(self.get(self.student, url), mine)
+
+    def test_content_write_invalidates(self):
+        url = f"/modules/{self.module.id}/"
+        self.get(self.student, url)
+        self.page.title, self.page.time_duration = "Renamed", 20
+        self.page.save()
+        data = self.get(self.student, url)
+        self.assertEqual(data["main_contents"][0]["pages"][0]["title"], "Renamed")
+        self.assertEqual(data["main_contents"][0]["formatted_duration"], "30 min")
+
+    def test_write_from_another_worker(self):
+        self.get(self.student, f"/pages/{self.page.id}/")
+        # Another process: its signals never reached this cache, only the version row
+        Page.objects.filter(pk=self.page.pk).update(title="Elsewhere")
+        ContentVersion.objects.update(value=F("value") + 1)
+        self.assertEqual(self.get(self.student, f"/pages/{self.page.id}/")["title"], "Elsewhere")
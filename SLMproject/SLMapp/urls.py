@@ -32,6 +32,7 @@ urlpatterns = [
     
     path("progress/summary/", UserProgressSummary.as_view(), name="user-progress-summary"),
 path("api/dashboard-stats/", AdminDashboardStatsView.as_view()),
+path("api/admin/funnel/", FunnelView.as_view(), name="admin-funnel"),
 
 path("upload-certificate/<int:user_id>/", UploadUserCertificateView.as_view()),
 path(
@@ -40,4 +41,5 @@ path(
     name="certificate-status-all"
 ),
 path("certificate/eligibility/", CertificateEligibilityView.as_view()),
+path("api/search/", SearchView.as_view(), name="search"),
 ]+ router.urls
\ No newline at end of file
@@ -3,7 +3,7 @@ from rest_framework import generics, permissions, status
 from .serializers import TopicSerializer, QuizSerializer,PageSerializer
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.shortcuts import get_object_or_404
+from django.shortcuts import aget_object_or_404, get_object_or_404
 from .models import Topic, Module, Page, Progress, Quiz, QuizResult
 from .serializers import *
 from rest_framework.decorators import action
@@ -15,9 +15,30 @@ from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import IsAuthenticated
 from .models import Topic, Progress
 from django.http import HttpResponse
+from django.db.models import Exists, OuterRef, Prefetch
+from asgiref.sync import sync_to_async
+from .async_views import AsyncAPIView
+from .permissions import IsEnrolled
+from accounts.enrollment import enrolled_topic_ids, is_enrolled, sees_all_content
+from . import completion, events, progress, stats
+from .progress_bits import completion_for, repair_slots
+from .fieldsets import parse_field_list
+from .middleware import never_compress
+
+
+class SignedPageResponseMixin:
+    """ Page bodies may carry a signed video URL, keep those uncompressed """
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if isinstance(getattr(response, "data", None), dict) and response.data.get("video_url"):
+            never_compress(response)
+        return response
+
+
 class TopicViewSet(viewsets.ModelViewSet):
     queryset = Topic.objects.all()
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [IsEnrolled]
     
 
     def get_serializer_class(self):
@@ -35,24 +56,37 @@ class TopicViewSet(viewsets.ModelViewSet):
         user = self.request.user
         # If the user is an admin, return all topics
         if user.is_superuser:
-            return Topic.objects.all().order_by("order")
+            queryset = Topic.objects.all().order_by("order")
         # Otherwise, return only the user's topics
-        return user.topics.all().order_by("order")
+        else:
+            queryset = Topic.objects.filter(
+                id__in=enrolled_topic_ids(user)
+            ).order_by("order")
+
+        if self.request.method in permissions.SAFE_METHODS:
+            queryset = queryset.prefetch_related(Prefetch(
+                "modules", queryset=progress.with_module_progress(Module.objects.all(), user)
+            ))
+        return queryset
 
 
 class ModuleViewSet(viewsets.ModelViewSet):
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [IsEnrolled]
 
     def get_queryset(self):
         user = self.request.user
 
         if user.is_superuser:
-            return Module.objects.all().order_by("order")
-
-        user_topic_ids = user.topics.values_list('id', flat=True)
-        return Module.objects.filter(
-            topic_id__in=user_topic_ids
-        ).order_by("order")
+            queryset = Module.objects.all().order_by("order")
+        else:
+            queryset = Module.objects.filter(
+                topic_id__in=enrolled_topic_ids(user)
+            ).order_by("order")
+
+        # Page totals, duration and the user's completed pages in the same query
+        if self.request.method in permissions.SAFE_METHODS:
+            queryset = progress.with_module_progress(queryset, user)
+        return queryset
 
     def get_serializer_class(self):
         # 🔥 Admin listing
@@ -68,10 +102,14 @@ class ModuleViewSet(viewsets.ModelViewSet):
 
 
 class MainContentViewSet(viewsets.ModelViewSet):
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [IsEnrolled]
 
     def get_queryset(self):
-        return MainContent.objects.select_related("module").order_by("order")
+        queryset = MainContent.objects.select_related("module").order_by("order")
+        user = self.request.user
+        if not sees_all_content(user):
+            queryset = queryset.filter(module__topic_id__in=enrolled_topic_ids(user))
+        return queryset
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -80,9 +118,9 @@ class MainContentViewSet(viewsets.ModelViewSet):
 
 
 
-class PageViewSet(viewsets.ModelViewSet):
+class PageViewSet(SignedPageResponseMixin, viewsets.ModelViewSet):
     serializer_class = PageSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [IsEnrolled]
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -95,7 +133,15 @@ class PageViewSet(viewsets.ModelViewSet):
         return context
 
     def get_queryset(self):
-        queryset = Page.objects.all().order_by("order")
+        queryset = Page.objects.select_related(
+            "main_content__module"
+        ).order_by("order")
+
+        user = self.request.user
+        if not sees_all_content(user):
+            queryset = queryset.filter(
+                main_content__module__topic_id__in=enrolled_topic_ids(user)
+            )
 
         module_id = self.request.query_params.get("module")
         main_content_id = self.request.query_params.get("main_content")
@@ -106,6 +152,10 @@ class PageViewSet(viewsets.ModelViewSet):
         if main_content_id:
             queryset = queryset.filter(main_content_id=main_content_id)
 
+        if self.action == "list":
+            # Sidebar rows never show the lesson body
+            queryset = queryset.defer("content")
+
         return queryset
 
 from django.db import transaction
@@ -114,11 +164,11 @@ from rest_framework.response import Response
 from rest_framework import status
 
 
-class AdminPageViewSet(viewsets.ModelViewSet):
+class AdminPageViewSet(SignedPageResponseMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAdminUser]
 
     def get_queryset(self):
-        return (
+        queryset = (
             Page.objects
             .select_related(
                 "main_content",
@@ -127,6 +177,9 @@ class AdminPageViewSet(viewsets.ModelViewSet):
             )
             .order_by("order")
         )
+        if self.action == "list":
+            queryset = queryset.defer("content")  # body only on detail
+        return queryset
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -156,68 +209,89 @@ class AdminPageViewSet(viewsets.ModelViewSet):
 # Detail Views
 # ----------------------------
 
-class TopicListView(generics.ListAPIView):
+class TopicListView(AsyncAPIView):
     serializer_class = TopicListSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_queryset(self):
-        user = self.request.user
+    def get_queryset(self, topic_ids, user):
+        # 🚀 modules come with their page totals and the user's completed pages
+        modules = progress.with_module_progress(Module.objects.all(), user)
         return (
             Topic.objects
-            .filter(users=user)
-            .prefetch_related("modules")  # 🚀 performance boost
+            .filter(id__in=topic_ids)
+            .prefetch_related(Prefetch("modules", queryset=modules))
             .order_by("order")
         )
 
+    async def get(self, request):
+        topic_ids = await sync_to_async(enrolled_topic_ids)(request.user)
+        topics = [topic async for topic in self.get_queryset(topic_ids, request.user)]
+        serializer = self.serializer_class(
+            topics, many=True, context={"request": request}
+        )
+        return Response(await self.serialize(serializer))
+
 
 class ModuleDetailView(generics.RetrieveAPIView):
     serializer_class = ModuleSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [IsEnrolled]
 
     def get_queryset(self):
-        # Filter modules based on the user's topics
-        user = self.request.user
-        return Module.objects.filter(topic__in=user.topics.all())
-
-    def get_object(self):
-        # Additional check to ensure the module is accessible
-        obj = super().get_object()
-        if obj.topic not in self.request.user.topics.all():
-            raise PermissionDenied("You do not have access to this module.")
-        return obj
+        return progress.with_module_progress(Module.objects.all(), self.request.user)
 
 
 class MainContentDetailView(generics.RetrieveAPIView):
-    queryset = MainContent.objects.all()
+    queryset = MainContent.objects.select_related("module")
     serializer_class = MainContentSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [IsEnrolled]
 
 
-class PageDetailView(APIView):
-    permission_classes = [permissions.IsAuthenticated]
+class PageDetailView(AsyncAPIView):
+    permission_classes = [IsEnrolled]
 
-    def get(self, request, page_id):
-        page = get_object_or_404(Page, id=page_id)
+    async def get(self, request, page_id):
+        page = await aget_object_or_404(
+            Page.objects.select_related("main_content__module", "mux_account"),
+            id=page_id
+        )
+        await sync_to_async(self.check_object_permissions)(request, page)
 
-        # 🔒 Check previous pages
-        prev_pages = Page.objects.filter(
-            main_content=page.main_content,
+        # 🔒 Check previous pages: their slots against the user's progress bits
+        context = {'request': request}
+        completion = completion_for(context)
+        previous_slots = Page.objects.filter(
+            main_content_id=page.main_content_id,
             order__lt=page.order
-        )
+        ).values_list("progress_slot", flat=True)
+        previous = [(page.main_content_id, slot) async for slot in previous_slots]
+        if page.progress_slot is None or any(slot is None for _, slot in previous):
+            # bulk_create'd pages have no slot and would lock everything after them
+            await sync_to_async(repair_slots)([page.main_content_id])
+            await page.arefresh_from_db(fields=["progress_slot"])
+            previous = [(page.main_content_id, slot) async for slot in previous_slots.all()]
+        completed = await sync_to_async(completion.count_completed)(previous)
+        has_incomplete_prev = completed < len(previous)
+
+        if has_incomplete_prev:
+            return Response(
+                {"detail": "Please complete previous pages first"},
+                status=403
+            )
 
-        for prev in prev_pages:
-            if not PageProgress.objects.filter(
-                user=request.user,
-                page=prev,
-                completed=True
-            ).exists():
-                return Response(
-                    {"detail": "Please complete previous pages first"},
-                    status=403
-                )
+        serializer = PageSerializer(page, context=context)
+        data = await self.serialize(serializer)
 
-        serializer = PageSerializer(page, context={'request': request})
-        return Response(serializer.data)
+        def record_view():
+            # Off the event loop: without buffering (tests) the sink writes the DB
+            topic_id = page.main_content.module.topic_id
+            events.record(events.PAGE_VIEWED, request.user.id, page.id, topic_id)
+            if data.get("video_url"):
+                # Only here: the /api/pages/ editors sign URLs too, nobody watches those
+                events.record(events.VIDEO_URL_ISSUED, request.user.id, page.id, topic_id, video_id=page.video_id)
+
+        await sync_to_async(record_view)()
+        response = Response(data)
+        return never_compress(response) if data.get("video_url") else response
 
 
 class PublicTopicListView(generics.ListAPIView):
@@ -230,66 +304,67 @@ class PublicTopicListView(generics.ListAPIView):
 # ----------------------------
 
 class CompletePageView(APIView):
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [IsEnrolled]
 
     def post(self, request, page_id):
-        page = get_object_or_404(Page, id=page_id)
-        PageProgress.objects.update_or_create(
-            user=request.user,
-            page=page,
-            defaults={"completed": True}
-        )
-
-        # If last page → mark maincontent complete
-        last_page = page.main_content.pages.order_by("-order").first()
-        if last_page and page.id == last_page.id:
-            MainContentProgress.objects.update_or_create(
-                user=request.user,
-                main_content=page.main_content,
-                defaults={"completed": True}
-            )
+        # ✅ Completed before (cached): answered without touching the database
+        done = completion.cached_done(completion.PAGE, request.user.pk, page_id)
+        if done and not is_enrolled(request.user, done[1]):
+            self.permission_denied(request, message=IsEnrolled.message)
+        if done:
+            order, topic_id = done
+            created, newly_completed = False, completion.nothing_completed()
+        else:
+            page = get_object_or_404(Page.objects.select_related("main_content__module"), id=page_id)
+            self.check_object_permissions(request, page)
+            # Page row + main content / module / topic rollups in one transaction
+            created, newly_completed = completion.complete_page(request.user, page)
+            order, topic_id = page.order, page.main_content.module.topic_id
+
+        events.record(events.PAGE_COMPLETED, request.user.id, page_id, topic_id, first=created)
 
-        return Response({"message": f"Page {page.order} marked as completed"})
+        return Response({
+            "message": f"Page {order} marked as completed",
+            "newly_completed": newly_completed,
+        })
 
 
 class CompleteMainContentView(APIView):
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [IsEnrolled]
 
     def post(self, request, maincontent_id):
-        maincontent = get_object_or_404(MainContent, id=maincontent_id)
-        MainContentProgress.objects.update_or_create(
-            user=request.user,
-            main_content=maincontent,
-            defaults={"completed": True}
-        )
+        maincontent = get_object_or_404(MainContent.objects.select_related("module"), id=maincontent_id)
+        self.check_object_permissions(request, maincontent)
+        # Recomputed from the user's pages; the request alone doesn't complete it
+        completed, newly_completed = completion.complete_main_content(request.user, maincontent)
 
-        # If all maincontents in module are done → mark module complete
-        module = maincontent.module
-        all_done = all(
-            MainContentProgress.objects.filter(user=request.user, main_content=mc, completed=True).exists()
-            for mc in module.main_contents.all()
-        )
-        if all_done:
-            Progress.objects.update_or_create(
-                user=request.user,
-                module=module,
-                defaults={"completed": True}
-            )
-
-        return Response({"message": f"MainContent '{maincontent.title}' marked as completed"})
+        return Response({
+            "message": (
+                f"MainContent '{maincontent.title}' marked as completed" if completed
+                else f"MainContent '{maincontent.title}' has pages left"
+            ),
+            "completed": completed,
+            "newly_completed": newly_completed,
+        })
 
 
 class CompleteModuleView(APIView):
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [IsEnrolled]
 
     def post(self, request, module_id):
         module = get_object_or_404(Module, id=module_id)
-        Progress.objects.update_or_create(
-            user=request.user,
-            module=module,
-            defaults={"completed": True}
-        )
-        return Response({"message": f"Module '{module.title}' marked as completed"})
+        self.check_object_permissions(request, module)
+        # ✅ Only completes when every main content in it is done
+        completed, newly_completed = completion.complete_module(request.user, module)
+
+        return Response({
+            "message": (
+                f"Module '{module.title}' marked as completed" if completed
+                else f"Module '{module.title}' has main contents left"
+            ),
+            "completed": completed,
+            "newly_completed": newly_completed,
+        })
 
 
 class QuizView(APIView):
@@ -319,12 +394,14 @@ class SubmitQuizView(APIView):
             score=score,
             passed=passed
         )
+        events.record(events.QUIZ_SUBMITTED, request.user.id, quiz.id, topic_id, score=score, passed=passed)
         return Response({"score": score, "passed": passed})
 
 
 class QuizViewSet(viewsets.ModelViewSet):
-    queryset = Quiz.objects.all()
+    queryset = Quiz.objects.select_related("main_content__module")
     serializer_class = QuizSerializer
+    permission_classes = [IsEnrolled]
 
     # ✅ Add Question
     @action(detail=True, methods=["post"])
@@ -417,6 +494,11 @@ class QuizViewSet(viewsets.ModelViewSet):
             score=score,
             passed=passed,
         )
+        events.record(
+            events.QUIZ_SUBMITTED, request.user.id, quiz.id,
+            quiz.main_content.module.topic_id if quiz.main_content else None,
+            score=score, total=total_questions, passed=passed,
+        )
 
         return Response({
             "score": score,
@@ -434,7 +516,7 @@ class UserProgressSummary(APIView):
     def get(self, request):
         user = request.user
         # Filter modules based on user's topics
-        modules = Module.objects.filter(topic__in=user.topics.all())
+        modules = Module.objects.filter(topic_id__in=enrolled_topic_ids(user))
         total_modules = modules.count()
 
         completed_modules = 0
@@ -461,6 +543,8 @@ class UserProgressSummary(APIView):
             "completed_modules": completed_modules,
             "in_progress_modules": in_progress_modules,
             "not_started_modules": not_started_modules,
+            "pages_completed_this_week": progress.pages_completed_since(user, progress.week_start()),
+            "streak_days": progress.streak_days(user),
         })
 
 
@@ -473,29 +557,48 @@ from accounts.serializers import UserSerializer
 from .serializers import TopicSerializer
 
 class AdminDashboardStatsView(APIView):
+    """
+    Totals come from the StatCounter table (one query, see SLMapp.stats),
+    ?include=series adds daily snapshots for the last ?days (default 30).
+    """
     permission_classes = [IsAdminUser]
 
     def get(self, request):
-        total_users = CustomUser.objects.count()
-        total_topics = Topic.objects.count()
-        total_modules = Module.objects.count()
-        total_maincontents = MainContent.objects.count()
-        total_pages = Page.objects.count()
+        current = stats.current_stats()
 
-        recent_users = CustomUser.objects.order_by('-id')[:5]
+        recent_users = (
+            CustomUser.objects.select_related("student_profile", "professional_profile")
+            .prefetch_related("topics")
+            .order_by('-id')[:5]
+        )
 
-        return Response({
-            "totalUsers": total_users,
-            "totalTopics": total_topics,
-            "totalModules": total_modules,
-            "totalMainContents": total_maincontents,
-            "totalPages": total_pages,
-            "recentUsers": UserSerializer(
+        data = {
+            "totalUsers": current[stats.USERS],
+            "totalTopics": current[stats.TOPICS],
+            "totalModules": current[stats.MODULES],
+            "totalMainContents": current[stats.MAIN_CONTENTS],
+            "totalPages": current[stats.PAGES],
+            "totalPageCompletions": current[stats.PAGE_COMPLETIONS],
+            "activeLearners7d": current[stats.ACTIVE_7D],
+            "activeLearners30d": current[stats.ACTIVE_30D],
+            "quizAttempts": current[stats.QUIZ_ATTEMPTS],
+            "quizPassRate": stats.quiz_pass_rate(current),
+            "reconciledAt": current["reconciled_at"],
+            "recentUsers": UserListSerializer(
                 recent_users,
                 many=True,
                 context={'request': request}  # ✅ good practice
             ).data,
-        })
+        }
+
+        if "series" in parse_field_list(request.query_params.get("include")):
+            try:
+                days = int(request.query_params.get("days", 30))
+            except ValueError:
+                days = 30
+            data["series"] = stats.series(days)
+
+        return Response(data)
 
 from accounts.models import CustomUser, UserCertificate
 from rest_framework.permissions import IsAdminUser
@@ -595,4 +698,82 @@ from .serializers import MuxAccountSerializer
 
 class MuxAccountViewSet(viewsets.ModelViewSet):
     queryset = MuxAccount.objects.all()
-    serializer_class = MuxAccountSerializer
\ No newline at end of file
+    serializer_class = MuxAccountSerializer
+
+
+from .search import DEFAULT_LIMIT, KIND_BY_MODEL, MAX_LIMIT, search
+
+
+class SearchView(APIView):
+    """
+    GET api/search/?q=sql join&kind=page,module&limit=20
+
+    Ranked hits with a highlighted snippet (<mark>…</mark>, rest escaped).
+    Students only see hits inside their enrolled topics.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        query = request.query_params.get("q", "").strip()
+        kinds = parse_field_list(request.query_params.get("kind")) & set(KIND_BY_MODEL.values())
+
+        try:
+            limit = int(request.query_params.get("limit", DEFAULT_LIMIT))
+        except ValueError:
+            limit = DEFAULT_LIMIT
+        limit = max(1, min(limit, MAX_LIMIT))
+
+        user = request.user
+        topic_ids = None if sees_all_content(user) else enrolled_topic_ids(user)
+
+        return Response({
+            "query": query,
+            "results": search(query, topic_ids=topic_ids, kinds=sorted(kinds), limit=limit),
+        })
+
+
+
+from django.utils.dateparse import parse_date
+from . import funnel
+
+
+class FunnelView(APIView):
+    """
+    GET api/admin/funnel/?level=module&parent=<topic id>&from=YYYY-MM-DD&to=YYYY-MM-DD
+    Reads the precomputed daily rollups (build_funnel_rollups), default
+    window is the last 30 days.
+    """
+    permission_classes = [IsAdminUser]
+
+    @staticmethod
+    def _date_param(request, name):
+        value = request.query_params.get(name)
+        if not value:
+            return None
+        # parse_date returns None for a malformed date instead of raising
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        return day
+
+    def get(self, request):
+        level = request.query_params.get("level", funnel.TOPIC)
+        if level not in funnel.LEVELS:
+            return Response(
+                {"error": f"level must be one of {', '.join(funnel.LEVELS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        parent = request.query_params.get("parent")
+        try:
+            parent = int(parent) if parent else None
+            start = self._date_param(request, "from")
+            end = self._date_param(request, "to")
+        except ValueError:
+            return Response({"error": "invalid parent or date"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "level": level,
+            "parent": parent,
+            "results": funnel.funnel(level, parent, start, end),
+        })
@@ -11,7 +11,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import importlib.util
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -43,14 +45,12 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt.token_blacklist',
      "corsheaders",
 ]
-REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    ),
-}
 AUTH_USER_MODEL = "accounts.CustomUser"
 
 MIDDLEWARE = [
+    # gzip / brotli, first so everything below works on the plain body
+    "SLMapp.middleware.CompressionMiddleware",
+    "django.middleware.http.ConditionalGetMiddleware",  # ETag + 304
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -81,6 +81,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "SLMproject.wsgi.application"
 
+# ASGI profile (see deploy/gunicorn_asgi.py): async views and the support
+# chat SSE stream only stop holding a worker per request under ASGI.
+ASGI_APPLICATION = "SLMproject.asgi.application"
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -96,6 +100,39 @@ DATABASES = {
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
+# Password hashing profile (accounts.hashers). The first hasher hashes new
+# passwords; the others only verify existing hashes, which are upgraded on
+# the user's next login. Pick with PASSWORD_HASHING_PROFILE=argon2|bcrypt|pbkdf2;
+# argon2 and bcrypt need the argon2-cffi / bcrypt packages.
+PASSWORD_HASHING_PROFILES = {
+    # OWASP minimums: fast enough for login spikes on one core, memory-hard
+    "argon2": {"time_cost": 2, "memory_cost": 19456, "parallelism": 1},
+    "bcrypt": {"rounds": 10},
+    "pbkdf2": {"iterations": 600_000},
+}
+_PASSWORD_HASHERS = {
+    "argon2": "accounts.hashers.TunedArgon2PasswordHasher",
+    "bcrypt": "accounts.hashers.TunedBCryptSHA256PasswordHasher",
+    "pbkdf2": "accounts.hashers.TunedPBKDF2PasswordHasher",
+}
+_HASHER_LIBRARIES = {"argon2": "argon2", "bcrypt": "bcrypt", "pbkdf2": None}
+
+PASSWORD_HASHING = os.environ.get("PASSWORD_HASHING_PROFILE")
+if PASSWORD_HASHING not in PASSWORD_HASHING_PROFILES:
+    PASSWORD_HASHING = next(
+        name
+        for name, library in _HASHER_LIBRARIES.items()
+        if library is None or importlib.util.find_spec(library)
+    )
+PASSWORD_HASHING_PROFILE = PASSWORD_HASHING_PROFILES[PASSWORD_HASHING]
+
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHING]] + [
+    hasher
+    for name, hasher in _PASSWORD_HASHERS.items()
+    if name != PASSWORD_HASHING
+    and (_HASHER_LIBRARIES[name] is None or importlib.util.find_spec(_HASHER_LIBRARIES[name]))
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -125,7 +162,22 @@ USE_TZ = True
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        # Builds request.user from token claims, no per-request user query
+        "accounts.authentication.StatelessJWTAuthentication",
+    ),
+    "DEFAULT_THROTTLE_RATES": {
+        "login": "10/min",      # per email + IP
+        "login_ip": "60/min",   # failed logins per IP
+    },
+    # orjson when installed, plain json otherwise (SLMapp.renderers)
+    "DEFAULT_RENDERER_CLASSES": (
+        "SLMapp.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "SLMapp.renderers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
     ),
 }
 # Static files (CSS, JavaScript, Images)
@@ -160,6 +212,91 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_ALL_ORIGIN = True
+
+# Without REDIS_URL the cache and the support chat channel layer are
+# per-process; set it when running more than one worker or node.
+REDIS_URL = os.environ.get("REDIS_URL")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+
+# How long a process may keep trusting a cached token version / user row.
+# With the per-process locmem cache this bounds how late a deactivation is
+# noticed by other workers; a shared cache (REDIS_URL) sees it immediately.
+AUTH_TOKEN_VERSION_CACHE_SECONDS = 30
+AUTH_USER_CACHE_SECONDS = 60
+
+# Per-user enrolled topic ids (accounts.enrollment), invalidated on change.
+# The long TTL only applies with a shared cache (REDIS_URL); with locmem an
+# invalidation reaches one worker, so the others must re-read quickly.
+ENROLLMENT_CACHE_SECONDS = 60 * 60
+ENROLLMENT_LOCAL_CACHE_SECONDS = 5
+
+# Topics every new account (signup or bulk import) is enrolled in
+DEFAULT_ENROLLMENT_TOPIC_IDS = [10]
+
+# User-independent part of content serializers (SLMapp.fragments), keyed by
+# the ContentVersion row bumped on every content write
+CONTENT_FRAGMENT_CACHE_SECONDS = 6 * 60 * 60
+
+# Sanitized/highlighted lesson HTML (SLMapp.rendering), warm it with
+# manage.py warm_page_render_cache
+PAGE_RENDER_CACHE_SECONDS = 7 * 24 * 60 * 60
+
+# Never gzip/brotli the auth endpoints (SLMapp.middleware): login returns
+# the JWTs, compressing them would expose them to BREACH
+COMPRESSION_EXCLUDED_PATHS = ("/accounts/login/", "/accounts/logout/")
+
+# Read page completion from the per-main-content bitsets (SLMapp.progress_bits)
+# instead of PageProgress rows; both are always written
+PROGRESS_BITSET_READS = True
+
+# Full-text search (SLMapp.search, SQLite): queries matching more documents
+# than this only rank title hits, ranking is ~2 us per match. Keeps broad
+# queries at 25-40 ms on 100k documents; ones matching most titles ("the")
+# still take 60-80 ms.
+SEARCH_BROAD_QUERY_MATCHES = 5000
+
+# Learning event log (SLMapp.events): buffered in process, flushed in batches.
+# "SLMapp.events.JsonLinesSink" with OPTIONS {"directory": ...} writes hourly
+# JSONL files instead; "BACKEND": None turns capture off.
+# Not buffered under manage.py test, the exit flush would miss the test DB.
+LEARNING_EVENTS = {
+    "BACKEND": "SLMapp.events.DatabaseSink",
+    "BUFFER_SIZE": 500,
+    "FLUSH_SECONDS": 5,
+    "BUFFERED": sys.argv[1:2] != ["test"],
+}
+
+# "Last page" positions (accounts.last_page): kept in the cache and flushed
+# to UserLastPage in batches; None writes every save through instead.
+# Only buffered with a shared cache (REDIS_URL), see SHARED_CACHE_ONLY.
+LAST_PAGE_WRITE_BEHIND = {
+    "BUFFER_SIZE": 1000,
+    "FLUSH_SECONDS": 5,
+}
+
+# Support chat push channel (accounts.realtime). The in-memory layer only
+# reaches clients connected to the same ASGI process.
+SUPPORT_CHANNEL_LAYER = {
+    "BACKEND": "accounts.realtime.InMemoryChannelLayer",
+}
+if REDIS_URL:
+    SUPPORT_CHANNEL_LAYER = {
+        "BACKEND": "accounts.realtime.RedisChannelLayer",
+        "OPTIONS": {"url": REDIS_URL},
+    }
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
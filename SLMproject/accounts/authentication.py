@@ -0,0 +1,127 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import CustomUser
+from .tokens import TOKEN_VERSION_CLAIM
+
+# Fields rebuilt from token claims, everything else is deferred and only
+# loaded from the database if a view actually reads it.
+CLAIM_FIELDS = ("email", "role", "is_superuser", "is_staff", "is_active")
+
+
+def _version_key(user_id):
+    return f"auth:ver:{user_id}"
+
+
+def _user_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def current_token_version(user_id):
+    """
+    (token_version, is_active) for a user, or None if it no longer exists.
+    Cached for AUTH_TOKEN_VERSION_CACHE_SECONDS, revoke_user_tokens() clears it.
+    """
+    key = _version_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        state = (
+            CustomUser.objects.filter(pk=user_id)
+            .values_list("token_version", "is_active")
+            .first()
+        )
+        if state is None:
+            return None
+        cache.set(key, state, settings.AUTH_TOKEN_VERSION_CACHE_SECONDS)
+    return state
+
+
+def get_cached_user(user_id):
+    """ Full user load, cached briefly (used for tokens without claims) """
+    key = _user_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = CustomUser.objects.filter(pk=user_id).first()
+        if user is None:
+            return None
+        cache.set(key, user, settings.AUTH_USER_CACHE_SECONDS)
+    return user
+
+
+def revoke_user_tokens(user):
+    """
+    Invalidate every token issued to the user so far. Saving a change to
+    any CLAIM_FIELDS calls it (accounts.signals); code changing them with
+    queryset.update() has to call it itself.
+    """
+    CustomUser.objects.filter(pk=user.pk).update(token_version=F("token_version") + 1)
+    # A later full save() of this instance must not write the old version back
+    user.token_version = (
+        CustomUser.objects.filter(pk=user.pk).values_list("token_version", flat=True).first()
+    )
+    forget_user(user.pk)
+
+
+def forget_user(user_id):
+    cache.delete_many([_version_key(user_id), _user_key(user_id)])
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that trusts the claims of tokens issued by
+    UserClaimsRefreshToken instead of loading CustomUser on every request.
+
+    Tokens carry a version claim; bumping CustomUser.token_version
+    (revoke_user_tokens) rejects all older tokens. Tokens issued before the
+    claims existed fall back to a briefly cached full user load.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification")
+            ) from e
+
+        if TOKEN_VERSION_CLAIM not in validated_token:
+            return self._get_legacy_user(user_id)
+
+        state = current_token_version(user_id)
+        if state is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        version, is_active = state
+        if not is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if validated_token[TOKEN_VERSION_CLAIM] != version:
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+
+        return self._user_from_claims(user_id, validated_token)
+
+    def _get_legacy_user(self, user_id):
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+    def _user_from_claims(self, user_id, token):
+        values = {"id": int(user_id)}
+        for field in CLAIM_FIELDS:
+            values[field] = token[field]
+
+        # Same shape as a .only(*CLAIM_FIELDS) queryset row: a real CustomUser
+        # usable in ORM filters and FK assignments, other fields deferred.
+        field_names = [
+            f.attname for f in CustomUser._meta.concrete_fields if f.attname in values
+        ]
+        return CustomUser.from_db(
+            "default", field_names, [values[name] for name in field_names]
+        )
@@ -0,0 +1,16 @@
+"""
+Which cache backends every worker shares.
+
+Without REDIS_URL the default cache is LocMemCache: one per process, so a
+delete or version bump in one worker is invisible to the others. Features
+whose correctness depends on cross-worker invalidation check this first.
+"""
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+
+def cache_is_shared(alias="default"):
+    return not isinstance(caches[alias], PROCESS_LOCAL_BACKENDS)
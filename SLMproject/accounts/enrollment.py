@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .caches import cache_is_shared
+from .models import CustomUser
+
+Enrollment = CustomUser.topics.through
+
+DEFAULT_TOPICS_KEY = "enroll:defaults"
+
+
+def _key(user_id):
+    return f"enroll:{user_id}"
+
+
+def _cache_seconds():
+    # The m2m_changed invalidation only reaches other workers through a shared cache
+    if cache_is_shared():
+        return settings.ENROLLMENT_CACHE_SECONDS
+    return settings.ENROLLMENT_LOCAL_CACHE_SECONDS
+
+
+def enrolled_topic_ids(user):
+    """
+    frozenset of Topic ids the user is enrolled in.
+
+    Memoized on the user object for the request and cached across requests;
+    the m2m_changed receiver in accounts.signals invalidates it.
+    """
+    ids = getattr(user, "_enrolled_topic_ids", None)
+    if ids is not None:
+        return ids
+
+    ids = cache.get(_key(user.pk))
+    if ids is None:
+        ids = frozenset(
+            Enrollment.objects.filter(customuser_id=user.pk).values_list(
+                "topic_id", flat=True
+            )
+        )
+        cache.set(_key(user.pk), ids, _cache_seconds())
+
+    user._enrolled_topic_ids = ids
+    return ids
+
+
+def sees_all_content(user):
+    """ Superusers, staff and admins manage content and aren't limited to their topics """
+    return user.is_superuser or user.is_staff or user.role == "admin"
+
+
+def is_enrolled(user, topic_id):
+    if sees_all_content(user):
+        return True
+    return topic_id is not None and topic_id in enrolled_topic_ids(user)
+
+
+def invalidate_enrollment(user_ids):
+    cache.delete_many([_key(user_id) for user_id in user_ids])
+
+
+def default_enrollment_topic_ids():
+    """
+    Topics every new account is enrolled in: settings.DEFAULT_ENROLLMENT_TOPIC_IDS
+    minus ids that don't exist, cached so signups don't look them up each time.
+    """
+    from SLMapp.models import Topic
+
+    ids = cache.get(DEFAULT_TOPICS_KEY)
+    if ids is None:
+        ids = tuple(
+            Topic.objects.filter(
+                id__in=settings.DEFAULT_ENROLLMENT_TOPIC_IDS
+            ).values_list("id", flat=True)
+        )
+        cache.set(DEFAULT_TOPICS_KEY, ids, _cache_seconds())
+    return ids
+
+
+def invalidate_default_enrollment():
+    cache.delete(DEFAULT_TOPICS_KEY)
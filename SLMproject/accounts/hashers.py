@@ -0,0 +1,44 @@
+"""
+Password hashers whose cost comes from settings.PASSWORD_HASHING_PROFILE.
+
+They keep the algorithm names of Django's hashers, so existing hashes still
+verify. When the configured cost (or the preferred algorithm) changes,
+Django's must_update() makes check_password() rehash transparently on the
+user's next successful login.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    BCryptSHA256PasswordHasher,
+    PBKDF2PasswordHasher,
+)
+
+
+def _cost(name, default):
+    return settings.PASSWORD_HASHING_PROFILE.get(name, default)
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        return _cost("time_cost", Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return _cost("memory_cost", Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self):
+        return _cost("parallelism", Argon2PasswordHasher.parallelism)
+
+
+class TunedBCryptSHA256PasswordHasher(BCryptSHA256PasswordHasher):
+    @property
+    def rounds(self):
+        return _cost("rounds", BCryptSHA256PasswordHasher.rounds)
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return _cost("iterations", PBKDF2PasswordHasher.iterations)
@@ -0,0 +1,237 @@
+"""
+Write-behind "last page" positions (UserLastPage).
+
+SaveLastPageView fires on every page navigation, so saving a position only
+touches memory and the cache:
+
+- the position and the time of the navigation go into the shared cache
+  and into an in-process buffer keyed by user, so ten navigations before
+  a flush leave one pending row
+- a daemon thread upserts the pending rows every FLUSH_SECONDS, or sooner
+  once BUFFER_SIZE users are waiting. The upsert only replaces a row with
+  a newer navigation (ON CONFLICT DO UPDATE ... WHERE excluded.updated_at
+  > updated_at), so workers flushing out of order can't move a user back
+  to an older page. Whatever is left at exit is flushed by an atexit hook
+- get_last_page_id() reads the shared cache entry (written by whichever
+  worker saw the newest navigation), then the table
+
+Write-behind needs a cache every worker shares (REDIS_URL): with the
+per-process locmem cache a worker can't see another worker's pending
+position, so saves are written through instead unless
+LAST_PAGE_WRITE_BEHIND["SHARED_CACHE_ONLY"] is False (single process).
+
+With a shared cache, saving the same page again within
+LAST_PAGE_REFRESH_SECONDS isn't even buffered; a per-process cache can't
+be trusted for that (another worker may have saved a different page since),
+so there every save goes to the conditional UPDATE, which skips the
+unchanged row. updated_at still moves at least once per window for a user
+who keeps reading, which is all the active learner counts (SLMapp.stats)
+need.
+
+settings.LAST_PAGE_WRITE_BEHIND = None always writes through, with a
+conditional upsert (UPDATE ... WHERE changed or stale, then INSERT ... ON
+CONFLICT DO NOTHING). A hard kill loses at most one flush interval of
+positions, which only costs a "continue where you left off" link.
+"""
+import atexit
+import logging
+import os
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .caches import cache_is_shared
+from .models import CustomUser, UserLastPage
+
+logger = logging.getLogger(__name__)
+
+LAST_PAGE_REFRESH_SECONDS = 15 * 60
+
+
+def _key(user_id):
+    return f"lastpage:{user_id}"
+
+
+# -------------------------
+# BUFFER
+# -------------------------
+
+class LastPageBuffer:
+    def __init__(self, buffer_size=1000, flush_seconds=5, batch_size=500):
+        self.buffer_size = buffer_size
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self._reset()
+        # A forked child must not inherit a held lock or flush the parent's rows again
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._pending = {}  # user id -> (page id, navigated at), newest wins
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+
+    def add(self, user_id, page_id, at):
+        with self._lock:
+            current = self._pending.get(user_id)
+            if current is None or current[1] <= at:
+                self._pending[user_id] = (page_id, at)
+            pending = len(self._pending)
+        if self._pid != os.getpid():
+            self._start()
+        if pending >= self.buffer_size:
+            self._wake.set()
+
+    def pending(self, user_id):
+        """ (page id, navigated at) not flushed yet, or None """
+        with self._lock:
+            return self._pending.get(user_id)
+
+    def flush(self):
+        """ Upsert every pending position, returns how many """
+        with self._flush_lock:
+            with self._lock:
+                pending = dict(self._pending)
+            if not pending:
+                return 0
+            try:
+                write_positions(pending, self.batch_size)
+            except Exception:
+                logger.exception("Dropping %d last page positions, write failed", len(pending))
+            with self._lock:
+                # Keep anything saved again while the batch was being written
+                for user_id, entry in pending.items():
+                    if self._pending.get(user_id) == entry:
+                        del self._pending[user_id]
+            return len(pending)
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name="last-page-positions", daemon=True).start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+            close_old_connections()
+
+
+def write_positions(positions, batch_size=500):
+    """
+    {user id: (page id, navigated at)} -> one upsert per batch that only
+    replaces older rows. Standard ON CONFLICT syntax (SQLite and Postgres);
+    the ORM's bulk_create(update_conflicts=True) can't take the WHERE.
+    """
+    # Users deleted since they navigated would fail the whole batch
+    user_ids = set(CustomUser.objects.filter(id__in=positions).values_list("id", flat=True))
+    rows = [(user_id, page_id, at) for user_id, (page_id, at) in positions.items() if user_id in user_ids]
+
+    meta = UserLastPage._meta
+    quote = connection.ops.quote_name
+    table = quote(meta.db_table)
+    user_col, page_col, at_col = (quote(meta.get_field(f).column) for f in ("user", "page_id", "updated_at"))
+    at_field = meta.get_field("updated_at")
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            params = []
+            for user_id, page_id, at in batch:
+                params += [user_id, page_id, at_field.get_db_prep_value(at, connection)]
+            cursor.execute(
+                f"INSERT INTO {table} ({user_col}, {page_col}, {at_col}) "
+                f"VALUES {', '.join(['(%s, %s, %s)'] * len(batch))} "
+                f"ON CONFLICT ({user_col}) DO UPDATE SET "
+                f"{page_col} = excluded.{page_col}, {at_col} = excluded.{at_col} "
+                f"WHERE excluded.{at_col} > {table}.{at_col}",
+                params,
+            )
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """ The process-wide LastPageBuffer, or None when writing through """
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                config = getattr(settings, "LAST_PAGE_WRITE_BEHIND", {})
+                if config is None or (config.get("SHARED_CACHE_ONLY", True) and not cache_is_shared()):
+                    _buffer = False
+                else:
+                    _buffer = LastPageBuffer(
+                        buffer_size=config.get("BUFFER_SIZE", 1000),
+                        flush_seconds=config.get("FLUSH_SECONDS", 5),
+                    )
+    return _buffer or None
+
+
+def flush():
+    buffer = get_buffer()
+    return buffer.flush() if buffer is not None else 0
+
+
+atexit.register(flush)
+
+
+# -------------------------
+# SAVE / READ
+# -------------------------
+
+def _write_through(user, page_id, now):
+    stale = now - timedelta(seconds=LAST_PAGE_REFRESH_SECONDS)
+    written = UserLastPage.objects.filter(user=user, updated_at__lt=now).filter(
+        ~Q(page_id=page_id) | Q(updated_at__lt=stale)
+    ).update(page_id=page_id, updated_at=now)
+    if not written:
+        # No row yet, or an unchanged recent one (then this is a no-op)
+        UserLastPage.objects.bulk_create(
+            [UserLastPage(user=user, page_id=page_id)], ignore_conflicts=True
+        )
+
+
+def save_last_page(user, page_id):
+    now = timezone.now()
+    buffer = get_buffer()
+    if buffer is None and not cache_is_shared():
+        # A per-process cache entry may be older than another worker's save,
+        # so it can't be trusted to skip; the conditional UPDATE dedupes
+        _write_through(user, page_id, now)
+        return
+
+    cached = cache.get(_key(user.pk))
+    if cached is not None:
+        cached_page_id, saved_at = cached
+        if cached_page_id == page_id and now - saved_at < timedelta(seconds=LAST_PAGE_REFRESH_SECONDS):
+            return
+
+    if buffer is None:
+        _write_through(user, page_id, now)
+    else:
+        buffer.add(user.pk, page_id, now)
+    cache.set(_key(user.pk), (page_id, now), LAST_PAGE_REFRESH_SECONDS)
+
+
+def get_last_page_id(user):
+    """ Newest saved position, or None """
+    buffer = get_buffer()
+    if buffer is not None:
+        # Shared cache: holds the newest navigation whichever worker saw it
+        newest = [entry for entry in (cache.get(_key(user.pk)), buffer.pending(user.pk)) if entry]
+        if newest:
+            return max(newest, key=lambda entry: entry[1])[0]
+    # Writing through: the table is always current
+    return UserLastPage.objects.filter(user=user).values_list("page_id", flat=True).first()
@@ -0,0 +1,231 @@
+"""
+Bulk onboarding of students / professionals from a CSV file.
+
+    python manage.py import_users cohort.csv --topics 10 12 --workers 8
+
+Columns: email, password, role, first_name, last_name, phone and the profile
+columns of the role (current_year, stream, passing_year, interest, city for
+students; company, city, interest, company_email for professionals).
+
+The file is streamed in chunks. For each chunk the passwords are hashed in
+a process pool, then users, profiles and topic enrollments are inserted
+with bulk_create inside one transaction, so a bad chunk never leaves half
+created accounts behind. Emails are compared case-insensitively with the
+existing accounts; when a chunk still collides (someone signed up
+meanwhile) it is retried row by row and only the colliding rows are
+skipped.
+"""
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.contrib.auth.base_user import BaseUserManager
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+
+from accounts.enrollment import Enrollment, default_enrollment_topic_ids
+from accounts.models import CustomUser, ProfessionalProfile, StudentProfile
+from SLMapp import stats
+from SLMapp.models import Topic
+
+ROLES = ("student", "professional")
+
+STUDENT_FIELDS = ("current_year", "stream", "passing_year", "interest", "city")
+PROFESSIONAL_FIELDS = ("company", "city", "interest", "company_email")
+# Columns that are NOT NULL on the profile tables
+REQUIRED_BLANK = {"current_year", "stream", "interest", "company", "city"}
+
+
+def _init_worker():
+    # Spawned workers need their own settings to find PASSWORD_HASHERS
+    import django
+
+    django.setup()
+
+
+def _hash(password):
+    return make_password(password or None)
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def _clean(value):
+    value = (value or "").strip()
+    return value or None
+
+
+class Command(BaseCommand):
+    help = "Create users, profiles and topic enrollments from a CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_path")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--workers", type=int, default=None,
+            help="password hashing processes (default: CPU count)",
+        )
+        parser.add_argument(
+            "--topics", type=int, nargs="*", default=None,
+            help="topic ids to enroll everyone in (default: DEFAULT_ENROLLMENT_TOPIC_IDS)",
+        )
+        parser.add_argument(
+            "--inactive", action="store_true",
+            help="leave accounts inactive until an admin approves them",
+        )
+
+    def handle(self, *args, **options):
+        topic_ids = options["topics"]
+        if topic_ids is None:
+            topic_ids = default_enrollment_topic_ids()
+        else:
+            missing = set(topic_ids) - set(
+                Topic.objects.filter(id__in=topic_ids).values_list("id", flat=True)
+            )
+            if missing:
+                raise CommandError(f"Unknown topic ids: {sorted(missing)}")
+        workers = options["workers"] or os.cpu_count() or 1
+
+        created = skipped = 0
+        seen = set()
+        start = time.perf_counter()
+
+        try:
+            csv_file = open(options["csv_path"], newline="", encoding="utf-8-sig")
+        except OSError as exc:
+            raise CommandError(exc)
+
+        with csv_file, ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker
+        ) as pool:
+            reader = csv.DictReader(csv_file)
+            for chunk in _chunks(reader, options["chunk_size"]):
+                rows, bad = self._valid_rows(chunk, seen)
+                skipped += bad
+                if not rows:
+                    continue
+
+                hashes = pool.map(
+                    _hash,
+                    [row.get("password") for row in rows],
+                    chunksize=max(1, len(rows) // (workers * 4)),
+                )
+                for row, password in zip(rows, hashes):
+                    row["password"] = password
+
+                inserted = self._insert_chunk(rows, topic_ids, not options["inactive"])
+                created += inserted
+                skipped += len(rows) - inserted
+                self.stdout.write(f"… {created} created")
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Imported {created} users ({skipped} skipped) in {elapsed:.1f}s"
+        ))
+
+    def _valid_rows(self, chunk, seen):
+        """ Drop rows without email/role and emails that already exist """
+        rows, bad = [], 0
+        for line in chunk:
+            email = _clean(line.get("email"))
+            role = (_clean(line.get("role")) or "").lower()
+            if not email or role not in ROLES:
+                self.stderr.write(f"⚠️ Skipping row {line!r}: email and a valid role are required")
+                bad += 1
+                continue
+            email = BaseUserManager.normalize_email(email)
+            if email.lower() in seen:
+                bad += 1
+                continue
+            seen.add(email.lower())
+            rows.append({**line, "email": email, "role": role})
+
+        existing = set(
+            CustomUser.objects.annotate(email_lower=Lower("email"))
+            .filter(email_lower__in=[row["email"].lower() for row in rows])
+            .values_list("email_lower", flat=True)
+        )
+        if existing:
+            self.stderr.write(f"⚠️ {len(existing)} emails already registered, skipped")
+            rows = [row for row in rows if row["email"].lower() not in existing]
+            bad += len(existing)
+        return rows, bad
+
+    def _insert_chunk(self, rows, topic_ids, is_active):
+        """ Insert a chunk; if it collides, row by row so one duplicate doesn't lose the rest """
+        try:
+            return self._insert(rows, topic_ids, is_active)
+        except IntegrityError:
+            pass
+        created = 0
+        for row in rows:
+            try:
+                created += self._insert([row], topic_ids, is_active)
+            except IntegrityError:
+                self.stderr.write(f"⚠️ Skipping {row['email']}: registered meanwhile")
+        return created
+
+    def _insert(self, rows, topic_ids, is_active):
+        users = [
+            CustomUser(
+                email=row["email"],
+                password=row["password"],
+                role=row["role"],
+                first_name=_clean(row.get("first_name")) or "",
+                last_name=_clean(row.get("last_name")) or "",
+                phone=_clean(row.get("phone")),
+                is_active=is_active,
+            )
+            for row in rows
+        ]
+
+        with transaction.atomic():
+            users = CustomUser.objects.bulk_create(users)
+            if any(user.pk is None for user in users):
+                # Backend can't return ids from a bulk insert
+                ids = dict(
+                    CustomUser.objects.filter(
+                        email__in=[user.email for user in users]
+                    ).values_list("email", "id")
+                )
+                for user in users:
+                    user.pk = ids[user.email]
+
+            students, professionals = [], []
+            for user, row in zip(users, rows):
+                if user.role == "student":
+                    students.append(StudentProfile(user=user, **self._profile(row, STUDENT_FIELDS)))
+                else:
+                    professionals.append(
+                        ProfessionalProfile(user=user, **self._profile(row, PROFESSIONAL_FIELDS))
+                    )
+            StudentProfile.objects.bulk_create(students)
+            ProfessionalProfile.objects.bulk_create(professionals)
+
+            Enrollment.objects.bulk_create(
+                [
+                    Enrollment(customuser_id=user.pk, topic_id=topic_id)
+                    for user in users
+                    for topic_id in topic_ids
+                ],
+                ignore_conflicts=True,
+            )
+            # bulk_create sends no post_save, keep the dashboard total right
+            stats.bump(stats.USERS, len(users))
+
+        return len(users)
+
+    @staticmethod
+    def _profile(row, fields):
+        data = {}
+        for field in fields:
+            value = _clean(row.get(field))
+            data[field] = "" if value is None and field in REQUIRED_BLANK else value
+        return data
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0013_userlastpage"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="supportmessage",
+            index=models.Index(
+                fields=["conversation", "created_at", "id"],
+                name="support_msg_keyset_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:55
+
+from django.db import migrations, models
+
+
+def backfill_inbox_state(apps, schema_editor):
+    SupportConversation = apps.get_model("accounts", "SupportConversation")
+    SupportMessage = apps.get_model("accounts", "SupportMessage")
+
+    for conversation in SupportConversation.objects.all().iterator():
+        messages = list(
+            SupportMessage.objects.filter(conversation=conversation)
+            .order_by("-created_at", "-id")
+            .values("sender", "message", "created_at")
+        )
+        if not messages:
+            continue
+
+        last = messages[0]
+        # Trailing run of messages from one side is what the other side hasn't read
+        unread = 0
+        for message in messages:
+            if message["sender"] != last["sender"]:
+                break
+            unread += 1
+
+        conversation.last_message_at = last["created_at"]
+        conversation.last_message_preview = (last["message"] or "[screenshot]")[:140]
+        conversation.last_sender = last["sender"]
+        conversation.admin_unread_count = unread if last["sender"] == "user" else 0
+        conversation.user_unread_count = unread if last["sender"] == "admin" else 0
+        conversation.save(
+            update_fields=[
+                "last_message_at",
+                "last_message_preview",
+                "last_sender",
+                "admin_unread_count",
+                "user_unread_count",
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0014_supportmessage_keyset_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="supportconversation",
+            name="admin_unread_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="supportconversation",
+            name="last_message_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="supportconversation",
+            name="last_message_preview",
+            field=models.CharField(blank=True, default="", max_length=140),
+        ),
+        migrations.AddField(
+            model_name="supportconversation",
+            name="last_sender",
+            field=models.CharField(blank=True, default="", max_length=10),
+        ),
+        migrations.AddField(
+            model_name="supportconversation",
+            name="user_unread_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="supportconversation",
+            index=models.Index(
+                fields=["-last_message_at"], name="support_inbox_recent_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="supportconversation",
+            index=models.Index(
+                fields=["admin_unread_count", "-last_message_at"],
+                name="support_inbox_unread_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="supportconversation",
+            index=models.Index(
+                fields=["last_sender", "-last_message_at"],
+                name="support_inbox_sender_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_inbox_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("SLMapp", "0011_muxaccount_page_mux_account"),
+        ("accounts", "0016_customuser_token_version"),
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="customuser",
+            index=models.Index(
+                fields=["role", "is_active", "-date_joined"],
+                name="user_role_active_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customuser",
+            index=models.Index(fields=["-date_joined"], name="user_joined_idx"),
+        ),
+    ]
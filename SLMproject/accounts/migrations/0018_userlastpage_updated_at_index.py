@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0017_customuser_list_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="userlastpage",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0018_userlastpage_updated_at_index"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="supportconversation",
+            name="support_inbox_recent_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="supportconversation",
+            name="support_inbox_unread_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="supportconversation",
+            name="support_inbox_sender_idx",
+        ),
+        migrations.AddIndex(
+            model_name="supportconversation",
+            index=models.Index(
+                fields=["-last_message_at", "-id"], name="support_inbox_recent_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="supportconversation",
+            index=models.Index(
+                fields=["-admin_unread_count", "-last_message_at", "-id"],
+                name="support_inbox_unread_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="supportconversation",
+            index=models.Index(
+                fields=["last_sender", "-last_message_at", "-id"],
+                name="support_inbox_sender_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="supportconversation",
+            index=models.Index(
+                fields=["created_at", "id"], name="support_inbox_created_idx"
+            ),
+        ),
+    ]
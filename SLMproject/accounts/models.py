@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Lower
 
 class CustomUser(AbstractUser):
 
@@ -20,8 +21,22 @@ class CustomUser(AbstractUser):
 
     is_active = models.BooleanField(default=False)
 
+    # Bumped to revoke every JWT issued so far (see accounts.authentication)
+    token_version = models.PositiveIntegerField(default=0)
+
     USERNAME_FIELD = "email"   # ✅ login with email
     REQUIRED_FIELDS = []
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Admin user table filters (UserListView)
+            models.Index(fields=["role", "is_active", "-date_joined"], name="user_role_active_idx"),
+            models.Index(fields=["-date_joined"], name="user_joined_idx"),
+            # ?search= prefix match on the lowercased columns
+            models.Index(Lower("email"), name="user_email_lower_idx"),
+            models.Index(Lower("first_name"), name="user_first_name_lower_idx"),
+            models.Index(Lower("last_name"), name="user_last_name_lower_idx"),
+        ]
     
     topics = models.ManyToManyField(
     "SLMapp.Topic",
@@ -88,6 +103,29 @@ class SupportConversation(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Denormalized inbox state, maintained on every SupportMessage insert
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_message_preview = models.CharField(max_length=140, blank=True, default="")
+    last_sender = models.CharField(max_length=10, blank=True, default="")
+    user_unread_count = models.PositiveIntegerField(default=0)   # admin replies the user hasn't seen
+    admin_unread_count = models.PositiveIntegerField(default=0)  # user messages no admin has seen
+
+    class Meta:
+        # Same column order and directions as AdminConversationListView.ORDERINGS
+        # (id is the tie-break), so every ordering is an index scan
+        indexes = [
+            models.Index(fields=["-last_message_at", "-id"], name="support_inbox_recent_idx"),
+            models.Index(
+                fields=["-admin_unread_count", "-last_message_at", "-id"],
+                name="support_inbox_unread_idx",
+            ),
+            models.Index(
+                fields=["last_sender", "-last_message_at", "-id"],
+                name="support_inbox_sender_idx",
+            ),
+            models.Index(fields=["created_at", "id"], name="support_inbox_created_idx"),
+        ]
+
     def __str__(self):
         return f"Conversation with {self.user.username}"
     
@@ -109,6 +147,15 @@ class SupportMessage(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # keyset pagination walks (created_at, id) inside one conversation
+        indexes = [
+            models.Index(
+                fields=["conversation", "created_at", "id"],
+                name="support_msg_keyset_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.sender} - {self.created_at}"
 
@@ -139,7 +186,7 @@ class UserLastPage(models.Model):
 
     page_id = models.IntegerField()
 
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # active learner counts
 
     def __str__(self):
         return f"{self.user.email} - Page {self.page_id}"
\ No newline at end of file
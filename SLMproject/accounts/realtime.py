@@ -0,0 +1,193 @@
+"""
+Push channel for support chat.
+
+New SupportMessage rows are fanned out to channel-layer groups:
+
+- support.user.<user_id>  → the student/professional owning the conversation
+- support.admins          → every connected admin
+
+The layer is picked by settings.SUPPORT_CHANNEL_LAYER. InMemoryChannelLayer
+works for a single ASGI process, RedisChannelLayer (needs the optional
+``redis`` package) shares events between nodes.
+
+EventSource can't send an Authorization header and an access token in the
+URL ends up in access logs, so the stream is opened with a stream ticket
+instead: signed, valid for STREAM_TICKET_SECONDS and good for one
+connection (per process without a shared cache).
+"""
+import asyncio
+import json
+import logging
+import secrets
+import threading
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+ADMIN_GROUP = "support.admins"
+
+STREAM_TICKET_SECONDS = 30
+_TICKET_SALT = "accounts.realtime.stream-ticket"
+
+
+def user_group(user_id):
+    return f"support.user.{user_id}"
+
+
+class InMemoryChannelLayer:
+    """ Single-process layer: one bounded asyncio.Queue per subscriber """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def publish(self, group, event):
+        # Called from sync views (worker threads) as well as the event loop
+        with self._lock:
+            subscribers = list(self._groups.get(group, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # Its event loop is closed (worker shut down mid-stream)
+                self._discard(subscription)
+
+    async def subscribe(self, groups):
+        subscription = _QueueSubscription(self, groups, self.queue_size)
+        with self._lock:
+            for group in groups:
+                self._groups.setdefault(group, set()).add(subscription)
+        return subscription
+
+    def _discard(self, subscription):
+        with self._lock:
+            for group in subscription.groups:
+                members = self._groups.get(group)
+                if members is None:
+                    continue
+                members.discard(subscription)
+                if not members:
+                    del self._groups[group]
+
+
+class _QueueSubscription:
+    def __init__(self, layer, groups, queue_size):
+        self.layer = layer
+        self.groups = list(groups)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow client: it resyncs through the ?since= message feed
+            logger.warning("Dropping support event for slow subscriber")
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        self.layer._discard(self)
+
+
+class RedisChannelLayer:
+    """ Multi-node layer on top of Redis pub/sub """
+
+    def __init__(self, url="redis://localhost:6379/0", prefix="slm"):
+        import redis  # optional dependency
+
+        self.url = url
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def _channel(self, group):
+        return f"{self.prefix}:{group}"
+
+    def publish(self, group, event):
+        self._client.publish(self._channel(group), json.dumps(event))
+
+    async def subscribe(self, groups):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(*[self._channel(group) for group in groups])
+        return _RedisSubscription(client, pubsub)
+
+
+class _RedisSubscription:
+    def __init__(self, client, pubsub):
+        self.client = client
+        self.pubsub = pubsub
+
+    async def get(self, timeout):
+        message = await self.pubsub.get_message(
+            ignore_subscribe_messages=True, timeout=timeout
+        )
+        if message is None:
+            return None
+        return json.loads(message["data"])
+
+    async def close(self):
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+
+_layer = None
+_layer_lock = threading.Lock()
+
+
+def get_channel_layer():
+    global _layer
+    if _layer is None:
+        with _layer_lock:
+            if _layer is None:
+                config = getattr(settings, "SUPPORT_CHANNEL_LAYER", {})
+                backend = config.get(
+                    "BACKEND", "accounts.realtime.InMemoryChannelLayer"
+                )
+                _layer = import_string(backend)(**config.get("OPTIONS", {}))
+    return _layer
+
+
+def publish_support_message(message, user_id):
+    """ Fan a freshly created SupportMessage out to its user and the admins """
+    from .serializers import SupportMessageSerializer
+
+    event = {
+        "type": "support.message",
+        "conversation": message.conversation_id,
+        "message": SupportMessageSerializer(message).data,
+    }
+    layer = get_channel_layer()
+    for group in (user_group(user_id), ADMIN_GROUP):
+        try:
+            layer.publish(group, event)
+        except Exception:
+            # Never fail the write because a push could not be delivered
+            logger.exception("Could not publish support event to %s", group)
+
+
+def issue_stream_ticket(user_id):
+    return signing.dumps({"user": user_id, "nonce": secrets.token_urlsafe(12)}, salt=_TICKET_SALT)
+
+
+def redeem_stream_ticket(ticket):
+    """ The ticket's user id, None when it is forged, expired or used already """
+    try:
+        payload = signing.loads(ticket, salt=_TICKET_SALT, max_age=STREAM_TICKET_SECONDS)
+    except signing.BadSignature:
+        return None
+    # add() only succeeds for the first redemption
+    if not cache.add(f"streamticket:{payload['nonce']}", 1, STREAM_TICKET_SECONDS):
+        return None
+    return payload["user"]
@@ -7,6 +7,11 @@ from .models import CustomUser, StudentProfile, ProfessionalProfile,UserCertific
 
 from rest_framework import serializers
 from .models import SupportConversation, SupportMessage
+from .support import message_page
+from .enrollment import Enrollment, default_enrollment_topic_ids
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from SLMapp.fieldsets import SparseFieldsetMixin
 
 
 class UserRegisterSerializer(serializers.ModelSerializer):
@@ -72,27 +77,26 @@ class UserRegisterSerializer(serializers.ModelSerializer):
                 "company_email": company_email if company_email else None,
             }
 
-        # ✅ Create user
-        user = CustomUser.objects.create(
-            role=role,
-            is_active=False,
-            **validated_data
-        )
-
-        user.set_password(password)
-        user.save()
+        # ✅ One transaction: hashed user row, default topics, profile
+        with transaction.atomic():
+            user = CustomUser.objects.create(
+                role=role,
+                is_active=False,
+                password=make_password(password),
+                **validated_data
+            )
 
-        # ✅ Assign default topic (id = 10)
-        default_topic = Topic.objects.filter(id=10).first()
-        if default_topic:
-            user.topics.add(default_topic)
+            topic_ids = default_enrollment_topic_ids()
+            if topic_ids:
+                Enrollment.objects.bulk_create(
+                    [Enrollment(customuser_id=user.pk, topic_id=topic_id) for topic_id in topic_ids]
+                )
 
-        # ✅ Create profile
-        if role == "student":
-            StudentProfile.objects.create(user=user, **student_data)
+            if role == "student":
+                StudentProfile.objects.create(user=user, **student_data)
 
-        elif role == "professional":
-            ProfessionalProfile.objects.create(user=user, **professional_data)
+            elif role == "professional":
+                ProfessionalProfile.objects.create(user=user, **professional_data)
 
         return user
 
@@ -141,6 +145,37 @@ class UserSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class UserListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Admin user table: no password hash / groups / permissions.
+    Expects select_related("student_profile", "professional_profile") and
+    prefetch_related("topics") on the queryset, see UserListView.
+    """
+
+    student_profile = StudentProfileSerializer(read_only=True)
+    professional_profile = ProfessionalProfileSerializer(read_only=True)
+    topics = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+    class Meta:
+        model = CustomUser
+        fields = [
+            "id",
+            "email",
+            "first_name",
+            "last_name",
+            "role",
+            "phone",
+            "dob",
+            "is_active",
+            "is_staff",
+            "date_joined",
+            "last_login",
+            "topics",
+            "student_profile",
+            "professional_profile",
+        ]
+
+
 class ToggleActiveSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
@@ -149,6 +184,8 @@ class ToggleActiveSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         instance.is_active = not instance.is_active
+        # Tokens issued before the toggle stop working right away (is_active
+        # is a token claim, see accounts.signals)
         instance.save()
         return instance
 
@@ -173,19 +210,39 @@ class SupportMessageSerializer(serializers.ModelSerializer):
 
 
 class SupportConversationSerializer(serializers.ModelSerializer):
-    messages = serializers.SerializerMethodField()
+    """
+    Conversation with only its latest page of messages. Older history and
+    new replies are fetched through the incremental messages endpoints.
+    """
 
     class Meta:
         model = SupportConversation
-        fields = ["id", "created_at", "messages"]
+        fields = ["id", "created_at"]
 
-    def get_messages(self, obj):
-        request = self.context.get("request")
-        return SupportMessageSerializer(
-            obj.messages.all().order_by("created_at"),
-            many=True,
-            context={"request": request},
-        ).data
+    def to_representation(self, obj):
+        data = super().to_representation(obj)
+        messages, has_more = message_page(obj)
+        data.update(message_page_data(messages, has_more, self.context))
+        return data
+
+
+def message_page_data(messages, has_more, context):
+    """
+    Payload shared by the conversation and incremental message feeds.
+    oldest_id is the next ?before= (older history), newest_id the next
+    ?since= (new replies); cursor is kept for clients polling with it.
+    """
+    oldest_id = messages[0].id if messages else None
+    newest_id = messages[-1].id if messages else None
+    return {
+        "messages": SupportMessageSerializer(
+            messages, many=True, context=context
+        ).data,
+        "has_more": has_more,
+        "oldest_id": oldest_id,
+        "newest_id": newest_id,
+        "cursor": newest_id,
+    }
 
         
 from rest_framework import serializers
@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from SLMapp.models import Topic
+from .authentication import CLAIM_FIELDS, revoke_user_tokens
+from .enrollment import Enrollment, invalidate_default_enrollment, invalidate_enrollment
+from .models import CustomUser, SupportMessage
+from .realtime import publish_support_message
+from .support import record_new_message
+
+
+@receiver(post_save, sender=SupportMessage)
+def push_support_message(sender, instance, created, **kwargs):
+    if not created:
+        return
+
+    record_new_message(instance)
+
+    user_id = instance.conversation.user_id
+    # Push only once the row is visible to clients re-reading the feed
+    transaction.on_commit(lambda: publish_support_message(instance, user_id))
+
+
+@receiver(m2m_changed, sender=Enrollment)
+def enrollment_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear", "post_clear"):
+        return
+
+    if not reverse:
+        # user.topics.add/remove/clear()
+        if action != "pre_clear":
+            instance.__dict__.pop("_enrolled_topic_ids", None)
+            invalidate_enrollment([instance.pk])
+        return
+
+    # topic.users.add/remove/clear(): pk_set holds user ids, except for clear
+    if action == "pre_clear":
+        instance._cleared_user_ids = list(
+            Enrollment.objects.filter(topic_id=instance.pk).values_list(
+                "customuser_id", flat=True
+            )
+        )
+    elif action == "post_clear":
+        invalidate_enrollment(getattr(instance, "_cleared_user_ids", []))
+    else:
+        invalidate_enrollment(pk_set or [])
+
+
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+def topic_changed(sender, instance, **kwargs):
+    if instance.pk in settings.DEFAULT_ENROLLMENT_TOPIC_IDS:
+        invalidate_default_enrollment()
+
+
+# Tokens carry CLAIM_FIELDS and are trusted until they expire, so a change
+# to any of them (role, staff flags, email, deactivation) revokes them
+
+@receiver(pre_save, sender=CustomUser)
+def remember_claims_changed(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._claims_changed = False
+    if raw or instance._state.adding:
+        return
+    fields = CLAIM_FIELDS if update_fields is None else [f for f in CLAIM_FIELDS if f in update_fields]
+    if not fields:
+        return  # e.g. last_login on every login, no query
+    stored = CustomUser.objects.filter(pk=instance.pk).values_list(*fields).first()
+    instance._claims_changed = stored is not None and stored != tuple(getattr(instance, f) for f in fields)
+
+
+@receiver(post_save, sender=CustomUser)
+def revoke_tokens_on_claims_change(sender, instance, created, **kwargs):
+    if not created and getattr(instance, "_claims_changed", False):
+        instance._claims_changed = False
+        revoke_user_tokens(instance)
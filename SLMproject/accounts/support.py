@@ -0,0 +1,109 @@
+from django.db.models import Case, F, Q, Subquery, Value, When
+
+from .models import SupportConversation, SupportMessage
+
+# How many messages a single page of a support thread returns
+MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 200
+
+PREVIEW_LENGTH = 140
+
+
+def parse_limit(value, default=MESSAGE_PAGE_SIZE):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, MAX_MESSAGE_PAGE_SIZE))
+
+
+def message_page(conversation, since=None, before=None, limit=MESSAGE_PAGE_SIZE):
+    """
+    Keyset pagination over a conversation ordered by (created_at, id).
+
+    - since=<message id>  → messages newer than that message (oldest first)
+    - before=<message id> → the page of messages right before that message
+    - neither             → the latest page of the thread
+
+    Returns (messages, has_more) with messages always in chronological order.
+    """
+    qs = SupportMessage.objects.filter(conversation=conversation)
+
+    if since is not None:
+        anchor = SupportMessage.objects.filter(
+            conversation=conversation, pk=since
+        ).values("created_at")[:1]
+        qs = qs.filter(
+            Q(created_at__gt=Subquery(anchor))
+            | Q(created_at=Subquery(anchor), id__gt=since)
+        ).order_by("created_at", "id")
+
+        messages = list(qs[: limit + 1])
+        has_more = len(messages) > limit
+        return messages[:limit], has_more
+
+    if before is not None:
+        anchor = SupportMessage.objects.filter(
+            conversation=conversation, pk=before
+        ).values("created_at")[:1]
+        qs = qs.filter(
+            Q(created_at__lt=Subquery(anchor))
+            | Q(created_at=Subquery(anchor), id__lt=before)
+        )
+
+    messages = list(qs.order_by("-created_at", "-id")[: limit + 1])
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    messages.reverse()
+    return messages, has_more
+
+
+def parse_message_id(value):
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def message_preview(message):
+    return (message.message or "[screenshot]")[:PREVIEW_LENGTH]
+
+
+def record_new_message(message):
+    """
+    Keep the conversation's inbox columns in sync with a new message.
+    One UPDATE, counters are incremented in SQL so concurrent sends don't
+    lose increments, and the last_* columns only move forward: a send
+    committing after a newer one doesn't overwrite it.
+    """
+    unread_field = (
+        "admin_unread_count" if message.sender == "user" else "user_unread_count"
+    )
+    newer = Q(last_message_at__isnull=True) | Q(last_message_at__lte=message.created_at)
+
+    def if_newer(field, value, output_field):
+        return Case(When(newer, then=Value(value, output_field=output_field)), default=F(field))
+
+    fields = SupportConversation._meta
+    SupportConversation.objects.filter(pk=message.conversation_id).update(
+        last_message_at=if_newer("last_message_at", message.created_at, fields.get_field("last_message_at")),
+        last_message_preview=if_newer(
+            "last_message_preview", message_preview(message), fields.get_field("last_message_preview")
+        ),
+        last_sender=if_newer("last_sender", message.sender, fields.get_field("last_sender")),
+        **{unread_field: F(unread_field) + 1},
+    )
+
+
+def mark_read(conversation, reader):
+    """ reader is "user" or "admin"; skips the write when nothing is unread """
+    unread_field = f"{reader}_unread_count"
+    if getattr(conversation, unread_field) == 0:
+        return
+    SupportConversation.objects.filter(
+        pk=conversation.pk, **{f"{unread_field}__gt": 0}
+    ).update(**{unread_field: 0})
+    setattr(conversation, unread_field, 0)
+
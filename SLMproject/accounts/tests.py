@@ -1,3 +1,417 @@
-from django.test import TestCase
+import csv
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from SLMapp.models import Topic
+
+from . import last_page
+from .management.commands.import_users import Command as ImportUsersCommand
+from .realtime import issue_stream_ticket, redeem_stream_ticket
+from .support import record_new_message
+from .throttles import LoginIPRateThrottle
+from .models import (
+    CustomUser, ProfessionalProfile, StudentProfile, SupportConversation, SupportMessage, UserLastPage,
+)
+
+
+# -------------------------
+# LAST PAGE (write-through / write-behind)
+# -------------------------
+
+class LastPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(email="s@x.com", role="student", is_active=True)
+
+    def stored(self):
+        return UserLastPage.objects.get(user=self.user).page_id
+
+    def test_write_through_ignores_stale_local_cache(self):
+        # Worker A saves 1, worker B saves 2, worker A saves 1 again
+        with mock.patch.object(last_page, "_buffer", False):
+            last_page.save_last_page(self.user, 1)
+            cache.set(last_page._key(self.user.pk), (1, timezone.now()))  # A's own entry
+            UserLastPage.objects.filter(user=self.user).update(page_id=2)  # B's save
+            last_page.save_last_page(self.user, 1)
+            self.assertEqual(self.stored(), 1)
+            self.assertEqual(last_page.get_last_page_id(self.user), 1)
+
+    def test_flush_keeps_newest_navigation(self):
+        now = timezone.now()
+        buffer = last_page.LastPageBuffer(buffer_size=10**6, flush_seconds=3600)
+        buffer._pid = -1  # pretend the flusher runs, none is started in tests
+        with mock.patch("os.getpid", return_value=-1):
+            buffer.add(self.user.pk, 5, now)
+            buffer.add(self.user.pk, 4, now - timedelta(seconds=1))  # arrived late, older
+        self.assertEqual(buffer.pending(self.user.pk), (5, now))
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(self.stored(), 5)
+
+        # Another worker flushing an older navigation afterwards doesn't win
+        last_page.write_positions({self.user.pk: (3, now - timedelta(minutes=1))})
+        self.assertEqual(self.stored(), 5)
+        last_page.write_positions({self.user.pk: (6, now + timedelta(minutes=1))})
+        self.assertEqual(self.stored(), 6)
+
+    def test_flush_skips_deleted_users(self):
+        gone = CustomUser.objects.create(email="gone@x.com", role="student")
+        positions = {gone.pk: (1, timezone.now()), self.user.pk: (2, timezone.now())}
+        gone.delete()
+        last_page.write_positions(positions)
+        self.assertEqual(list(UserLastPage.objects.values_list("page_id", flat=True)), [2])
+
+    def test_forked_child_starts_empty(self):
+        buffer = last_page.LastPageBuffer()
+        buffer._pending[self.user.pk] = (1, timezone.now())
+        buffer._lock.acquire()
+        buffer._reset()  # what os.register_at_fork runs in the child
+        self.assertIsNone(buffer.pending(self.user.pk))
+        self.assertEqual(buffer.flush(), 0)
+
+
+# -------------------------
+# LOGIN THROTTLES
+# -------------------------
+
+@mock.patch.dict(LoginIPRateThrottle.THROTTLE_RATES, {"login": "100/min", "login_ip": "3/min"})
+class LoginThrottleTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = []
+        for n in range(5):
+            user = CustomUser(email=f"u{n}@x.com", role="student", is_active=True)
+            user.set_password("secret-pass")
+            user.save()
+            self.users.append(user)
+
+    def login(self, email, password="secret-pass"):
+        return self.client.post("/accounts/login/", {"email": email, "password": password})
+
+    def test_successful_logins_not_counted_per_ip(self):
+        # A whole class behind one address signs in
+        for user in self.users:
+            self.assertEqual(self.login(user.email).status_code, 200)
+
+    def test_failed_logins_throttled_per_ip(self):
+        for n in range(3):
+            self.assertEqual(self.login(f"u{n}@x.com", "wrong").status_code, 400)
+        self.assertEqual(self.login("u4@x.com").status_code, 429)
+
+
+# -------------------------
+# STATELESS JWT (claims, revocation)
+# -------------------------
+
+class TokenClaimTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser(email="s@x.com", role="student", is_active=True)
+        self.user.set_password("secret-pass")
+        self.user.save()
+        access = self.client.post("/accounts/login/", {"email": "s@x.com", "password": "secret-pass"}).data["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def status(self):
+        return self.client.get("/accounts/last-page/get/").status_code
+
+    def test_user_read_from_claims(self):
+        self.status()  # token version cached
+        with self.assertNumQueries(1):  # the last page, no user lookup
+            self.assertEqual(self.status(), 200)
+
+    def test_claim_change_revokes(self):
+        user = CustomUser.objects.get(pk=self.user.pk)
+        user.first_name = "Sam"
+        user.save()  # not a claim
+        self.assertEqual(self.status(), 200)
+        user.role = "admin"
+        user.save(update_fields=["role"])
+        self.assertEqual(self.status(), 401)
+
+        version = CustomUser.objects.get(pk=user.pk).token_version
+        user.first_name = "Alex"
+        user.save()  # a full save keeps the bumped version
+        self.assertEqual(CustomUser.objects.get(pk=user.pk).token_version, version)
+
+    def test_deactivation_revokes(self):
+        admin = CustomUser.objects.create(email="admin@x.com", role="admin", is_active=True, is_staff=True)
+        self.client.force_authenticate(admin)
+        self.client.patch(f"/accounts/users/{self.user.id}/toggle-active/", {})
+        self.client.force_authenticate(None)
+        self.assertEqual(self.status(), 401)
+
+
+# -------------------------
+# REGISTRATION
+# -------------------------
+
+class RegisterTests(APITestCase):
+    body = {
+        "email": "new@x.com", "password": "secret-pass", "role": "student",
+        "current_year": "2", "stream": "CS", "interest": "AI",
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.topic = Topic.objects.create(name="Default", order=1)
+
+    def register(self, **changes):
+        return self.client.post("/accounts/register/", {**self.body, **changes}, format="json")
+
+    def test_user_profile_and_enrollment(self):
+        with override_settings(DEFAULT_ENROLLMENT_TOPIC_IDS=[self.topic.id]):
+            self.assertEqual(self.register(email="first@x.com").status_code, 201)
+            # unique check, savepoint, user, enrollment, profile, release
+            with self.assertNumQueries(6):
+                self.assertEqual(self.register().status_code, 201)
+        user = CustomUser.objects.get(email="new@x.com")
+        self.assertTrue(user.check_password("secret-pass"))
+        self.assertFalse(user.is_active)
+        self.assertEqual(user.student_profile.stream, "CS")
+        self.assertEqual(list(user.topics.values_list("id", flat=True)), [self.topic.id])
+
+    def test_failed_profile_leaves_no_user(self):
+        body = {key: value for key, value in self.body.items() if key != "stream"}
+        with self.assertRaises(IntegrityError):
+            self.client.post("/accounts/register/", body, format="json")  # stream is NOT NULL
+        self.assertFalse(CustomUser.objects.filter(email="new@x.com").exists())
+
+
+# -------------------------
+# ADMIN USER LIST
+# -------------------------
+
+class UserListTests(APITestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create(
+            email="admin@x.com", role="admin", is_active=True, is_staff=True, is_superuser=True,
+        )
+        self.client.force_authenticate(self.admin)
+        self.add_students(Topic.objects.create(name="First", order=1), range(5))
+
+    def add_students(self, topic, numbers):
+        for n in numbers:
+            user = CustomUser.objects.create(email=f"u{n}@x.com", role="student", first_name=f"Name{n}")
+            user.topics.add(topic)
+            StudentProfile.objects.create(user=user, current_year="1", stream="CS", interest="AI")
+
+    def emails(self, **params):
+        return sorted(row["email"] for row in self.client.get("/accounts/users/", params).json())
+
+    def test_queries_dont_grow_with_users(self):
+        with self.assertNumQueries(2):  # users with profiles, their topics
+            count = len(self.client.get("/accounts/users/").json())
+        self.add_students(Topic.objects.create(name="Second", order=2), range(5, 15))
+        with self.assertNumQueries(2):
+            rows = self.client.get("/accounts/users/").json()
+        self.assertEqual(len(rows), count + 10)
+        self.assertNotIn("password", rows[0])
+        self.assertEqual(rows[0]["student_profile"]["stream"], "CS")
+
+    def test_sparse_fields_and_prefix_search(self):
+        params = {"fields": "email,role", "role": "student", "search": "u3"}
+        with self.assertNumQueries(1):
+            rows = self.client.get("/accounts/users/", params).json()
+        self.assertEqual(rows, [{"id": rows[0]["id"], "email": "u3@x.com", "role": "student"}])
+        # Prefix, case-insensitive, on first name too
+        self.assertEqual(self.emails(fields="email", search="NAME1"), ["u1@x.com"])
+        self.assertEqual(self.emails(fields="email", search="ame1"), [])
+        # The last code point has no successor for the range's upper bound
+        self.assertEqual(self.client.get("/accounts/users/", {"search": "\U0010ffff"}).status_code, 200)
+
+
+# -------------------------
+# IMPORT USERS
+# -------------------------
+
+class ImportUsersTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.topic = Topic.objects.create(name="Default", order=1)
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def run_import(self, rows, *args):
+        path = os.path.join(self.dir.name, "users.csv")
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["email", "password", "role", "first_name", "stream", "company"])
+            writer.writerows(rows)
+        with open(os.devnull, "w") as devnull:
+            call_command(
+                "import_users", path, "--topics", str(self.topic.id), *args, stdout=devnull, stderr=devnull
+            )
+
+    def test_import_skips_duplicates(self):
+        CustomUser.objects.create(email="Taken@x.com", role="student")
+        self.run_import(
+            [[f"s{n}@x.com", "secret-pass", "student", "S", "CS", ""] for n in range(8)]
+            + [[f"p{n}@x.com", "secret-pass", "professional", "P", "", "ACME"] for n in range(3)]
+            + [["taken@x.com", "x", "student"], ["S1@x.com", "x", "student"], ["", "x", "student"]],
+            "--chunk-size", "4", "--workers", "1",
+        )
+        self.assertEqual(CustomUser.objects.count(), 12)
+        self.assertEqual((StudentProfile.objects.count(), ProfessionalProfile.objects.count()), (8, 3))
+        user = CustomUser.objects.get(email="s3@x.com")
+        self.assertTrue(user.check_password("secret-pass"))
+        self.assertTrue(user.is_active)
+        self.assertEqual(list(user.topics.values_list("id", flat=True)), [self.topic.id])
+
+    def test_email_registered_meanwhile(self):
+        original = ImportUsersCommand._valid_rows
+
+        def racing(command, chunk, seen):
+            rows, bad = original(command, chunk, seen)
+            CustomUser.objects.create(email="r2@x.com", role="student")  # signed up after the check
+            return rows, bad
+
+        with mock.patch.object(ImportUsersCommand, "_valid_rows", racing):
+            self.run_import([[f"r{n}@x.com", "secret-pass", "student"] for n in range(4)], "--workers", "1")
+        self.assertEqual(CustomUser.objects.filter(email__startswith="r").count(), 4)
+        self.assertEqual(StudentProfile.objects.count(), 3)
+
+
+# -------------------------
+# SUPPORT CHAT (keyset feed)
+# -------------------------
+
+class SupportFeedTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(email="s@x.com", role="student", is_active=True)
+        self.client.force_authenticate(self.user)
+        self.conversation = SupportConversation.objects.create(user=self.user)
+        at = timezone.now() - timedelta(hours=1)
+        self.ids = [
+            SupportMessage.objects.create(
+                conversation=self.conversation, sender="user", message=f"m{n}", created_at=at,
+            ).id
+            for n in range(7)
+        ]  # same timestamp: ids break the tie
+
+    def feed(self, **params):
+        return self.client.get("/accounts/conversation/messages/", {"limit": 3, **params}).json()
+
+    def ids_of(self, data):
+        return [message["id"] for message in data["messages"]]
+
+    def test_paging_back_with_before(self):
+        latest = self.feed()
+        self.assertEqual(self.ids_of(latest), self.ids[4:])
+        self.assertEqual((latest["oldest_id"], latest["newest_id"]), (self.ids[4], self.ids[6]))
+
+        older = self.feed(before=latest["oldest_id"])
+        self.assertEqual(self.ids_of(older), self.ids[1:4])
+        self.assertEqual(older["cursor"], self.ids[1])
+        self.assertTrue(older["has_more"])
+
+        oldest = self.feed(before=older["cursor"])
+        self.assertEqual(self.ids_of(oldest), self.ids[:1])
+        self.assertFalse(oldest["has_more"])
+
+    def test_polling_with_since(self):
+        data = self.feed(since=self.ids[2])
+        self.assertEqual(self.ids_of(data), self.ids[3:6])
+        self.assertTrue(data["has_more"])
+        data = self.feed(since=data["newest_id"])
+        self.assertEqual(self.ids_of(data), self.ids[6:])
+
+        nothing_new = self.feed(since=self.ids[6])
+        self.assertEqual((nothing_new["messages"], nothing_new["cursor"]), ([], self.ids[6]))
+
+    def test_send_returns_only_the_new_message(self):
+        r = self.client.post("/accounts/send-message/", {"message": "help"})
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r.json()["message"], "help")
+        self.assertNotIn("messages", r.json())
+        self.assertEqual(self.ids_of(self.feed(since=self.ids[6])), [r.json()["id"]])
+        self.assertEqual(self.client.post("/accounts/send-message/", {}).status_code, 400)
+
+
+# -------------------------
+# SUPPORT CHAT (stream tickets)
+# -------------------------
+
+class StreamTicketTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(email="s@x.com", role="student", is_active=True)
+
+    def test_ticket_issued_to_signed_in_users(self):
+        self.assertEqual(self.client.post("/accounts/conversation/events/ticket/").status_code, 401)
+        self.client.force_authenticate(self.user)
+        r = self.client.post("/accounts/conversation/events/ticket/")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(redeem_stream_ticket(r.json()["ticket"]), self.user.id)
+
+    def test_ticket_is_single_use(self):
+        ticket = issue_stream_ticket(self.user.id)
+        self.assertEqual(redeem_stream_ticket(ticket), self.user.id)
+        self.assertIsNone(redeem_stream_ticket(ticket))
+
+    def test_forged_or_expired_ticket_rejected(self):
+        self.assertIsNone(redeem_stream_ticket("not-a-ticket"))
+        self.assertIsNone(redeem_stream_ticket(issue_stream_ticket(self.user.id) + "x"))
+        ticket = issue_stream_ticket(self.user.id)
+        with mock.patch("time.time", return_value=timezone.now().timestamp() + 60):
+            self.assertIsNone(redeem_stream_ticket(ticket))
+
+
+# -------------------------
+# SUPPORT INBOX (denormalized counters)
+# -------------------------
+
+class SupportInboxTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create(email="s@x.com", role="student", is_active=True)
+        self.admin = CustomUser.objects.create(email="admin@x.com", role="admin", is_active=True)
+
+    def test_unread_counters_and_last_message(self):
+        self.client.force_authenticate(self.user)
+        for text in ("hi", "hello?"):
+            self.client.post("/accounts/send-message/", {"message": text})
+        conversation = SupportConversation.objects.get(user=self.user)
+
+        self.client.force_authenticate(self.admin)
+        with self.assertNumQueries(1):
+            inbox = self.client.get("/accounts/admin/conversations/", {"unread": "true"}).json()
+        self.assertEqual(
+            [(row["user_email"], row["admin_unread_count"], row["last_message_preview"]) for row in inbox],
+            [("s@x.com", 2, "hello?")],
+        )
+        self.client.get(f"/accounts/admin/conversation/{conversation.id}/")
+        self.client.post(f"/accounts/admin/conversation/{conversation.id}/send/", {"message": "on it"})
+        conversation.refresh_from_db()
+        self.assertEqual(
+            (conversation.admin_unread_count, conversation.user_unread_count, conversation.last_sender), (0, 1, "admin")
+        )
+
+        self.client.force_authenticate(self.user)
+        self.client.get("/accounts/conversation/messages/")
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.user_unread_count, 0)
+
+    def test_late_message_does_not_move_last_message_back(self):
+        conversation = SupportConversation.objects.create(user=self.user)
+        newer = SupportMessage.objects.create(conversation=conversation, sender="admin", message="newer")
+        late = SupportMessage(
+            conversation=conversation, sender="user", message="late",
+            created_at=newer.created_at - timedelta(seconds=5),
+        )
+        record_new_message(late)
+        conversation.refresh_from_db()
+        self.assertEqual(
+            (conversation.last_message_preview, conversation.last_sender, conversation.last_message_at),
+            ("newer", "admin", newer.created_at),
+        )
+        self.assertEqual(conversation.admin_unread_count, 1)
@@ -0,0 +1,44 @@
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class LoginRateThrottle(SimpleRateThrottle):
+    """
+    Login attempts per (email, client IP). Rejected before authenticate()
+    runs, so guessing one account can't burn password-hashing CPU.
+    """
+
+    scope = "login"
+
+    def get_cache_key(self, request, view):
+        email = str(request.data.get("email", "")).strip().lower()
+        return self.cache_format % {
+            "scope": self.scope,
+            "ident": f"{email}:{self.get_ident(request)}",
+        }
+
+
+class LoginIPRateThrottle(SimpleRateThrottle):
+    """
+    Failed logins per client IP, whatever the email. Successful logins
+    aren't counted (a classroom behind one NAT all signs in at once), the
+    view calls record_failure() on bad credentials instead.
+    """
+
+    scope = "login_ip"
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            "scope": self.scope,
+            "ident": self.get_ident(request),
+        }
+
+    def throttle_success(self):
+        # Checked on every attempt, counted only by record_failure()
+        return True
+
+    def record_failure(self, request):
+        self.key = self.get_cache_key(request, None)
+        self.now = self.timer()
+        self.history = [at for at in self.cache.get(self.key, []) if at > self.now - self.duration]
+        self.history.insert(0, self.now)
+        self.cache.set(self.key, self.history, self.duration)
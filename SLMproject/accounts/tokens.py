@@ -0,0 +1,22 @@
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# Claims copied from the user into every access token
+TOKEN_VERSION_CLAIM = "ver"
+
+
+class UserClaimsRefreshToken(RefreshToken):
+    """
+    Refresh/access pair carrying what request handling needs about the user,
+    so StatelessJWTAuthentication can build request.user without a query.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token["email"] = user.email
+        token["role"] = user.role
+        token["is_superuser"] = user.is_superuser
+        token["is_staff"] = user.is_staff
+        token["is_active"] = user.is_active
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        return token
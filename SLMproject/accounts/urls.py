@@ -10,11 +10,15 @@ urlpatterns = [
     path('users/<int:pk>/toggle-active/', ToggleUserActiveView.as_view(), name='toggle-user-active'),
     path('users/<int:pk>/delete/', UserDeleteView.as_view(), name='user-delete'),
     path("conversation/", get_or_create_conversation, name="conversation"),
+    path("conversation/messages/", conversation_messages, name="conversation_messages"),
+    path("conversation/events/", support_events, name="conversation_events"),
+    path("conversation/events/ticket/", support_stream_ticket, name="conversation_events_ticket"),
     path("send-message/", send_message, name="send_message"),
     path("submit-feedback/", submit_feedback, name="submit_feedback"),
     path("certificate/", StudentCertificateView.as_view()),
     path("admin/conversations/", AdminConversationListView.as_view()),
 path("admin/conversation/<int:id>/", AdminConversationDetailView.as_view()),
+path("admin/conversation/<int:convo_id>/messages/", AdminConversationMessagesView.as_view()),
 path("admin/conversation/<int:convo_id>/send/", AdminSendMessageView.as_view()),
 path(
     "admin/conversation/<int:convo_id>/delete/",
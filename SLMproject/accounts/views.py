@@ -1,9 +1,20 @@
+import json
+import sys
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework import generics
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
 from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import StatelessJWTAuthentication, forget_user
+from .throttles import LoginIPRateThrottle, LoginRateThrottle
+from .tokens import UserClaimsRefreshToken
 from .models import CustomUser
-from .serializers import UserSerializer, UserRegisterSerializer, UserLoginSerializer,ToggleActiveSerializer
+from .serializers import UserSerializer, UserListSerializer, UserRegisterSerializer, UserLoginSerializer,ToggleActiveSerializer
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
@@ -11,9 +22,11 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from .models import SupportConversation, SupportMessage
 from .serializers import SupportConversationSerializer,FeedbackSerializer
+from .serializers import SupportMessageSerializer, message_page_data
+from .support import mark_read, message_page, parse_limit, parse_message_id
 from .models import UserCertificate
 from rest_framework.parsers import MultiPartParser, FormParser
-from django.shortcuts import get_object_or_404
+from django.shortcuts import aget_object_or_404, get_object_or_404
 from rest_framework.permissions import IsAdminUser
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
@@ -23,7 +36,18 @@ from .serializers import SupportConversationSerializer
 from rest_framework.views import APIView
 from .models import UserLastPage
 from .serializers import UserLastPageSerializer
-
+from .last_page import get_last_page_id, save_last_page
+from .realtime import (
+    ADMIN_GROUP, STREAM_TICKET_SECONDS, get_channel_layer, issue_stream_ticket, redeem_stream_ticket, user_group,
+)
+from .support import MAX_MESSAGE_PAGE_SIZE
+
+from django.db.models import F, Prefetch, Q
+from django.db.models.functions import Lower
+from django.db.models.lookups import GreaterThanOrEqual, LessThan, StartsWith
+from SLMapp.fieldsets import parse_field_list
+from SLMapp.async_views import AsyncAPIView
+from SLMapp.middleware import never_compress
 from SLMapp.views import Topic
 class UserRegisterView(generics.CreateAPIView):
     queryset = CustomUser.objects.all()
@@ -33,16 +57,24 @@ class UserRegisterView(generics.CreateAPIView):
 class UserDeleteView(generics.DestroyAPIView):
     queryset = CustomUser.objects.all()
     permission_classes = [IsAuthenticated]
+
+    def perform_destroy(self, instance):
+        user_id = instance.pk
+        instance.delete()
+        forget_user(user_id)
     
 class UserLoginView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [LoginIPRateThrottle, LoginRateThrottle]
 
     def post(self, request):
         serializer = UserLoginSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        if not serializer.is_valid():
+            LoginIPRateThrottle().record_failure(request)
+            raise ValidationError(serializer.errors)
         user = serializer.validated_data["user"]
 
-        refresh = RefreshToken.for_user(user)
+        refresh = UserClaimsRefreshToken.for_user(user)
 
         return Response({
             "user": {
@@ -72,10 +104,68 @@ class LogoutView(APIView):
         
         
 class UserListView(generics.ListAPIView):
-    queryset = CustomUser.objects.all()
-    serializer_class = UserSerializer
+    """
+    ?fields=email,role,...   sparse output
+    ?search=<prefix>         email / first / last name prefix
+    ?role=student&is_active=true
+    """
+    serializer_class = UserListSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        params = self.request.query_params
+        fields = parse_field_list(params.get("fields"))
+
+        qs = CustomUser.objects.order_by("-date_joined", "-id")
+
+        # Only join / prefetch what the response will actually render
+        related = [
+            name for name in ("student_profile", "professional_profile")
+            if not fields or name in fields
+        ]
+        if related:
+            qs = qs.select_related(*related)
+        if not fields or "topics" in fields:
+            qs = qs.prefetch_related(
+                Prefetch("topics", queryset=Topic.objects.only("id"))
+            )
+
+        role = params.get("role")
+        if role:
+            qs = qs.filter(role=role)
+
+        is_active = params.get("is_active")
+        if is_active in ("true", "1"):
+            qs = qs.filter(is_active=True)
+        elif is_active in ("false", "0"):
+            qs = qs.filter(is_active=False)
+
+        search = (params.get("search") or "").strip().lower()
+        if search:
+            qs = qs.filter(
+                _prefix_match("email", search)
+                | _prefix_match("first_name", search)
+                | _prefix_match("last_name", search)
+            )
+        return qs
+
+
+def _prefix_match(field, prefix):
+    """
+    Lower(field) starts with prefix (already lowercased), written as a range
+    too so the Lower() indexes on CustomUser can serve it; istartswith /
+    LIKE can't use a plain btree index
+    """
+    column = Lower(field)
+    if ord(prefix[-1]) == sys.maxunicode:
+        return Q(StartsWith(column, prefix))
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(
+        GreaterThanOrEqual(column, prefix),
+        LessThan(column, upper),
+        StartsWith(column, prefix),
+    )
+
 class UserDetailView(generics.RetrieveAPIView):
     queryset = CustomUser.objects.all()
     serializer_class = UserSerializer
@@ -101,35 +191,77 @@ def get_or_create_conversation(request):
         conversation,
         context={"request": request}
     )
+    mark_read(conversation, "user")
     return Response(serializer.data)
 
 
 
-@api_view(["POST"])
-@permission_classes([IsAuthenticated])
-def send_message(request):
-    conversation, created = SupportConversation.objects.get_or_create(
-        user=request.user
-    )
+class SendMessageView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
 
-    message = request.data.get("message", "")
-    screenshot = request.FILES.get("screenshot")
+    async def post(self, request):
+        conversation, created = await SupportConversation.objects.aget_or_create(
+            user=request.user
+        )
 
-    if not message and not screenshot:
-        return Response({"error": "Message or screenshot required"}, status=400)
+        message = request.data.get("message", "")
+        screenshot = request.FILES.get("screenshot")
 
-    SupportMessage.objects.create(
-        conversation=conversation,
-        sender="user",
-        message=message,
-        screenshot=screenshot
-    )
+        if not message and not screenshot:
+            return Response({"error": "Message or screenshot required"}, status=400)
 
-    serializer = SupportConversationSerializer(
-    conversation,
-    context={"request": request}
-    )
-    return Response(serializer.data)
+        created_message = await SupportMessage.objects.acreate(
+            conversation=conversation,
+            sender="user",
+            message=message,
+            screenshot=screenshot
+        )
+
+        # Only acknowledge the new message, clients already hold the thread
+        serializer = SupportMessageSerializer(
+            created_message,
+            context={"request": request}
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+send_message = SendMessageView.as_view()
+
+
+def _message_feed_response(request, conversation):
+    """
+    Incremental feed: ?since=<id> for new messages, ?before=<id> for older
+    history, ?limit=<n> for the page size.
+    """
+    since = parse_message_id(request.query_params.get("since"))
+    before = parse_message_id(request.query_params.get("before"))
+    limit = parse_limit(request.query_params.get("limit"))
+
+    if conversation is None:
+        messages, has_more = [], False
+    else:
+        messages, has_more = message_page(
+            conversation, since=since, before=before, limit=limit
+        )
+
+    data = message_page_data(messages, has_more, {"request": request})
+    if before is not None:
+        # Paging back: the cursor is where the next older page starts
+        data["cursor"] = data["oldest_id"]
+    elif data["cursor"] is None:
+        data["cursor"] = since
+    return Response(data)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def conversation_messages(request):
+    conversation = SupportConversation.objects.filter(
+        user=request.user
+    ).first()
+    if conversation is not None:
+        mark_read(conversation, "user")
+    return _message_feed_response(request, conversation)
 
 
 @api_view(["POST"])
@@ -146,20 +278,20 @@ def submit_feedback(request):
 
 
 
-class UploadUserCertificateView(APIView):
+class UploadUserCertificateView(AsyncAPIView):
     permission_classes = [IsAdminUser]
     parser_classes = [MultiPartParser, FormParser]
 
-    def post(self, request, user_id):
-        user = get_object_or_404(CustomUser, id=user_id)
-        topic = get_object_or_404(Topic, id=10)
+    async def post(self, request, user_id):
+        user = await aget_object_or_404(CustomUser, id=user_id)
+        topic = await aget_object_or_404(Topic, id=10)
 
         file = request.FILES.get("certificate_file")
 
         if not file:
             return Response({"error": "Certificate file required"}, status=400)
 
-        certificate, created = UserCertificate.objects.update_or_create(
+        certificate, created = await UserCertificate.objects.aupdate_or_create(
             user=user,
             topic=topic,
             defaults={"certificate_file": file}
@@ -197,24 +329,50 @@ class AdminConversationListView(generics.ListAPIView):
         if self.request.user.role != "admin":
             return SupportConversation.objects.none()
 
-        return SupportConversation.objects.select_related("user") \
-            .all() \
-            .order_by("-created_at")
+        queryset = SupportConversation.objects.all()
+
+        # ?unread=true → only threads waiting on an admin
+        if self.request.query_params.get("unread") in ("1", "true", "True"):
+            queryset = queryset.filter(admin_unread_count__gt=0)
+
+        last_sender = self.request.query_params.get("last_sender")
+        if last_sender in ("user", "admin"):
+            queryset = queryset.filter(last_sender=last_sender)
+
+        ordering = self.request.query_params.get("ordering", "-last_message_at")
+        if ordering not in self.ORDERINGS:
+            ordering = "-last_message_at"
+
+        return queryset.order_by(*self.ORDERINGS[ordering])
+
+    # Every ordering is backed by one of SupportConversation's inbox indexes,
+    # scanned forwards or backwards (keep them in sync)
+    ORDERINGS = {
+        "-last_message_at": [F("last_message_at").desc(nulls_last=True), "-id"],
+        "last_message_at": [F("last_message_at").asc(nulls_last=True), "id"],
+        "-admin_unread_count": [
+            "-admin_unread_count", F("last_message_at").desc(nulls_last=True), "-id",
+        ],
+        "-created_at": ["-created_at", "-id"],
+        "created_at": ["created_at", "id"],
+    }
 
     def list(self, request, *args, **kwargs):
         if request.user.role != "admin":
             return Response({"error": "Unauthorized"}, status=403)
 
-        queryset = self.get_queryset()
-
-        data = [
-            {
-                "id": convo.id,
-                "user_email": convo.user.email,
-                "created_at": convo.created_at,
-            }
-            for convo in queryset
-        ]
+        data = list(
+            self.get_queryset().values(
+                "id",
+                "created_at",
+                "last_message_at",
+                "last_message_preview",
+                "last_sender",
+                "admin_unread_count",
+                "user_unread_count",
+                user_email=F("user__email"),
+            )
+        )
 
         return Response(data)
     
@@ -235,6 +393,7 @@ class AdminConversationDetailView(generics.RetrieveAPIView):
             conversation,
             context={"request": request}
         )
+        mark_read(conversation, "admin")
 
         return Response(serializer.data)
     
@@ -258,19 +417,34 @@ class AdminSendMessageView(APIView):
         if not message and not screenshot:
             return Response({"error": "Message required"}, status=400)
 
-        SupportMessage.objects.create(
+        created_message = SupportMessage.objects.create(
             conversation=conversation,
             sender="admin",
             message=message,
             screenshot=screenshot
         )
 
-        serializer = SupportConversationSerializer(
-            conversation,
+        serializer = SupportMessageSerializer(
+            created_message,
             context={"request": request}
         )
 
-        return Response(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class AdminConversationMessagesView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, convo_id):
+        if request.user.role != "admin":
+            return Response({"error": "Unauthorized"}, status=403)
+
+        conversation = SupportConversation.objects.filter(id=convo_id).first()
+        if conversation is None:
+            return Response({"error": "Not found"}, status=404)
+
+        mark_read(conversation, "admin")
+        return _message_feed_response(request, conversation)
     
     
     
@@ -301,13 +475,15 @@ class SaveLastPageView(APIView):
 
         if not page_id:
             return Response({"error": "page_id required"}, status=400)
+        try:
+            page_id = int(page_id)
+        except (TypeError, ValueError):
+            return Response({"error": "page_id must be an integer"}, status=400)
 
-        obj, created = UserLastPage.objects.update_or_create(
-            user=request.user,
-            defaults={"page_id": page_id}
-        )
+        # Buffered and written in batches (see last_page.py)
+        save_last_page(request.user, page_id)
 
-        serializer = UserLastPageSerializer(obj)
+        serializer = UserLastPageSerializer(UserLastPage(user=request.user, page_id=page_id))
 
         return Response({
             "status": "saved",
@@ -319,13 +495,128 @@ class GetLastPageView(APIView):
 
     def get(self, request):
 
+        # Reads through the write-behind buffer, so a position saved a moment
+        # ago is returned even before it reaches the table
+        page_id = get_last_page_id(request.user)
+        if page_id is None:
+            return Response({
+                "page_id": None
+            })
+
+        serializer = UserLastPageSerializer(UserLastPage(user=request.user, page_id=page_id))
+        return Response(serializer.data)
+
+
+# ----------------------------
+# Support chat push channel (ASGI)
+# ----------------------------
+
+SSE_KEEPALIVE_SECONDS = 15
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def support_stream_ticket(request):
+    """ Single-use ?ticket= for the event stream, EventSource can't send headers """
+    return never_compress(Response({
+        "ticket": issue_stream_ticket(request.user.id),
+        "expires_in": STREAM_TICKET_SECONDS,
+    }))
+
+
+async def _authenticate_stream(request):
+    """ Authorization header, or a ?ticket= from support_stream_ticket """
+    auth = StatelessJWTAuthentication()
+    header = auth.get_header(request)
+    raw_token = auth.get_raw_token(header) if header else None
+    if raw_token is not None:
         try:
-            obj = UserLastPage.objects.get(user=request.user)
-            serializer = UserLastPageSerializer(obj)
+            validated_token = auth.get_validated_token(raw_token)
+            return await sync_to_async(auth.get_user)(validated_token)
+        except (InvalidToken, AuthenticationFailed):
+            return None
+
+    ticket = request.GET.get("ticket")
+    user_id = await sync_to_async(redeem_stream_ticket)(ticket) if ticket else None
+    if user_id is None:
+        return None
+    return await CustomUser.objects.filter(pk=user_id, is_active=True).afirst()
+
+
+def _sse(event):
+    message_id = event["message"]["id"]
+    return f"id: {message_id}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def support_events(request):
+    """
+    Server-Sent Events stream of new support messages.
+
+    Users receive messages of their own conversation, admins receive every
+    conversation. Reconnecting clients send Last-Event-ID (or ?since=) and
+    get what they missed replayed from the database first; clients should
+    de-duplicate by message id.
+
+    Only works under ASGI: a WSGI worker would block on the endless
+    stream, so it answers 501 there.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "Event stream needs the ASGI server"}, status=501)
+
+    user = await _authenticate_stream(request)
+    if user is None:
+        return JsonResponse({"error": "Unauthorized"}, status=401)
+
+    is_admin = user.role == "admin"
+    groups = [ADMIN_GROUP] if is_admin else [user_group(user.id)]
+    since = parse_message_id(
+        request.headers.get("Last-Event-ID") or request.GET.get("since")
+    )
 
-            return Response(serializer.data)
+    async def backlog():
+        if since is None:
+            return []
+        if is_admin:
+            # Every conversation: event ids are message ids, so walk the primary key
+            messages = [
+                message async for message in
+                SupportMessage.objects.filter(id__gt=since).order_by("id")[:MAX_MESSAGE_PAGE_SIZE]
+            ]
+        else:
+            conversation = await SupportConversation.objects.filter(user=user).afirst()
+            if conversation is None:
+                return []
+            messages, _ = await sync_to_async(message_page)(
+                conversation, since=since, limit=MAX_MESSAGE_PAGE_SIZE
+            )
+        return [
+            {
+                "type": "support.message",
+                "conversation": message.conversation_id,
+                "message": SupportMessageSerializer(message).data,
+            }
+            for message in messages
+        ]
+
+    async def stream():
+        # Subscribed here so the finally below always closes it; before the
+        # backlog query, so nothing sent in between is missed
+        subscription = await get_channel_layer().subscribe(groups)
+        try:
+            for event in await backlog():
+                yield _sse(event)
+            while True:
+                event = await subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _sse(event)
+        finally:
+            # Runs when the client disconnects and the response is cancelled
+            await subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
-        except UserLastPage.DoesNotExist:
-            return Response({
-                "page_id": None
-            })
\ No newline at end of file
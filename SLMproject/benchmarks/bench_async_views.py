@@ -0,0 +1,135 @@
+"""
+Concurrency per worker: sync (WSGI) vs async (ASGI) page detail.
+
+Runs PageDetailView in-process against a throwaway test database and fires
+CONCURRENCY simultaneous requests, once through a WSGI worker with a fixed
+thread pool and once through the ASGI handler on one event loop.
+--latency-ms adds an artificial delay to every SQL query so a networked
+database can be simulated with SQLite.
+
+    python benchmarks/bench_async_views.py --requests 400 --concurrency 50 --latency-ms 2
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "SLMproject.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.db.backends.signals import connection_created  # noqa: E402
+from django.test import AsyncClient, Client  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from accounts.tokens import UserClaimsRefreshToken  # noqa: E402
+
+
+def install_latency(latency_ms):
+    def slow_query(execute, sql, params, many, context):
+        time.sleep(latency_ms / 1000)
+        return execute(sql, params, many, context)
+
+    def on_connection(sender, connection, **kwargs):
+        connection.execute_wrappers.append(slow_query)
+
+    connection_created.connect(on_connection, weak=False)
+    if connection.connection is not None:
+        connection.execute_wrappers.append(slow_query)
+
+
+def create_fixture():
+    from accounts.models import CustomUser
+    from SLMapp.models import MainContent, Module, Page, PageProgress, Topic
+
+    user = CustomUser.objects.create(email="bench@example.com", role="student", is_active=True)
+    topic = Topic.objects.create(name="Bench", order=1)
+    user.topics.add(topic)
+    module = Module.objects.create(topic=topic, title="Module", order=1)
+    main_content = MainContent.objects.create(module=module, title="Lesson", order=1)
+    pages = [
+        Page.objects.create(main_content=main_content, title=f"Page {i}", content="x" * 2000, order=i)
+        for i in range(1, 11)
+    ]
+    for page in pages[:-1]:
+        PageProgress.objects.create(user=user, page=page, completed=True)
+    token = str(UserClaimsRefreshToken.for_user(user).access_token)
+    return pages[-1].id, token
+
+
+def report(label, latencies, elapsed):
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{label:<28} {len(latencies) / elapsed:8.1f} req/s   "
+        f"median {statistics.median(latencies) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms"
+    )
+
+
+def run_sync(url, token, total, threads):
+    client = Client()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def one(_):
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, response.status_code
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(one, range(total)))
+    report(f"WSGI worker ({threads} threads)", latencies, time.perf_counter() - start)
+
+
+def run_async(url, token, total, concurrency):
+    async def main():
+        client = AsyncClient()
+        headers = {"Authorization": f"Bearer {token}"}
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(url, headers=headers)
+                assert response.status_code == 200, response.status_code
+                return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one() for _ in range(total)))
+        report(f"ASGI worker (concurrency {concurrency})", list(latencies), time.perf_counter() - start)
+
+    asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=4, help="threads of the WSGI worker")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, keepdb=False)
+    try:
+        page_id, token = create_fixture()
+        if args.latency_ms:
+            install_latency(args.latency_ms)
+        url = f"/pages/{page_id}/"
+
+        print(f"{args.requests} requests, {args.latency_ms} ms simulated query latency")
+        run_sync(url, token, args.requests, args.threads)
+        run_async(url, token, args.requests, args.concurrency)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
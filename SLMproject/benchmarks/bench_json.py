@@ -0,0 +1,98 @@
+"""
+JSON encode time of a real-sized course tree: DRF's JSONRenderer vs FastJSONRenderer.
+
+Builds one topic with MODULES modules × MAIN_CONTENTS main contents ×
+PAGES pages in a throwaway test database, serializes it once with
+TopicSerializer (the /api/topics/ payload) and then only times rendering
+the resulting data to bytes.
+
+    python benchmarks/bench_json.py --modules 10 --main-contents 8 --pages 12
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "SLMproject.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from rest_framework.request import Request  # noqa: E402
+from rest_framework.test import APIRequestFactory, force_authenticate  # noqa: E402
+
+from SLMapp import renderers  # noqa: E402
+from SLMapp.renderers import FastJSONRenderer  # noqa: E402
+
+
+def build_tree(modules, main_contents, pages):
+    from accounts.models import CustomUser
+    from SLMapp.models import MainContent, Module, Page, PageProgress, Topic
+    from SLMapp.serializers import TopicSerializer
+
+    user = CustomUser.objects.create(email="bench@example.com", role="student", is_active=True)
+    topic = Topic.objects.create(name="Bench topic", order=1, prize="1499.00")
+    user.topics.add(topic)
+    for m in range(1, modules + 1):
+        module = Module.objects.create(
+            topic=topic, title=f"Module {m}", description="Lorem ipsum dolor sit amet " * 8, order=m
+        )
+        for c in range(1, main_contents + 1):
+            main_content = MainContent.objects.create(
+                module=module, title=f"Lesson {m}.{c}", description="Lesson intro " * 10, order=c
+            )
+            created = Page.objects.bulk_create(
+                Page(main_content=main_content, title=f"Page {p} — “quoted” ünïcode", content="x", order=p)
+                for p in range(1, pages + 1)
+            )
+            PageProgress.objects.bulk_create(
+                PageProgress(user=user, page=page, completed=True) for page in created[: pages // 2]
+            )
+
+    django_request = APIRequestFactory().get("/api/topics/")
+    force_authenticate(django_request, user=user)
+    request = Request(django_request)
+    request.user = user
+    return TopicSerializer([topic], many=True, context={"request": request}).data
+
+
+def timed(renderer, data, rounds):
+    body = renderer.render(data)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        renderer.render(data)
+    return (time.perf_counter() - start) / rounds, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--modules", type=int, default=10)
+    parser.add_argument("--main-contents", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=12)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, keepdb=False)
+    try:
+        data = build_tree(args.modules, args.main_contents, args.pages)
+        baseline, size = timed(JSONRenderer(), data, args.rounds)
+        fast, _ = timed(FastJSONRenderer(), data, args.rounds)
+        assert json.loads(JSONRenderer().render(data)) == json.loads(FastJSONRenderer().render(data))
+
+        print(f"payload: {size / 1024:.1f} KiB, {args.modules * args.main_contents * args.pages} pages")
+        print(f"{'before: DRF JSONRenderer':<32} {baseline * 1000:8.3f} ms")
+        backend = "orjson" if renderers.orjson is not None else "json fallback, orjson not installed"
+        print(f"{'FastJSONRenderer (' + backend + ')':<32} {fast * 1000:8.3f} ms  ({baseline / fast:.1f}x)")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
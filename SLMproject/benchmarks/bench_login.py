@@ -0,0 +1,77 @@
+"""
+Logins per second per core: Django's default PBKDF2 vs the hashing profiles.
+
+For every hasher it creates a user in a throwaway test database and posts
+to accounts/login/ sequentially from one thread, so the number reported is
+what one core sustains (hash verification + user lookup + token issue).
+
+    python benchmarks/bench_login.py --logins 50
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "SLMproject.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.hashers import get_hashers  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+BASELINE = "django.contrib.auth.hashers.PBKDF2PasswordHasher"
+PASSWORD = "correct horse battery staple"
+
+
+def bench(hasher, logins):
+    from accounts.models import CustomUser
+
+    with override_settings(
+        PASSWORD_HASHERS=[hasher],
+        REST_FRAMEWORK={**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": {"login": None, "login_ip": None}},
+    ):
+        get_hashers.cache_clear()
+        email = f"{hasher.rsplit('.', 1)[-1].lower()}@example.com"
+        user = CustomUser(email=email, role="student", is_active=True)
+        user.set_password(PASSWORD)
+        user.save()
+
+        client = Client()
+        start = time.perf_counter()
+        for _ in range(logins):
+            cache.clear()
+            response = client.post("/accounts/login/", {"email": email, "password": PASSWORD})
+            assert response.status_code == 200, response.content
+        elapsed = time.perf_counter() - start
+
+    get_hashers.cache_clear()
+    return logins / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=30)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, keepdb=False)
+    try:
+        baseline = bench(BASELINE, args.logins)
+        print(f"{'before: Django default PBKDF2':<48} {baseline:8.1f} logins/s")
+        for hasher in settings.PASSWORD_HASHERS:
+            rate = bench(hasher, args.logins)
+            print(f"{hasher.rsplit('.', 1)[-1]:<48} {rate:8.1f} logins/s  ({rate / baseline:.1f}x)")
+        print(f"active profile: {settings.PASSWORD_HASHING} {settings.PASSWORD_HASHING_PROFILE}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
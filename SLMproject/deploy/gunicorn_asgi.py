@@ -0,0 +1,26 @@
+"""
+Gunicorn profile for serving SLMproject as an ASGI application.
+
+    pip install gunicorn uvicorn
+    gunicorn SLMproject.asgi:application -c deploy/gunicorn_asgi.py
+
+Every worker runs one event loop, so async views (page detail, topic list,
+support messages, certificate upload) and the support chat SSE stream share
+it instead of each occupying a thread. Sync DRF views still work, Django
+runs them in a thread pool.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+
+# SSE connections stay open; keep idle keepalive generous and never kill a
+# worker just because a stream is long-lived.
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 0))
+graceful_timeout = 30
+keepalive = 75
+
+# Sync views and async ORM calls run in this many threads per worker
+os.environ.setdefault("ASGI_THREADS", os.environ.get("GUNICORN_THREADS", "8"))